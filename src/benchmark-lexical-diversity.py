@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.benchmark-lexical-diversity` benchmarks the windowed lexical measures (MATTR, windowed Yule's K and entropy)
+of :mod:`src.multilingual-linguistic-measures` on long synthetic transcriptions.
+It compares the incremental sliding window counter (O(n)) to a naive implementation that recounts every window (O(n*w))
+and makes sure both give the same results.
+
+Tool parameters
+----------
+text_sizes (optionnal): number of words of the benchmarked transcriptions (default: 1000 10000 100000)
+window_size (optionnal): window size in words (default: 50)
+"""
+
+import argparse
+import math
+import random
+import time
+from collections import Counter
+
+from utils.lexical_util import estimate_windowed_measures
+
+# CONSTANTS
+VOCABULARY_SIZE = 2000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Windowed lexical measures benchmark.')
+    parser.add_argument('-n', '--text_sizes', dest='text_sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                    help='number of words of the benchmarked transcriptions')
+    parser.add_argument('-w', '--window_size', dest='window_size', type=int, default=50,
+                    help='window size (in words)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    print("WINDOWED LEXICAL MEASURES BENCHMARK (window size: " + str(args.window_size) + ")")
+    print("------------------------")
+
+    for text_size in args.text_sizes:
+        words = generate_words(text_size)
+
+        start = time.perf_counter()
+        incremental_measures = estimate_windowed_measures(words, args.window_size)
+        incremental_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        naive_measures = estimate_naive_windowed_measures(words, args.window_size)
+        naive_time = time.perf_counter() - start
+
+        is_equal = all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9) for a, b in zip(incremental_measures, naive_measures))
+
+        print(f"{text_size:>8} words | incremental {incremental_time:8.4f}s | naive {naive_time:8.4f}s | "
+              f"speedup x{naive_time / max(incremental_time, 1e-12):6.1f} | same results: {is_equal}")
+
+def generate_words(text_size):
+    """
+    Generates a transcription-like list of words following a Zipf distribution.
+    """
+    random.seed(text_size)
+    vocabulary = ["word" + str(i) for i in range(VOCABULARY_SIZE)]
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    return random.choices(vocabulary, weights=weights, k=text_size)
+
+def estimate_naive_windowed_measures(words, window_size):
+    """
+    Reference implementation: every window is counted from scratch.
+    """
+    size = min(window_size, len(words))
+    nb_windows = len(words) - size + 1
+    ttr_sum, yule_k_sum, entropy_sum = 0, 0, 0
+
+    for i in range(nb_windows):
+        words_count = Counter(words[i:i + size])
+        n2 = sum([count ** 2 for count in words_count.values()])
+
+        ttr_sum += len(words_count) / size
+        yule_k_sum += 10000 * ((n2 - size) / (size ** 2)) - (1 / size)
+        entropy_sum += -sum(count / size * math.log(count / size, 2) for count in words_count.values())
+
+    return (ttr_sum / nb_windows, yule_k_sum / nb_windows, entropy_sum / nb_windows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.benchmark-phonetic-measures` validates and benchmarks the phonetic measures computations
+of :mod:`src.multilingual-phonetic-measures` on synthetic recordings:
+- Streaming moment accumulators (sequential updates and merge of partial results) against scipy.stats
+- MFCC engine of :mod:`utils.mfcc_util` against python_speech_features.mfcc (equivalence and time)
+
+Tool parameters
+----------
+durations (optionnal): durations in seconds of the synthetic recordings (default: 60 600)
+rate (optionnal): sample rate of the synthetic recordings (default: 16000)
+"""
+
+import argparse
+import time
+
+import numpy as np
+from python_speech_features import mfcc as reference_mfcc
+from scipy.stats import kurtosis, skew
+
+from utils.mfcc_util import mfcc
+from utils.stats_util import MomentAccumulator
+
+# CONSTANTS
+WINLEN = 0.025
+NFFT = 1200
+NUMCEP = 13
+BLOCK_FRAMES = 4096
+NB_PARTS = 8
+TOLERANCE = 1e-8
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Phonetic measures validation and benchmark.')
+    parser.add_argument('-d', '--durations', dest='durations', type=float, nargs='+', default=[60, 600],
+                    help='durations in seconds of the synthetic recordings')
+    parser.add_argument('-r', '--rate', dest='rate', type=int, default=16000,
+                    help='sample rate of the synthetic recordings')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    for duration in args.durations:
+        signal = generate_signal(duration, args.rate)
+        print("")
+        print("SYNTHETIC RECORDING OF " + str(duration) + "s (" + str(args.rate) + " Hz)")
+        print("------------------------")
+
+        mfcc_features = compare_mfcc_engines(signal, args.rate)
+        validate_moment_accumulator(mfcc_features)
+
+def generate_signal(duration, rate):
+    """
+    Generates a speech-like signal: harmonics modulated by a syllabic envelope, with silences and noise.
+    """
+    random_state = np.random.RandomState(0)
+    t = np.arange(int(duration * rate)) / rate
+    envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.3)
+    voice = sum(np.sin(2 * np.pi * 140 * harmonic * t) / harmonic for harmonic in range(1, 6))
+    signal = 8000 * envelope * voice + 100 * random_state.randn(len(t))
+    return signal.astype(np.int16)
+
+def compare_mfcc_engines(signal, rate):
+    """
+    Compares the MFCC engine to python_speech_features.mfcc (same configuration as the phonetic measures tool).
+    """
+    start = time.perf_counter()
+    reference = reference_mfcc(signal, rate, winlen=WINLEN, nfft=NFFT, numcep=NUMCEP)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mfcc_features = mfcc(signal, rate, winlen=WINLEN, nfft=NFFT, numcep=NUMCEP)
+    engine_time = time.perf_counter() - start
+
+    error = np.max(np.abs(mfcc_features - reference) / np.maximum(np.abs(reference), 1))
+    print(f"mfcc                | max relative error {error:.2e} | {'OK' if error < TOLERANCE else 'FAILED'}")
+    print(f"mfcc time           | python_speech_features {reference_time:.4f}s | engine {engine_time:.4f}s "
+          f"| speedup x{reference_time / engine_time:.1f}")
+
+    return mfcc_features
+
+def validate_moment_accumulator(features):
+    """
+    Compares the streaming moment accumulator (block updates and merged partial results) to scipy's statistics.
+    """
+    start = time.perf_counter()
+    reference = [np.mean(features, axis=0), kurtosis(features, axis=0), skew(features, axis=0), np.var(features, axis=0)]
+    scipy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accumulator = MomentAccumulator(features.shape[1])
+    for i in range(0, len(features), BLOCK_FRAMES):
+        accumulator.update(features[i:i + BLOCK_FRAMES])
+    streaming_time = time.perf_counter() - start
+
+    merged = MomentAccumulator(features.shape[1])
+    for part in np.array_split(features, NB_PARTS):
+        merged.merge(MomentAccumulator.from_rows(part))
+
+    for name, result in (("streaming", accumulator), ("merged", merged)):
+        statistics = [result.mean(), result.kurtosis(), result.skewness(), result.variance()]
+        error = max(np.max(np.abs(value - expected) / np.maximum(np.abs(expected), 1))
+                    for value, expected in zip(statistics, reference))
+        print(f"moments ({name:>9}) | max relative error {error:.2e} | {'OK' if error < TOLERANCE else 'FAILED'}")
+
+    print(f"moments time        | scipy {scipy_time:.4f}s | streaming {streaming_time:.4f}s")
+
+if __name__ == "__main__":
+    main()
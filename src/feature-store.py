@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.feature-store` implements a tool that keeps the measures of every tool in a feature store (see
+:mod:`utils.feature_store_util`) and joins them into one wide table for modeling, instead of joining the .csv files by hand.
+
+    ingest: the feature files (e.g. out/ExtractedFeatures/*.csv) are stored as tables of typed Parquet partitions (one
+            per class) with the same keys (idParticipant, interviewNumber and status: text)
+    join  : the tables are joined on their keys into one wide table, only the needed classes, participants and columns
+            being read
+    list  : tables of the store, with their number of rows and columns
+
+Tool parameters
+----------
+ingest: feature_paths (optionnal): feature files (.csv, .parquet or .feather) to ingest (default: every feature file of
+        out/ExtractedFeatures/), table (optionnal): name of the table (one feature file only)
+join: tables (optionnal): tables to join (default: every table), columns (optionnal): columns to read ("column" or
+      "table.column"), classes, participants (optionnal): only the matching rows are read, how (optionnal): type of join
+      (inner, outer or left), features_output_path (optionnal): file path for the wide table in a .csv, .parquet or
+      .feather file (e.g.: out/wide_features.csv)
+store_path (optionnal): folder of the feature store (default: out/FeatureStore/)
+verbose (optionnal): for debugging purpose
+
+This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios
+for evaluating and monitor patient's linguistic/phonetic functions.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from utils.feature_store_util import FEATURE_STORE_PATH, JOIN_TYPES, FeatureStore, list_feature_files
+from utils.sink_util import export_features
+
+# CONSTANTS
+FEATURES_PATH = "out/ExtractedFeatures/"
+WIDE_FEATURES_PATH = "out/wide_features.csv"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Feature store (ingest the measures of every tool and join them).')
+    parser.add_argument('-d', '--store_path', dest='store_path', default=FEATURE_STORE_PATH,
+                        help='folder of the feature store')
+    parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
+                        help='print processing info')
+    subparsers = parser.add_subparsers(dest='command')
+
+    ingest_parser = subparsers.add_parser('ingest', help='store feature files as tables')
+    ingest_parser.add_argument(dest='feature_paths', nargs='*',
+                               help='feature files (.csv, .parquet or .feather), default: every feature file of '
+                                    + FEATURES_PATH)
+    ingest_parser.add_argument('-t', '--table', dest='table', default=None,
+                               help='name of the table (default: name of the file without extension)')
+
+    join_parser = subparsers.add_parser('join', help='join tables into one wide table')
+    join_parser.add_argument('-t', '--tables', dest='tables', nargs='+', default=None,
+                             help='tables to join (default: every table)')
+    join_parser.add_argument('-c', '--columns', dest='columns', nargs='+', default=None,
+                             help='columns to read, "column" or "table.column" (default: every column)')
+    join_parser.add_argument('--classes', dest='classes', nargs='+', default=None,
+                             help='only reads the rows of those classes (e.g. AD CTRL)')
+    join_parser.add_argument('--participants', dest='participants', nargs='+', default=None,
+                             help='only reads the rows of those participants, as spelled in the file names (e.g. 001 102)')
+    join_parser.add_argument('--how', dest='how', choices=JOIN_TYPES, default="inner",
+                             help='inner: rows found in every table, outer: in any table, left: in the first table')
+    join_parser.add_argument('-f', '--features_output_path', dest='features_output_path', default=WIDE_FEATURES_PATH,
+                             help='path to the file where the wide table will be stored (.csv, .parquet or .feather file)')
+
+    subparsers.add_parser('list', help='print the tables of the store')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.command is None:
+        print("Missing command (ingest, join or list).")
+        sys.exit(1)
+
+    feature_store = FeatureStore(args.store_path)
+
+    if args.command == 'ingest':
+        feature_paths = args.feature_paths
+        if not feature_paths:
+            if not os.path.isdir(FEATURES_PATH):
+                print("No feature files to ingest (" + FEATURES_PATH + " doesn't exist).")
+                sys.exit(1)
+            feature_paths = list_feature_files(FEATURES_PATH)
+        if args.table and len(feature_paths) != 1:
+            print("A table name is given for one feature file only.")
+            sys.exit(1)
+        for feature_path in feature_paths:
+            if not os.path.exists(feature_path):
+                print("Given feature file doesn't exist :", feature_path)
+                sys.exit(1)
+
+        ingest_feature_files(feature_store, feature_paths, args.table, args.is_verbose)
+    elif args.command == 'join':
+        if not feature_store.tables():
+            print("The feature store is empty (run the ingest command first).")
+            sys.exit(1)
+
+        start_time = time.perf_counter()
+        try:
+            df_wide = feature_store.join(args.tables, args.columns, args.classes, args.participants, args.how)
+        except ValueError as e:
+            print("Couldn't join :", str(e))
+            sys.exit(1)
+
+        # Keys are exported as the first columns, as in the feature files of the tools
+        sink = export_features(df_wide.reset_index(), args.features_output_path)
+        print("Joined", len(df_wide), "rows and", len(df_wide.columns), "columns in",
+              round(time.perf_counter() - start_time, 2), "s (" + args.features_output_path + ")")
+        if args.is_verbose:
+            print_results(sink)
+
+    print_tables(feature_store)
+
+def ingest_feature_files(feature_store, feature_paths, table=None, is_verbose=False):
+    """
+    This function ingests feature files in the feature store, one table per file. A file that can't be ingested
+    (e.g. a file without key columns) is reported and skipped, it doesn't abort the others.
+
+    Parameters
+    ----------
+    feature_store: feature store (see utils.feature_store_util.FeatureStore)
+    feature_paths: paths to the feature files (.csv, .parquet or .feather)
+    table: name of the table (one feature file only), None to name every table after its file
+    is_verbose: boolean value to print processing info to console
+    """
+    for feature_path in feature_paths:
+        if is_verbose:
+            print("Ingesting", feature_path)
+        try:
+            feature_store.ingest(feature_path, table)
+        except Exception as e:
+            print("Couldn't ingest", feature_path, ":", str(e) or type(e).__name__)
+
+def print_tables(feature_store):
+    print("")
+    print("FEATURE STORE TABLES")
+    print("------------------------")
+    for table in feature_store.tables():
+        table_info = feature_store.table_info(table)
+        print(table, ":", table_info["nb_rows"], "rows,", len(table_info["columns"]), "columns,",
+              "classes", ", ".join(sorted(table_info["partitions"])))
+
+def print_results(results):
+    print("")
+    print("WIDE TABLE RESULTS (Average per transcription)")
+    print("------------------------")
+    print(results.means())
+
+if __name__ == "__main__":
+    main()
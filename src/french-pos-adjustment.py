@@ -10,6 +10,7 @@ This is an incremental process which can be modified as desired.
 Tool parameters
 ----------
 corpus_path: path to the folder containing TAGGED transcriptions (MUST contain only transcription files)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
 is_verbose: for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -28,7 +29,7 @@ import os
 import sys
 import re
 
-from utils.corpus_util import extract_tags, obtain_corpus_classes, extract_participant_info
+from utils.corpus_util import extract_tags, add_corpus_filter_arguments, create_corpus_index, get_corpus_index
 from utils.data_util import save_tags_in_file
 from utils.pickle_util import read_pickle
 from utils.nlp_util import Tag, UniversalPOS
@@ -46,14 +47,15 @@ def main():
         print("Given corpus path doesn't exist.")
         sys.exit(1)
 
-    corpus_classes = obtain_corpus_classes(args.corpus_path)
+    corpus_index = create_corpus_index(args.corpus_path, args)
+    corpus_classes = corpus_index.classes()
 
     if args.is_verbose:
         print("CORPUS CLASSES")
         print("------------------------")
         print(corpus_classes)
 
-    adjustment_results = process_corpus(args.corpus_path, args.is_verbose)
+    adjustment_results = process_corpus(corpus_index, args.is_verbose)
 
     print_results(adjustment_results)
     
@@ -63,15 +65,16 @@ def parse_args():
                     help='path to the folder containing all transcripts with POS tags')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                     help='print processing info')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
-def process_corpus(corpus_path, is_verbose=False):
+def process_corpus(corpus_index, is_verbose=False):
     """
     This is the main function that processes given corpus to adjust tags. It iterates thru every transcriptions and process tag adjustments.
 
     Parameters
     ----------
-    corpus_path: path to a folder containing all transcriptions
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all transcriptions
     is_verbose: boolean value to print processing info to console
 
     Returns
@@ -81,24 +84,23 @@ def process_corpus(corpus_path, is_verbose=False):
 
     adjustment_count = 0
 
-    for file in os.listdir(corpus_path):
-        file_name = os.fsdecode(file)
+    corpus_index = get_corpus_index(corpus_index)
+    file_names = corpus_index.file_names()
 
-        # To ignore hidden files
-        if not file_name.startswith("."):
-            if is_verbose:
-                print("Processing transcript", file_name)
+    for file_name in file_names:
+        if is_verbose:
+            print("Processing transcript", file_name)
 
-            participant_info = extract_participant_info(file_name)
+        participant_info = corpus_index.participant_info(file_name)
 
-            tags = extract_tags(os.path.join(corpus_path, file_name))
+        tags = extract_tags(corpus_index.file_path(file_name))
 
-            adjusted_dialog_tags, dialog_adjustment_count = adjust_pos_tags(tags, is_verbose=is_verbose)
+        adjusted_dialog_tags, dialog_adjustment_count = adjust_pos_tags(tags, is_verbose=is_verbose)
 
-            export_file_path = ADJUSTED_DIALOG_OUTPUT_PATH + file_name
-            save_tags_in_file(adjusted_dialog_tags, export_file_path)
+        export_file_path = ADJUSTED_DIALOG_OUTPUT_PATH + file_name
+        save_tags_in_file(adjusted_dialog_tags, export_file_path)
 
-            adjustment_count += dialog_adjustment_count
+        adjustment_count += dialog_adjustment_count
 
     return adjustment_count
 
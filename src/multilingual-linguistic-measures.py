@@ -14,11 +14,14 @@ Here's a list of the calculated metrics:
 - Sichel's S
 - Yule's K
 - Entropy
+- Moving-average type token ratio (MATTR), windowed Yule's K and windowed entropy (for each window size)
 
 Tool parameters
 ----------
 corpus_path: path to the folder containing TAGGED transcriptions (MUST contain only transcription files)
-features_output_path (optionnal): file path for the extracted measures in a .csv file (e.g.: out/pos-distribution-measures.csv
+features_output_path (optionnal): file path for the extracted measures in a .csv, .parquet or .feather file (e.g.: out/pos-distribution-measures.csv
+window_sizes (optionnal): window sizes (in words) used for the windowed measures (default: 50)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
 verbose (optionnal): for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -33,25 +36,27 @@ for evaluating and monitor patient's linguistic/phonetic functions.
 # Free software: MIT license
 
 import argparse
-import math
 import os
 import sys
-from collections import Counter
 
-import pandas as pd
 from spellchecker import SpellChecker
 
-from utils.corpus_util import (extract_tags, extract_participant_info,
-                               obtain_corpus_classes)
-from utils.data_util import export_dataframe
+from utils.corpus_util import (extract_tags, extract_participant_info, add_corpus_filter_arguments,
+                               create_corpus_index, get_corpus_index)
+from utils.lexical_util import LexicalAccumulator, estimate_windowed_measures
 from utils.nlp_util import Tag
 from utils.pickle_util import read_pickle
+from utils.sink_util import FeatureSink, make_schema
 
 # Constants
 DIALOG_INFO_PATH = "out/DialogsInfo/"
 LINGUISTIC_FEATURES_EXPORT_PATH = "out/ExtractedFeatures/linguistic_features.csv"
 LINGUISTIC_FEATURES = ["idParticipant", "interviewNumber", "text_size", "vocab_size", "hapax_legomena", "hapax_dislegomena", 
                 "brunet_index", "honore_r_statistics", "ttr", "sichel_s", "yule_k", "entropy", "status"]
+# Measures that are counts (integers), the others are floats
+LINGUISTIC_COUNTS = ["text_size", "vocab_size", "hapax_legomena", "hapax_dislegomena"]
+WINDOWED_FEATURES = ["mattr", "windowed_yule_k", "windowed_entropy"]
+DEFAULT_WINDOW_SIZES = [50]
 
 # Create spell checker (Supports English, Spanish, German, French, and Portuguese)
 spell = SpellChecker()
@@ -61,9 +66,12 @@ def parse_args():
     parser.add_argument(dest='corpus_path',
                     help='path to the folder containing all normalized transcripts')
     parser.add_argument('-f', '--features_output_path', dest='features_output_path',
-                    help='path to folder where normalizing features will be stored (.csv file)')
+                    help='path to folder where normalizing features will be stored (.csv, .parquet or .feather file)')
+    parser.add_argument('-w', '--window_sizes', dest='window_sizes', type=int, nargs='+', default=DEFAULT_WINDOW_SIZES,
+                    help='window sizes (in words) for the windowed measures (MATTR, Yule\'s K and entropy)')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                     help='print processing info')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
 def main():
@@ -76,148 +84,183 @@ def main():
         print("Given corpus path doesn't exist.")
         sys.exit(1)
 
-    corpus_classes = obtain_corpus_classes(args.corpus_path)
+    corpus_index = create_corpus_index(args.corpus_path, args)
+    corpus_classes = corpus_index.classes()
 
     if args.is_verbose:
         print("CORPUS CLASSES")
         print("------------------------")
         print(corpus_classes)
 
-    linguistic_matrix = process_corpus(args.corpus_path, args.is_verbose)
+    output_path = args.features_output_path if args.features_output_path else LINGUISTIC_FEATURES_EXPORT_PATH
+    with FeatureSink(output_path, get_linguistic_schema(args.window_sizes)) as sink:
+        process_corpus(corpus_index, args.window_sizes, args.is_verbose, sink)
 
-    df_linguistic_results = pd.DataFrame(linguistic_matrix, columns=LINGUISTIC_FEATURES)
-    
-    print_results(df_linguistic_results)
+    print_results(sink)
 
-    output_path = args.features_output_path if args.features_output_path else LINGUISTIC_FEATURES_EXPORT_PATH
-    export_dataframe(df_linguistic_results, output_path)
+def get_linguistic_features(window_sizes=DEFAULT_WINDOW_SIZES):
+    """
+    This function returns the columns of the linguistic measures, including the windowed measures of every window size.
+    """
+    windowed_features = [feature + "_" + str(window_size) for window_size in window_sizes for feature in WINDOWED_FEATURES]
+    return LINGUISTIC_FEATURES[:-1] + windowed_features + LINGUISTIC_FEATURES[-1:]
+
+def get_linguistic_schema(window_sizes=DEFAULT_WINDOW_SIZES):
+    """
+    This function returns the typed columns of the linguistic measures (see utils.sink_util.make_schema).
+    """
+    return make_schema(get_linguistic_features(window_sizes), int_columns=LINGUISTIC_COUNTS)
 
-def process_corpus(corpus_path, is_verbose=False):
+def process_corpus(corpus_index, window_sizes=DEFAULT_WINDOW_SIZES, is_verbose=False, sink=None):
     """
     This is the main function that processes given transcriptions corpus to calculate linguistic measures.
 
     Parameters
     ----------
-    corpus_path: path to a folder containing all TAGGED transcriptions.
+    corpus_index: index of the TAGGED transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all TAGGED transcriptions.
+    window_sizes: window sizes (in words) used for the windowed measures
     is_verbose: boolean value to print processing info to console
+    sink: feature sink of the measures (see utils.sink_util.FeatureSink), None to return them
 
     Returns
     ----------
-    linguistics_matrix: array of linguistic metrics.
+    linguistics_matrix: array of linguistic metrics (empty with a sink).
     """
 
-    linguistics_matrix = []
+    corpus_index = get_corpus_index(corpus_index)
+    file_names = corpus_index.file_names()
 
-    for file in os.listdir(corpus_path):
-        file_name = os.fsdecode(file)
-        
-        # To make sure we don't process hidden files
-        if not file_name.startswith("."):
-            if is_verbose:
-                print("Processing transcript", file_name)
-            
-            participant_info = extract_participant_info(file_name)
+    tagged_transcripts = ((file_name, extract_tags(corpus_index.file_path(file_name))) for file_name in file_names)
 
-            file_path = corpus_path + "/" + file_name
+    return process_tagged_transcripts(tagged_transcripts, window_sizes, is_verbose, sink)
 
-            cleaned_tags = extract_tags(file_path)
+def process_tagged_transcripts(tagged_transcripts, window_sizes=DEFAULT_WINDOW_SIZES, is_verbose=False, sink=None):
+    """
+    This function calculates the linguistic measures of tagged transcriptions, read from files (see process_corpus)
+    or passed in memory (see run-pipeline).
 
-            linguistics_matrix.append((participant_info["idParticipant"],) 
-                                        + (participant_info["interviewNumber"],)
-                                        + estimate_linguistics(cleaned_tags) 
-                                        + (participant_info["status"],))
+    Parameters
+    ----------
+    tagged_transcripts: iterable of (file name, POS tags) of every transcription
+    window_sizes: window sizes (in words) used for the windowed measures
+    is_verbose: boolean value to print processing info to console
+    sink: feature sink of the measures (see utils.sink_util.FeatureSink), None to return them
+
+    Returns
+    ----------
+    linguistics_matrix: array of linguistic metrics (empty with a sink).
+    """
+
+    linguistics_matrix = []
+    # With a sink, every row is written as soon as it is calculated
+    add_row = sink.write_row if sink is not None else linguistics_matrix.append
+
+    for file_name, cleaned_tags in tagged_transcripts:
+        if is_verbose:
+            print("Processing transcript", file_name)
+
+        participant_info = extract_participant_info(file_name)
+        # Words are spell checked once, for the whole text and the windowed measures
+        known_words = extract_known_words(cleaned_tags)
+
+        add_row((participant_info["idParticipant"],) 
+                + (participant_info["interviewNumber"],)
+                + estimate_linguistics(cleaned_tags, known_words) 
+                + estimate_windowed_linguistics(cleaned_tags, window_sizes, known_words)
+                + (participant_info["status"],))
 
     return linguistics_matrix
 
-def estimate_linguistics(cleaned_tags):
+def estimate_linguistics(cleaned_tags, known_words=None):
     """
     This function estimates linguistic metrics of a transcription's POS tags. (Refer to the files documentation for information on those metrics)
 
     Parameters
     ----------
     cleaned_tags: POS tags to process
+    known_words: (words, lemmas) of the tags known by the spell checker (see extract_known_words), extracted if None
 
     Returns
     ----------
     linguistics_features: array of linguistic metrics for the given dialog
     """
 
-    linguistics_features = []
-    
-    ## Hyper-Parameters
-    # Used for Brunet's W Index (Brunet, 1978). 0.172 is the original value proposed by Brunet
-    c = 0.172
-    
-    ## Initial states
-    text_size = 0
-    vocab_size = 0
-    hapax_legomena = 0
-    hapax_dislegomena = 0
-    brunet_index = 0
-    honore_r_statistics = 0
-    ttr = 0
-    sichel_s = 0
-    yule_k = 0
-    entropy = 0
-    
+    words, lemmas = known_words if known_words is not None else extract_known_words(cleaned_tags)
+
+    # The metrics are the ones of a linguistic accumulator fed with the whole transcription (one implementation of
+    # the formulas, see utils.lexical_util.LexicalAccumulator)
+    accumulator = LexicalAccumulator()
+    for word, lemma in zip(words, lemmas):
+        accumulator.add_word(word, lemma)
+
+    return accumulator.measures()
+
+def estimate_windowed_linguistics(cleaned_tags, window_sizes=DEFAULT_WINDOW_SIZES, known_words=None):
+    """
+    This function estimates the windowed linguistic metrics of a transcription's POS tags. Unlike the whole text measures,
+    those don't depend on the text length which makes short and long transcriptions comparable.
+
+    Parameters
+    ----------
+    cleaned_tags: POS tags to process
+    window_sizes: window sizes (in words)
+    known_words: (words, lemmas) of the tags known by the spell checker (see extract_known_words), extracted if None
+
+    Returns
+    ----------
+    windowed_features: MATTR, windowed Yule's K and windowed entropy for every window size
+    """
+
+    words, _ = known_words if known_words is not None else extract_known_words(cleaned_tags)
+
+    windowed_features = ()
+    for window_size in window_sizes:
+        windowed_features += estimate_windowed_measures(words, window_size)
+
+    return windowed_features
+
+def create_linguistic_accumulator():
+    """
+    This function creates an incremental accumulator of the linguistic metrics (same word filtering as :func:`estimate_linguistics`).
+    It is used for live transcription streams: tags are added with `add_tokens()` after each utterance and
+    `measures()` returns the same metrics as :func:`estimate_linguistics` would on the whole transcription, without re-processing it.
+
+    Returns
+    ----------
+    accumulator: a LexicalAccumulator filtering words unknown to the spell checker
+    """
+
+    return LexicalAccumulator(word_filter=lambda word: bool(spell.known([word])))
+
+def extract_known_words(cleaned_tags):
+    """
+    This function extracts the words (and their lemmas) known by the spell checker.
+
+    Parameters
+    ----------
+    cleaned_tags: POS tags to process
+
+    Returns
+    ----------
+    words: list of known words
+    lemmas: list of the lemmas of those words
+    """
+
     words = []
     lemmas = []
-    
+
     for tag in cleaned_tags:
         if type(tag) is Tag and spell.known([tag.original]):
-            ## TEXTSIZE
-            text_size += 1
-            
             words.append(tag.original)
             lemmas.append(tag.lemma)
 
-    ## VOCAB SIZE : Number of different lemmas
-    lemmas_counts = Counter(lemmas)
-    vocab_size = len(lemmas_counts)
-    
-    ## LEMMAS
-    for (lemma, count) in lemmas_counts.items():
-        ## HAPAX LEGOMENA : Number of lemmas mentioned only once
-        if count == 1: 
-            hapax_legomena += 1 
-        ## HAPAX DISLEGOMENA : Number of lemmas mentioned exactly twice
-        if count == 2:
-            hapax_dislegomena += 1
-            
-    ## BRUNET'S W INDEX
-    if text_size > 0 and vocab_size > 0:
-        brunet_index = text_size ** vocab_size ** (-c)
-        
-    ## HONORÉ'S R STATISTICS
-    if text_size > 0 and vocab_size > 0 and (1 - (hapax_legomena / vocab_size) > 0):
-        honore_r_statistics = (100 * math.log(text_size)) / (1 - (hapax_legomena / vocab_size))
-         
-    ## TYPE TOKEN RATION
-    if vocab_size > 0:
-        ttr = hapax_legomena / vocab_size
-        
-    ## SICHEL'S S
-    if vocab_size > 0:
-        sichel_s = hapax_dislegomena / vocab_size
-  
-    ## YULE'S CHARACTERISTIC K
-    words_count = Counter(words)
-    n = sum(words_count.values())
-    n2 = sum([i ** 2 for i in words_count.values()])
-    if n > 0:
-        yule_k = 10000 * ((n2-n) / (n**2)) - (1 / n)
-        
-    ## ENTROPY
-    if text_size > 0:
-        entropy = -sum(count / text_size * math.log(count / text_size, 2) for count in words_count.values())
-
-    return (text_size, vocab_size, hapax_legomena, hapax_dislegomena, brunet_index, honore_r_statistics, ttr, sichel_s, yule_k, entropy)
+    return words, lemmas
     
 def print_results(results):
     print("")
     print("LINGUISTIC MEASURES RESULTS (Average per transcription)")
     print("------------------------")
-    print(results.drop('idParticipant', 1).drop('interviewNumber', 1).drop('status', 1).mean())
+    print(results.means())
 
 if __name__ == "__main__":
     main()
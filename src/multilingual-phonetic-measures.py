@@ -3,13 +3,24 @@
 """
 The :mod:`src.multilingual-phonetic-measures` implements a multilingual tool that calculates phonetic metrics from audio signals.
 It calculates the first 13 MFCCs (Mel-frequency cepstral coefficients) and extracts the mean, skewness, kurtosis and variance of those.
+The same statistics are extracted for other frame-level features (MFCC deltas and delta-deltas, spectral centroid, spectral flux,
+energy and zero-crossing rate), all computed out of one power spectrum per block of frames.
 Those measures are widely used in the litterature of cognitive impairment as it contains valuable information about a patients current health.
 It is mainly used to add more information when comes to modeling and analyzing progression of a disease in a cohort of patients.
 
 Tool parameters
 ----------
-audio_corpus_path: path to the folder containing audio files (.mp3 or .wav)
-features_output_path (optionnal): file path for the extracted measures in a .csv file (e.g.: out/pos-distribution-measures.csv
+audio_corpus_path: path to the folder containing audio files (.mp3 or .wav, MP3 files are decoded in memory)
+features_output_path (optionnal): file path for the extracted measures in a .csv, .parquet or .feather file (e.g.: out/pos-distribution-measures.csv
+feature_sets (optionnal): frame-level features to extract (default: mfcc)
+chunk_frames (optionnal): number of frames computed at a time (bounds memory for long recordings)
+vad (optionnal): voice activity detection, non-speech frames are dropped (vad_on_db and vad_off_db are its thresholds in dBFS)
+pauses (optionnal): acoustic pause measures, frames below pause_db (dBFS) are silent
+segments (optionnal): measures computed over the participant's utterances only (time bullets saved by the normalizer)
+cache (optionnal): measures of unchanged audio files (same content and parameters) are read from a cache
+jobs (optionnal): number of audio files processed in parallel
+resume (optionnal): audio files already measured by the previous run (journal, out/Journals/phonetic.jsonl) are skipped
+classes, participants, modified_after, modified_before (optionnal): only the matching audio files are processed (refer to README.md for more info)
 verbose (optionnal): for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -24,24 +35,29 @@ for evaluating and monitor patient's linguistic/phonetic functions.
 # Free software: MIT license
 
 import argparse
+import heapq
 import os
 import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 
 import numpy as np
-import pandas as pd
-import scipy.io.wavfile as wav
-from pydub import AudioSegment
-from python_speech_features import mfcc
-from scipy.stats import kurtosis, skew
-
-from utils.corpus_util import obtain_corpus_classes, extract_participant_info
-from utils.data_util import export_dataframe
+
+from utils.audio_util import is_mp3_file, is_wav_file, open_audio_blocks, read_audio
+from utils.cache_util import BlobCache, hash_file, make_cache_key
+from utils.corpus_util import add_corpus_filter_arguments, create_corpus_index, extract_participant_info, get_corpus_index
+from utils.journal_util import StageJournal
+from utils.phonetic_util import (DEFAULT_FRAMES_PER_BLOCK, PAUSE_CATEGORIES, PAUSE_DB, PHONETIC_FEATURE_SETS, VAD_OFF_DB,
+                                 VAD_ON_DB, PauseDetector, PhoneticFeatureExtractor, VoiceActivityDetector)
 from utils.pickle_util import read_pickle
+from utils.sink_util import FeatureSink, make_schema
 
 # Constants
+# Time segments of the participant's utterances, saved by the normalizer
 DIALOG_INFO_PATH = "out/DialogsInfo/PAR/"
-AUDIO_CUT_OUTPUT_PATH = "out/AudioCuts/"
 PHONETIC_FEATURES_EXPORT_PATH = "out/ExtractedFeatures/phonetic_features.csv"
 PHONETIC_FEATURES = ["idParticipant", "interviewNumber", 
                "mean_1", "mean_2", "mean_3", "mean_4", "mean_5", "mean_6", "mean_7", "mean_8", 
@@ -56,18 +72,62 @@ PHONETIC_FEATURES = ["idParticipant", "interviewNumber",
                "variance_7", "variance_8", "variance_9", "variance_10", "variance_11", "variance_12", 
                "variance_13",
                "status"]
+STATISTICS = ["mean", "kurtosis", "skewness", "variance"]
+VAD_FEATURES = ["voicedDuration", "voicedRatio", "nbVoicedSegments", "meanVoicedSegmentDuration"]
+# Same categories as the nbPauses* measures of the normalizer (transcribed pauses)
+PAUSE_FEATURES = (["nbAcousticPausesTotal"] + ["nbAcousticPauses" + category for category in PAUSE_CATEGORIES]
+                  + ["acousticPausesDuration" + category for category in PAUSE_CATEGORIES] + ["meanAcousticPauseDuration"])
+# Only the MFCC measures by default (legacy columns), the other feature sets are extracted on demand
+DEFAULT_FEATURE_SETS = ["mfcc"]
 # MFCC parameters               
 WINLEN = 0.025
 NFFT = 1200
+NUMCEP = 13
+# Only the first seconds of MP3 files are analyzed
+MP3_MAX_DURATION = 30
+# Cache of the measures of every audio file, keyed by the audio content and the measures parameters
+PHONETIC_CACHE_PATH = "out/Cache/phonetic_features.sqlite"
+DEFAULT_CACHE_SIZE_MB = 256
+# To be incremented when the computation of the measures changes (invalidates the cache)
+PHONETIC_MEASURES_VERSION = 1
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Multilingual phonetic measures calculator.')
     parser.add_argument(dest='audio_corpus_path',
                     help='path to the folder containing all audios of the corpus')
     parser.add_argument('-f', '--features_output_path', dest='features_output_path',
-                    help='path to folder where phonetic features will be stored (.csv file)')
+                    help='path to folder where phonetic features will be stored (.csv, .parquet or .feather file)')
+    parser.add_argument('-s', '--feature_sets', dest='feature_sets', nargs='+', default=DEFAULT_FEATURE_SETS,
+                    choices=list(PHONETIC_FEATURE_SETS), help='frame-level features to extract (mfcc is always extracted)')
+    parser.add_argument('-c', '--chunk_frames', dest='chunk_frames', type=int, default=DEFAULT_FRAMES_PER_BLOCK,
+                    help='number of frames computed at a time (bounds memory for long recordings)')
+    parser.add_argument('--vad', dest='is_vad', default=False, action='store_true',
+                    help='voice activity detection: only speech frames are used (default: all frames, legacy mode)')
+    parser.add_argument('--vad_on_db', dest='vad_on_db', type=float, default=VAD_ON_DB,
+                    help='frame energy (dBFS) above which speech starts')
+    parser.add_argument('--vad_off_db', dest='vad_off_db', type=float, default=VAD_OFF_DB,
+                    help='frame energy (dBFS) below which speech stops')
+    parser.add_argument('--pauses', dest='is_pauses', default=False, action='store_true',
+                    help='acoustic pause measures (silent intervals between speech, counted per duration category)')
+    parser.add_argument('--pause_db', dest='pause_db', type=float, default=PAUSE_DB,
+                    help='frame energy (dBFS) below which a frame is silent')
+    parser.add_argument('--segments', dest='is_segments', default=False, action='store_true',
+                    help="measures over the participant's utterances only (*PAR time bullets saved by the normalizer)")
+    parser.add_argument('--cache', dest='is_cache', default=False, action='store_true',
+                    help='read the measures of unchanged audio files from the cache (and store the new ones)')
+    parser.add_argument('--cache_path', dest='cache_path', default=PHONETIC_CACHE_PATH,
+                    help='path to the cache file (sqlite)')
+    parser.add_argument('--cache_size', dest='cache_size', type=float, default=DEFAULT_CACHE_SIZE_MB,
+                    help='maximum size of the cache in MB (least recently used measures are evicted)')
+    parser.add_argument('--clear_cache', dest='is_clear_cache', default=False, action='store_true',
+                    help='remove every entry of the cache before processing')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                    help='number of audio files processed in parallel (worker processes)')
+    parser.add_argument('--resume', dest='is_resume', default=False, action='store_true',
+                    help='skip the audio files already measured by the previous run (journal)')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                     help='print processing info')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
 def main():
@@ -80,98 +140,358 @@ def main():
         print("Given audio corpus path doesn't exist.")
         sys.exit(1)
 
-    corpus_classes = obtain_corpus_classes(args.audio_corpus_path)
+    corpus_index = create_corpus_index(args.audio_corpus_path, args)
+    corpus_classes = corpus_index.classes()
 
     if args.is_verbose:
         print("CORPUS CLASSES")
         print("------------------------")
         print(corpus_classes)
 
-    phonetic_matrix = process_corpus(args.audio_corpus_path, is_verbose=args.is_verbose)
+    # MFCC measures are always the first ones (legacy columns)
+    feature_sets = ["mfcc"] + [feature_set for feature_set in PHONETIC_FEATURE_SETS
+                               if feature_set in args.feature_sets and feature_set != "mfcc"]
+
+    cache_options = (args.cache_path, int(args.cache_size * (1 << 20))) if args.is_cache else None
+    if args.is_clear_cache and os.path.exists(args.cache_path):
+        with BlobCache(args.cache_path) as cache:
+            cache.clear()
 
-    df_phonetic_results = pd.DataFrame(phonetic_matrix, columns=PHONETIC_FEATURES)
-    
-    print_results(df_phonetic_results)
+    vad_thresholds = (args.vad_on_db, args.vad_off_db) if args.is_vad else None
+    pause_db = args.pause_db if args.is_pauses else None
 
+    # A journal is only resumed for the same corpus and measures parameters
+    journal_config = {"corpus_path": os.path.abspath(args.audio_corpus_path), "version": PHONETIC_MEASURES_VERSION,
+                      "feature_sets": feature_sets, "vad_thresholds": vad_thresholds, "pause_db": pause_db,
+                      "is_segments": args.is_segments}
     output_path = args.features_output_path if args.features_output_path else PHONETIC_FEATURES_EXPORT_PATH
-    export_dataframe(df_phonetic_results, output_path)
+    with StageJournal("phonetic", journal_config, args.is_resume) as journal, \
+         FeatureSink(output_path, get_phonetic_schema(feature_sets, args.is_vad, args.is_pauses)) as sink:
+        process_corpus(corpus_index, feature_sets, chunk_frames=args.chunk_frames, vad_thresholds=vad_thresholds,
+                       pause_db=pause_db, is_segments=args.is_segments, cache_options=cache_options, jobs=args.jobs,
+                       is_verbose=args.is_verbose, journal=journal, sink=sink)
+
+    print_results(sink)
 
-def process_corpus(audio_corpus_path, is_verbose=False):
+def get_phonetic_features(feature_sets, is_vad=False, is_pauses=False):
     """
-    This is the main function that processes given audio corpus to calculate phonetic measures. (13 first MFCCs)
+    Returns the measures columns: the legacy MFCC columns (PHONETIC_FEATURES) followed by the statistics of the other
+    feature sets (e.g. mean_delta_1, ..., variance_zcr), in the order of the given feature sets, the voice activity
+    statistics (VAD_FEATURES) if voice activity detection is used and the acoustic pause measures (PAUSE_FEATURES).
+    """
+    columns = PHONETIC_FEATURES[:-1]
+    for feature_set in feature_sets:
+        if feature_set == "mfcc":
+            continue
+        if PHONETIC_FEATURE_SETS[feature_set].is_cepstral:
+            columns = columns + [statistic + "_" + feature_set + "_" + str(i)
+                                 for statistic in STATISTICS for i in range(1, NUMCEP + 1)]
+        else:
+            columns = columns + [statistic + "_" + feature_set for statistic in STATISTICS]
+    if is_vad:
+        columns = columns + VAD_FEATURES
+    if is_pauses:
+        columns = columns + PAUSE_FEATURES
+    return columns + PHONETIC_FEATURES[-1:]
+
+def get_phonetic_schema(feature_sets, is_vad=False, is_pauses=False):
+    """Returns the typed columns of the measures (see get_phonetic_features), every measure is a float."""
+    return make_schema(get_phonetic_features(feature_sets, is_vad, is_pauses))
+
+def process_corpus(audio_corpus_index, feature_sets=DEFAULT_FEATURE_SETS, chunk_frames=DEFAULT_FRAMES_PER_BLOCK,
+                   vad_thresholds=None, pause_db=None, is_segments=False, cache_options=None, jobs=1,
+                   dialog_time_segments=None, is_verbose=False, journal=None, sink=None):
+    """
+    This is the main function that processes given audio corpus to calculate phonetic measures. (13 first MFCCs and other frame-level features)
+    Audio files are processed in sorted file name order, in parallel if jobs > 1 (process pool).
+    A file that can't be processed (e.g. corrupt MP3) is reported and skipped, it doesn't abort the others.
+    With a journal, the measures of every file are recorded as soon as they are calculated and the files already
+    measured by the previous run (and unchanged since) are skipped: their journaled measures are used instead.
+    The time segments (is_segments) aren't part of the journal, a resumed run assumes they didn't change.
+    With a sink, the rows are written to the output file as soon as they are calculated instead of being returned.
 
     Parameters
     ----------
-    audio_corpus_path: path to a folder containing all audios (.mp3 or .wav)
+    audio_corpus_index: index of the audios to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all audios (.mp3 or .wav)
+    feature_sets: frame-level features to extract (names of PHONETIC_FEATURE_SETS, mfcc first)
+    chunk_frames: number of frames computed at a time
+    vad_thresholds: (on_db, off_db) thresholds of the voice activity detection, None to use all frames
+    pause_db: silence threshold of the acoustic pause measures, None to skip them
+    is_segments: if True, measures are computed over the participant's utterances only (DIALOG_INFO_PATH)
+    cache_options: (cache path, maximum size in bytes) of the measures cache, None to compute every file
+    jobs: number of worker processes
+    dialog_time_segments: time segments of the participant's utterances by transcript name (without extension),
+                          e.g. passed in memory by run-pipeline, used instead of DIALOG_INFO_PATH if given
     is_verbose: boolean value to print processing info to console
+    journal: journal of the run (see utils.journal_util.StageJournal), None to measure every audio file
+    sink: feature sink of the measures (see utils.sink_util.FeatureSink), None to return them
 
     Returns
     ----------
-    phonetics_matrix: array of phonetic metrics of the 13 first MFCCs (mean, skewness, kurtosis and variance)
+    phonetics_matrix: array of phonetic metrics of the 13 first MFCCs and other features (mean, skewness, kurtosis and variance),
+                      empty with a sink
     """
 
+    start_time = time.perf_counter()
+
+    audio_corpus_index = get_corpus_index(audio_corpus_index)
+    file_names = audio_corpus_index.file_names()
+    done_file_names = set()
+    if journal is not None:
+        done_file_names = set(file_name for file_name in file_names
+                              if journal.is_done(file_name, audio_corpus_index.file_hash(file_name)))
+
     phonetics_matrix = []
+    add_row = sink.write_row if sink is not None else phonetics_matrix.append
+    nb_files, nb_processed = 0, 0
+    pending_index = audio_corpus_index.filter(file_names=[file_name for file_name in file_names
+                                                          if file_name not in done_file_names])
+    # Rows in sorted file name order: the journaled rows of the files already measured are merged with the new ones
+    journaled_results = ((file_name, journal.row(file_name), None) for file_name in sorted(done_file_names))
+    results = process_audio_files(pending_index, feature_sets, chunk_frames, vad_thresholds, pause_db, is_segments,
+                                  cache_options, jobs, dialog_time_segments)
+    for file_name, phonetics_row, error in heapq.merge(journaled_results, results, key=lambda result: result[0]):
+        if file_name in done_file_names:
+            add_row(phonetics_row)
+            continue
+
+        nb_files += 1
+        if is_verbose:
+            print("Processing transcript", file_name)
+
+        if error:
+            print("Couldn't process", file_name, ":", error)
+            if journal is not None:
+                journal.record_error(file_name, audio_corpus_index.file_hash(file_name), error)
+        else:
+            nb_processed += 1
+            add_row(phonetics_row)
+            if journal is not None:
+                journal.record(file_name, audio_corpus_index.file_hash(file_name), phonetics_row)
+
+    elapsed_time = time.perf_counter() - start_time
+    print("Processed", nb_processed, "of", nb_files, "audio files in", round(elapsed_time, 2), "s",
+          "(" + str(round(nb_files / max(elapsed_time, 1e-9), 2)), "files/sec)")
 
-    for file in os.listdir(audio_corpus_path):
-        file_name = os.fsdecode(file)
+    return phonetics_matrix
 
-        if not file_name.startswith("."): 
-            if is_verbose:
-                print("Processing transcript", file_name)
+def process_audio_files(audio_corpus_index, feature_sets=DEFAULT_FEATURE_SETS, chunk_frames=DEFAULT_FRAMES_PER_BLOCK,
+                        vad_thresholds=None, pause_db=None, is_segments=False, cache_options=None, jobs=1,
+                        dialog_time_segments=None):
+    """
+    This function calculates the phonetic measures of every audio file of an index (see process_corpus for the
+    parameters), in sorted file name order. It is a generator: the result of every file is yielded as soon as it is
+    ready (in order), e.g. to record it before the next one.
 
-            file_path = audio_corpus_path + "/" + file_name
+    Returns
+    ----------
+    (file name, phonetics row, error) of every audio file: see process_audio_file
+    """
 
-            # If file is mp3, convert to wav
-            if file_name.lower().endswith(".mp3"):
+    audio_corpus_index = get_corpus_index(audio_corpus_index)
+
+    # To make sure it doesn't process a file other than .wav or .mp3 format
+    file_names = [file_name for file_name in audio_corpus_index.file_names()
+                  if is_wav_file(file_name) or is_mp3_file(file_name)]
+    file_paths = [audio_corpus_index.file_path(file_name) for file_name in file_names]
+    # The hashes of the index (see utils.corpus_util.CorpusIndex) are the audio content part of the cache keys, audios
+    # are only hashed with a cache
+    file_hashes = [audio_corpus_index.file_hash(file_name) if cache_options is not None else None
+                   for file_name in file_names]
+    if is_segments and dialog_time_segments is not None:
+        files_time_segments = [dialog_time_segments.get(re.sub(r'\.\w+$', "", file_name)) for file_name in file_names]
+    else:
+        files_time_segments = [None] * len(file_names)
+
+    process_file = partial(process_audio_file, feature_sets=feature_sets, chunk_frames=chunk_frames,
+                           vad_thresholds=vad_thresholds, pause_db=pause_db, is_segments=is_segments,
+                           cache_options=cache_options)
+    if jobs > 1:
+        for file_name, (phonetics_row, error) in zip(file_names, process_in_pool(process_file, jobs, file_paths,
+                                                                                 files_time_segments, file_hashes)):
+            yield file_name, phonetics_row, error
+    else:
+        for file_name, (phonetics_row, error) in zip(file_names, map(process_file, file_paths, files_time_segments,
+                                                                      file_hashes)):
+            yield file_name, phonetics_row, error
+
+def process_in_pool(process_file, jobs, *files_args):
+    """
+    This function processes files in a process pool of jobs workers (process_file returning (phonetics row, error)
+    for the arguments of a file) and yields the results in the files' order, as soon as they are ready.
+    A worker that dies (e.g. killed out of memory or crashing on a corrupt audio) breaks the pool: the files that weren't
+    done are then processed one by one, each in its own pool, until the one that breaks it is found. That file gets an
+    error and the other files go on in a fresh pool.
+    """
+    files_args = list(zip(*files_args))
+    results = {}
+    next_index = 0
+    pending_indexes = list(range(len(files_args)))
+
+    while pending_indexes:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(process_file, *files_args[index]): index for index in pending_indexes}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    # Results are yielded in order, as soon as they are ready
+                    while next_index in results:
+                        yield results.pop(next_index)
+                        next_index += 1
+            except BrokenProcessPool:
+                pass
+        pending_indexes = [index for index in pending_indexes if index not in results and index >= next_index]
+
+        # Files left after a broken pool are isolated, one pool each, until the one breaking the pool is found
+        while pending_indexes:
+            index = pending_indexes.pop(0)
+            with ProcessPoolExecutor(max_workers=1) as executor:
                 try:
-                    song = AudioSegment.from_mp3(file_path)
-                    song = song[: 30 * 1000 ]
-                    song.export(file_path[:-3] + "wav", format="wav")
-                    pattern = re.compile(file_path, re.IGNORECASE)
-                    pattern.sub(".mp3", ".wav")
-                except Exception as e:
-                    print(e)
-
-            participant_info = extract_participant_info(file_name)
-
-            # To make sure it doesn't process a file other than .wav format
-            if file_path.lower().endswith(".wav"):
-                phonetics = estimate_phonetics(file_path)
-                phonetics_matrix.append(np.concatenate([[participant_info["idParticipant"]], 
-                                                        [participant_info["interviewNumber"]], 
-                                                        np.mean(phonetics, axis=0),
-                                                        kurtosis(phonetics, axis=0),
-                                                        skew(phonetics, axis=0),
-                                                        np.var(phonetics, axis = 0),
-                                                        [participant_info["status"]]]))
+                    results[index] = executor.submit(process_file, *files_args[index]).result()
+                    is_broken = False
+                except BrokenProcessPool:
+                    results[index] = (None, "worker process died (" + BrokenProcessPool.__name__ + ")")
+                    is_broken = True
+            while next_index in results:
+                yield results.pop(next_index)
+                next_index += 1
+            if is_broken:
+                break
+
+def process_audio_file(file_path, time_segments=None, file_hash=None, feature_sets=DEFAULT_FEATURE_SETS, chunk_frames=DEFAULT_FRAMES_PER_BLOCK,
+                       vad_thresholds=None, pause_db=None, is_segments=False, cache_options=None):
+    """
+    This function calculates the phonetic measures of one audio file (it is run by the worker processes).
+    Errors are returned instead of raised so one file can't abort the whole corpus.
+    With a cache, measures are keyed by the hash of the audio content and of every parameter of the measures
+    (MFCC parameters, feature sets, VAD and pause settings, time segments): a changed file or parameter is a cache miss.
 
-    return phonetics_matrix
+    Parameters
+    ----------
+    file_path: path to a an audio file (.wav or .mp3)
+    time_segments: time segments of the participant's utterances (with is_segments), read from DIALOG_INFO_PATH if None
+    file_hash: hash of the audio content (e.g. from the corpus index), computed if None
+    feature_sets: frame-level features to extract
+    chunk_frames: number of frames computed at a time
+    vad_thresholds: (on_db, off_db) thresholds of the voice activity detection, None to use all frames
+    pause_db: silence threshold of the acoustic pause measures, None to skip them
+    is_segments: if True, measures are computed over the participant's utterances only (DIALOG_INFO_PATH)
+    cache_options: (cache path, maximum size in bytes) of the measures cache, None to compute the measures
 
-def estimate_phonetics(dialog_audio_path):
+    Returns
+    ----------
+    phonetics_row: participant's info and phonetic metrics, a list of typed values (None if the file couldn't be processed)
+    error: error message (None if the file was processed)
+    """
+
+    try:
+        participant_info = extract_participant_info(os.path.basename(file_path))
+        if not is_segments:
+            time_segments = None
+        elif time_segments is None:
+            segments_path = DIALOG_INFO_PATH + re.sub(r'\.\w+$', ".pkl", os.path.basename(file_path))
+            if not os.path.exists(segments_path):
+                raise IOError("no time segments (" + segments_path + "), run the normalizer on the chat transcript first")
+            time_segments = read_pickle(segments_path)
+
+        if cache_options is None:
+            phonetics_statistics = estimate_phonetics(file_path, feature_sets, chunk_frames, vad_thresholds, pause_db,
+                                                      time_segments)
+        else:
+            cache_key = make_cache_key(file_hash if file_hash is not None else hash_file(file_path),
+                                       {"version": PHONETIC_MEASURES_VERSION, "winlen": WINLEN, "nfft": NFFT,
+                                        "numcep": NUMCEP, "mp3_max_duration": MP3_MAX_DURATION,
+                                        "feature_sets": list(feature_sets), "vad_thresholds": vad_thresholds,
+                                        "pause_db": pause_db, "time_segments": time_segments})
+            with BlobCache(*cache_options) as cache:
+                phonetics_vector = cache.get_array(cache_key)
+                if phonetics_vector is None:
+                    phonetics_vector = np.concatenate(estimate_phonetics(file_path, feature_sets, chunk_frames,
+                                                                         vad_thresholds, pause_db, time_segments))
+                    cache.put_array(cache_key, phonetics_vector)
+            phonetics_statistics = [phonetics_vector]
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+    # A list rather than one array, so the measures stay floats next to the participant's info (strings)
+    phonetics_row = ([participant_info["idParticipant"], participant_info["interviewNumber"]]
+                     + np.concatenate(phonetics_statistics).tolist()
+                     + [participant_info["status"]])
+    return phonetics_row, None
+
+def estimate_phonetics(dialog_audio_path, feature_sets=DEFAULT_FEATURE_SETS, chunk_frames=DEFAULT_FRAMES_PER_BLOCK,
+                       vad_thresholds=None, pause_db=None, time_segments=None):
     """
-    This function estimates phonetic metrics of an audio. It uses the tool mfcc of the python_speech_features library.
+    This function estimates phonetic metrics of an audio. WAV files are memory-mapped (MP3 files are decoded block by block,
+    only the first MP3_MAX_DURATION seconds) and frames are computed chunk_frames at a time: the power spectrum of a block
+    of frames is shared by every feature and frame values are streamed into moment accumulators.
+    With voice activity detection, non-speech frames are dropped before any spectrum is computed. Acoustic pauses are
+    detected in the same pass (so the audio is decoded only once).
+    With time segments, only those segments of the signal are used (slices of the memory-mapped signal, nothing is written):
+    every segment is processed on its own and their statistics are merged.
     We hardcoded the number of cepstrum since in most of cases we only want the 13 first ones.
 
     Parameters
     ----------
-    dialog_audio_path: path to a an audio file
+    dialog_audio_path: path to a an audio file (.wav or .mp3)
+    feature_sets: frame-level features to extract
+    chunk_frames: number of frames computed at a time
+    vad_thresholds: (on_db, off_db) thresholds of the voice activity detection, None to use all frames
+    pause_db: silence threshold of the acoustic pause measures, None to skip them
+    time_segments: list of (start, end) times in milliseconds (e.g. the participant's utterances), None for the whole audio
 
     Returns
     ----------
-    mfcc_features: 13 first mfcc measures
+    phonetics_statistics: mean, kurtosis, skewness and variance of every feature set (and voice activity and pause statistics)
     """
 
-    (rate, sig) = wav.read(dialog_audio_path)
-    
-    mfcc_features = mfcc(sig, rate, winlen=WINLEN, nfft=NFFT, numcep=13)
-    
-    return mfcc_features
+    create_extractor = partial(create_phonetic_extractor, feature_sets=feature_sets, chunk_frames=chunk_frames,
+                               vad_thresholds=vad_thresholds, pause_db=pause_db)
+
+    if time_segments is None:
+        rate, blocks = open_audio_blocks(dialog_audio_path, mp3_max_duration=MP3_MAX_DURATION)
+        extractor = create_extractor(rate)
+        for block in blocks:
+            extractor.feed(block)
+    else:
+        # MP3 files are decoded up to the end of the last segment
+        mp3_max_duration = max((end for _, end in time_segments), default=0) / 1000
+        rate, signal = read_audio(dialog_audio_path, mp3_max_duration=mp3_max_duration, mmap=True)
+
+        extractor = None
+        for start, end in time_segments:
+            segment = signal[int(start * rate / 1000):int(end * rate / 1000)]
+            if len(segment) == 0:
+                continue
+            segment_extractor = create_extractor(rate)
+            segment_extractor.feed(segment)
+            extractor = segment_extractor if extractor is None else extractor.merge(segment_extractor)
+
+        if extractor is None:
+            raise ValueError("no time segment in the audio")
+
+    phonetics_statistics = extractor.statistics()
+    if vad_thresholds:
+        phonetics_statistics.append(extractor.voiced_statistics())
+    if pause_db is not None:
+        phonetics_statistics.append(extractor.pause_statistics())
+    return phonetics_statistics
+
+def create_phonetic_extractor(rate, feature_sets=DEFAULT_FEATURE_SETS, chunk_frames=DEFAULT_FRAMES_PER_BLOCK,
+                              vad_thresholds=None, pause_db=None):
+    """
+    Creates a phonetic feature extractor (with its voice activity and pause detectors) for a signal of the given rate.
+    """
+    vad = VoiceActivityDetector(*vad_thresholds) if vad_thresholds else None
+    pause_detector = PauseDetector(pause_db) if pause_db is not None else None
+    return PhoneticFeatureExtractor(rate, feature_sets, frames_per_block=chunk_frames, vad=vad,
+                                    pause_detector=pause_detector, winlen=WINLEN, nfft=NFFT, numcep=NUMCEP)
 
 def print_results(results):
     print("")
     print("PHONETIC MEASURES RESULTS (Average per transcription)")
     print("------------------------")
-    print(results.drop('idParticipant', 1).drop('interviewNumber', 1).drop('status', 1).astype(float).mean())
+    print(results.means())
 
 if __name__ == "__main__":
     main()
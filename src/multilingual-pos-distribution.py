@@ -9,7 +9,8 @@ It calculates FREQUENCIES and RATIOS of the following tags: ADJ, CONJ, NOUN, ADP
 Tool parameters
 ----------
 corpus_path: path to the folder containing TAGGED (with universal tags) transcriptions (MUST contain only transcription files)
-features_output_path (optionnal): file path for the extracted measures in a .csv file (e.g.: out/pos-distribution-measures.csv)
+features_output_path (optionnal): file path for the extracted measures in a .csv, .parquet or .feather file (e.g.: out/pos-distribution-measures.csv)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
 verbose (optionnal): for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -27,26 +28,35 @@ import argparse
 import os
 import re
 import sys
-from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 
-from utils.corpus_util import extract_tags, obtain_corpus_classes, extract_participant_info
-from utils.data_util import export_dataframe
+from utils.corpus_util import (extract_tags, extract_participant_info, add_corpus_filter_arguments,
+                               create_corpus_index, get_corpus_index)
 from utils.pickle_util import read_pickle
-from utils.nlp_util import UniversalPOS, Tag
+from utils.nlp_util import UniversalPOS, encode_universal_tags
+from utils.sink_util import DEFAULT_BATCH_SIZE, FeatureSink, make_schema
 
 # CONSTANTS
 POS_DISTRIBUTION_FEATURES_PATH = "out/ExtractedFeatures/pos_distribution.csv"
+# Columns of the distribution (see build_pos_distribution), frequencies are counts and ratios percentages
+POS_DISTRIBUTION_SCHEMA = make_schema(["idParticipant", "interviewNumber"]
+                                      + [measure.lower() + suffix for measure in UniversalPOS.UNIVERSAL_TAGSET
+                                         for suffix in ["Freq", "Ratio"]]
+                                      + ["totalWordCount", "status"],
+                                      int_columns=[measure.lower() + "Freq" for measure in UniversalPOS.UNIVERSAL_TAGSET]
+                                      + ["totalWordCount"])
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Multilingual pos distribution calculator.')
     parser.add_argument(dest='corpus_path',
                     help='path to the folder containing all transcripts with POS tags')
     parser.add_argument('-f', '--features_output_path', dest='features_output_path',
-                    help='path to folder where normalizing features will be stored (.csv file)')
+                    help='path to folder where normalizing features will be stored (.csv, .parquet or .feather file)')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                     help='print processing info')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
 def main():
@@ -59,67 +69,127 @@ def main():
         print("Given corpus path doesn't exist.")
         sys.exit(1)
 
-    corpus_classes = obtain_corpus_classes(args.corpus_path)
+    corpus_index = create_corpus_index(args.corpus_path, args)
+    corpus_classes = corpus_index.classes()
 
     if args.is_verbose:
         print("CORPUS CLASSES")
         print("------------------------")
         print(corpus_classes)
 
-    pos_distribution = process_corpus(args.corpus_path, args.is_verbose)
-
-    df_pos_distribution = pd.DataFrame(pos_distribution)
-    
-    print_results(df_pos_distribution)
-
     output_path = args.features_output_path if args.features_output_path else POS_DISTRIBUTION_FEATURES_PATH
-    export_dataframe(df_pos_distribution, output_path)
+    with FeatureSink(output_path, POS_DISTRIBUTION_SCHEMA) as sink:
+        process_corpus(corpus_index, args.is_verbose, sink)
 
-def process_corpus(corpus_path, is_verbose=False):
+    print_results(sink)
+
+def process_corpus(corpus_index, is_verbose=False, sink=None):
     """
     This is the main function that processes given corpus to calculate POS tag distribution.
+    Counts of every transcription are stored in one preallocated matrix (one row per transcription, one column per tag code)
+    from which frequencies and ratios are computed as whole-matrix operations.
 
     Parameters
     ----------
-    corpus_path: path to a folder containing all transcriptions
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all transcriptions
     is_verbose: boolean value to print processing info to console
+    sink: feature sink of the distribution (see utils.sink_util.FeatureSink), None to return it
 
     Returns
     ----------
-    corpus_pos_distribution: array of float values corresponding the POS tag distribution (frequency and ratio)
+    corpus_pos_distribution: dataframe of the POS tag distribution (frequency and ratio) of every transcription (None with a sink)
     """
 
-    corpus_pos_distribution = []
+    corpus_index = get_corpus_index(corpus_index)
+    file_names = corpus_index.file_names()
 
-    for file in os.listdir(corpus_path):
-        file_name = os.fsdecode(file)
+    tagged_transcripts = ((file_name, extract_tags(corpus_index.file_path(file_name))) for file_name in file_names)
 
-        # To make sure we don't process hidden files
-        if not file_name.startswith("."):
-            if is_verbose:
-                    print("Processing transcript", file_name)
+    return process_tagged_transcripts(tagged_transcripts, is_verbose=is_verbose, sink=sink)
 
-            results = defaultdict(int)
-            
-            participant_info = extract_participant_info(file_name)
+def process_tagged_transcripts(tagged_transcripts, is_verbose=False, sink=None):
+    """
+    This function calculates the POS tag distribution of tagged transcriptions, read from files (see process_corpus)
+    or passed in memory (see run-pipeline).
+    Counts are stored in preallocated blocks of DEFAULT_BATCH_SIZE rows, so the number of transcriptions doesn't need
+    to be known beforehand. With a sink, the distribution of a block is written as soon as it is full, so memory
+    doesn't grow with the corpus.
 
-            tags = extract_tags(os.path.join(corpus_path, file_name))
+    Parameters
+    ----------
+    tagged_transcripts: iterable of (file name, POS tags) of every transcription
+    is_verbose: boolean value to print processing info to console
+    sink: feature sink of the distribution (see utils.sink_util.FeatureSink), None to return it
 
-            pos_distribution, total_word_count = calculate_pos_frequency(tags, is_verbose=is_verbose)
+    Returns
+    ----------
+    corpus_pos_distribution: dataframe of the POS tag distribution (frequency and ratio) of every transcription (None with a sink)
+    """
 
-            results["idParticipant"] = participant_info["idParticipant"]
-            results["interviewNumber"] = participant_info["interviewNumber"]
-            for measure in UniversalPOS.UNIVERSAL_TAGSET:
-                freq_idx = measure.lower() + "Freq"
-                ratio_idx = measure.lower() + "Ratio"
-                results[freq_idx] = pos_distribution[measure]
-                results[ratio_idx] = (pos_distribution[measure] * 100) / total_word_count
-            results["totalWordCount"] = total_word_count 
-            results["status"] = participant_info["status"]
+    participants_info = []
+    # Full blocks of counts (kept only without a sink)
+    count_blocks = []
+    pos_counts = np.zeros((DEFAULT_BATCH_SIZE, UniversalPOS.NB_TAG_CODES), dtype=np.int64)
+    row = 0
+
+    for file_name, tags in tagged_transcripts:
+        if is_verbose:
+                print("Processing transcript", file_name)
+
+        participants_info.append(extract_participant_info(file_name))
+        pos_counts[row], _ = calculate_pos_frequency(tags, is_verbose=is_verbose)
+        row += 1
+
+        if row == DEFAULT_BATCH_SIZE:
+            if sink is not None:
+                sink.write_dataframe(build_pos_distribution(participants_info, pos_counts))
+                participants_info = []
+            else:
+                count_blocks.append(pos_counts)
+                pos_counts = np.zeros((DEFAULT_BATCH_SIZE, UniversalPOS.NB_TAG_CODES), dtype=np.int64)
+            row = 0
+
+    # The last block is trimmed to the rows actually seen
+    count_blocks.append(pos_counts[:row])
+
+    if sink is None:
+        return build_pos_distribution(participants_info, np.concatenate(count_blocks))
+    if participants_info:
+        sink.write_dataframe(build_pos_distribution(participants_info, count_blocks[-1]))
+
+def build_pos_distribution(participants_info, pos_counts):
+    """
+    This function computes the POS tag distribution (frequencies and ratios) out of the tag counts of every transcription,
+    as whole-matrix operations.
 
-            corpus_pos_distribution.append(results)
+    Parameters
+    ----------
+    participants_info: participant's info of every transcription (see extract_participant_info)
+    pos_counts: matrix of the tag counts (one row per transcription, one column per tag code)
 
-    return corpus_pos_distribution
+    Returns
+    ----------
+    corpus_pos_distribution: dataframe of the POS tag distribution (frequency and ratio) of every transcription
+    """
+
+    nb_tags = len(UniversalPOS.UNIVERSAL_TAGSET)
+    punct_code = UniversalPOS.UNIVERSAL_TAG_CODES[UniversalPOS.PUNCT_TAG]
+    total_word_count = pos_counts.sum(axis=1) - pos_counts[:, punct_code]
+    pos_freq = pos_counts[:, :nb_tags]
+    # Transcriptions without words have ratios of 0
+    pos_ratio = np.divide(pos_freq * 100, total_word_count[:, np.newaxis], out=np.zeros(pos_freq.shape),
+                          where=total_word_count[:, np.newaxis] > 0)
+
+    corpus_pos_distribution = {}
+    corpus_pos_distribution["idParticipant"] = [info["idParticipant"] for info in participants_info]
+    corpus_pos_distribution["interviewNumber"] = [info["interviewNumber"] for info in participants_info]
+    for code, measure in enumerate(UniversalPOS.UNIVERSAL_TAGSET):
+        corpus_pos_distribution[measure.lower() + "Freq"] = pos_freq[:, code]
+        corpus_pos_distribution[measure.lower() + "Ratio"] = pos_ratio[:, code]
+    corpus_pos_distribution["totalWordCount"] = total_word_count
+    corpus_pos_distribution["status"] = [info["status"] for info in participants_info]
+
+    return pd.DataFrame(corpus_pos_distribution)
 
 def calculate_pos_frequency(pos_tags, is_verbose=False):
     """
@@ -133,30 +203,23 @@ def calculate_pos_frequency(pos_tags, is_verbose=False):
 
     Returns
     ----------
-    pos_distribution: array of float values corresponding the POS tag distribution (frequency and ratio)
+    pos_distribution: array of tag counts indexed by tag code (see UniversalPOS.UNIVERSAL_TAG_CODES), 
+                      the last one being the count of non universal tags
     total_word_count: word count the current POS tags list
     """
 
-    pos_distribution = defaultdict(int)
-    missed_tag_count = 0
-    total_word_count = 0
-
-    for pos_tag in pos_tags:
-        if type(pos_tag) is Tag:
-            if pos_tag.tag:
-                if pos_tag.tag != UniversalPOS.PUNCT_TAG:
-                    total_word_count += 1
-                if pos_tag.tag in UniversalPOS.UNIVERSAL_TAGSET:
-                    pos_distribution[pos_tag.tag] += 1
+    tag_codes = encode_universal_tags(pos_tags)
+    pos_distribution = np.bincount(tag_codes, minlength=UniversalPOS.NB_TAG_CODES)
 
-    total_word_count += missed_tag_count
+    total_word_count = len(tag_codes) - pos_distribution[UniversalPOS.UNIVERSAL_TAG_CODES[UniversalPOS.PUNCT_TAG]]
     return pos_distribution, total_word_count
 
 def print_results(results):
     print("")
     print("POS DISTRIBUTION RESULTS (Average per transcription)")
     print("------------------------")
-    print(results[[x for x in results if x.endswith('Freq')]].mean())
+    means = results.means()
+    print(means[[x for x in means.index if x.endswith('Freq')]])
     
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.multilingual-pos-ngrams` implements a multilingual tool that calculates POS tag n-gram distribution metrics
+(e.g. rate of DET-NOUN-VERB patterns). Those POS tag have been previously made by the :mod:`src.multilingual-pos-tagger` tool.
+
+N-grams never cross a sentence boundary. They are encoded as packed integers and counted over the whole corpus
+with vectorized operations. Only the top-K most frequent n-grams of the corpus are kept as features.
+It exports the RATIOS of those n-grams (percentage of the n-grams of the same order in the transcription) and
+the sparse matrix of their counts.
+
+Tool parameters
+----------
+corpus_path: path to the folder containing TAGGED (with universal tags) transcriptions (MUST contain only transcription files)
+ngram_orders (optionnal): n-gram orders to extract (default: 2 3)
+top_k (optionnal): number of n-grams kept as features (default: 100)
+features_output_path (optionnal): file path for the extracted measures in a .csv, .parquet or .feather file (e.g.: out/pos-ngrams-measures.csv)
+matrix_output_path (optionnal): file path for the sparse n-gram counts matrix in a .npz file
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
+verbose (optionnal): for debugging purpose
+
+This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios
+for evaluating and monitor patient's linguistic/phonetic functions.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils.corpus_util import extract_tags, add_corpus_filter_arguments, create_corpus_index, get_corpus_index
+from utils.data_util import export_sparse_matrix
+from utils.ngram_util import (SENTENCE_BOUNDARY_CODE, count_corpus_ngrams, decode_pos_ngram,
+                              encode_pos_ngrams, ngram_order)
+from utils.nlp_util import encode_universal_tags
+from utils.sink_util import DEFAULT_BATCH_SIZE, FeatureSink, make_schema
+
+# CONSTANTS
+POS_NGRAMS_FEATURES_PATH = "out/ExtractedFeatures/pos_ngrams.csv"
+POS_NGRAMS_MATRIX_PATH = "out/ExtractedFeatures/pos_ngrams_counts.npz"
+DEFAULT_NGRAM_ORDERS = [2, 3]
+DEFAULT_TOP_K = 100
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Multilingual pos n-grams distribution calculator.')
+    parser.add_argument(dest='corpus_path',
+                    help='path to the folder containing all transcripts with POS tags')
+    parser.add_argument('-n', '--ngram_orders', dest='ngram_orders', type=int, nargs='+', default=DEFAULT_NGRAM_ORDERS,
+                    help='n-gram orders to extract (e.g. 2 3 4)')
+    parser.add_argument('-k', '--top_k', dest='top_k', type=int, default=DEFAULT_TOP_K,
+                    help='number of most frequent n-grams of the corpus kept as features')
+    parser.add_argument('-f', '--features_output_path', dest='features_output_path',
+                    help='path to folder where n-gram features will be stored (.csv, .parquet or .feather file)')
+    parser.add_argument('-m', '--matrix_output_path', dest='matrix_output_path',
+                    help='path where the sparse n-gram counts matrix will be stored (.npz file)')
+    parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
+                    help='print processing info')
+    add_corpus_filter_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if not os.path.isdir(args.corpus_path):
+        print("Given corpus path is not a directory")
+        sys.exit(1)
+    if not os.path.exists(args.corpus_path):
+        print("Given corpus path doesn't exist.")
+        sys.exit(1)
+    if args.top_k < 1:
+        print("Given number of n-grams (top_k) must be at least 1.")
+        sys.exit(1)
+
+    corpus_index = create_corpus_index(args.corpus_path, args)
+    corpus_classes = corpus_index.classes()
+
+    if args.is_verbose:
+        print("CORPUS CLASSES")
+        print("------------------------")
+        print(corpus_classes)
+
+    participants_info, ngram_counts, ngram_ratios, vocabulary = process_corpus(corpus_index, args.ngram_orders,
+                                                                               args.top_k, args.is_verbose)
+
+    ngram_names = [decode_pos_ngram(ngram_key) for ngram_key in vocabulary]
+    ratio_columns = [name.lower() + "Ratio" for name in ngram_names]
+
+    output_path = args.features_output_path if args.features_output_path else POS_NGRAMS_FEATURES_PATH
+    with FeatureSink(output_path, make_schema(["idParticipant", "interviewNumber"] + ratio_columns + ["status"])) as sink:
+        write_ngram_ratios(sink, participants_info, ngram_ratios, ratio_columns)
+
+    print_results(sink)
+
+    matrix_output_path = args.matrix_output_path if args.matrix_output_path else POS_NGRAMS_MATRIX_PATH
+    export_sparse_matrix(ngram_counts, ngram_names,
+                         [info["status"] + "_" + info["idParticipant"] + "-" + info["interviewNumber"] for info in participants_info],
+                         matrix_output_path)
+
+def process_corpus(corpus_index, ngram_orders=DEFAULT_NGRAM_ORDERS, top_k=DEFAULT_TOP_K, is_verbose=False):
+    """
+    This is the main function that processes given corpus to calculate POS tag n-grams distribution.
+
+    Parameters
+    ----------
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all transcriptions
+    ngram_orders: list of n-gram orders to extract
+    top_k: number of most frequent n-grams of the corpus kept as features
+    is_verbose: boolean value to print processing info to console
+
+    Returns
+    ----------
+    participants_info: list of participant information of every transcription (row)
+    ngram_counts: sparse matrix (CSR) of n-gram counts (one row per transcription, one column per n-gram)
+    ngram_ratios: sparse matrix (CSR) of n-gram ratios (percentage of the n-grams of the same order in the transcription)
+    vocabulary: packed n-grams of each column
+    """
+
+    participants_info = []
+    corpus_ngram_keys = []
+    ngram_totals = []
+
+    corpus_index = get_corpus_index(corpus_index)
+
+    for file_name in corpus_index.file_names():
+        if is_verbose:
+                print("Processing transcript", file_name)
+
+        participants_info.append(corpus_index.participant_info(file_name))
+
+        tags = extract_tags(corpus_index.file_path(file_name))
+
+        ngram_keys = extract_pos_ngrams(tags, ngram_orders)
+
+        corpus_ngram_keys.append(np.concatenate(ngram_keys))
+        ngram_totals.append([len(keys) for keys in ngram_keys])
+
+    ngram_counts, vocabulary = count_corpus_ngrams(corpus_ngram_keys, top_k)
+
+    # Each n-gram is divided by the number of n-grams of the same order in the transcription. Only the non-zero counts
+    # are scaled (their total is never 0), so the ratios stay sparse
+    ngram_totals = np.array(ngram_totals, dtype=np.int64).reshape(len(participants_info), len(ngram_orders))
+    column_orders = np.array([ngram_orders.index(ngram_order(ngram_key)) for ngram_key in vocabulary], dtype=np.int64)
+    rows = np.repeat(np.arange(ngram_counts.shape[0]), np.diff(ngram_counts.indptr))
+    ngram_ratios = sparse.csr_matrix(((ngram_counts.data * 100) / ngram_totals[rows, column_orders[ngram_counts.indices]],
+                                      ngram_counts.indices, ngram_counts.indptr), shape=ngram_counts.shape)
+
+    return participants_info, ngram_counts, ngram_ratios, vocabulary
+
+def write_ngram_ratios(sink, participants_info, ngram_ratios, ratio_columns):
+    """
+    This function writes the n-gram ratios of every transcription to a feature sink. The sparse ratios are only
+    densified by blocks of DEFAULT_BATCH_SIZE transcriptions.
+
+    Parameters
+    ----------
+    sink: feature sink of the ratios (see utils.sink_util.FeatureSink)
+    participants_info: list of participant information of every transcription (row)
+    ngram_ratios: sparse matrix (CSR) of n-gram ratios (see process_corpus)
+    ratio_columns: column of each n-gram
+    """
+
+    for start in range(0, len(participants_info), DEFAULT_BATCH_SIZE):
+        block_info = participants_info[start:start + DEFAULT_BATCH_SIZE]
+        df_pos_ngrams = pd.DataFrame(ngram_ratios[start:start + len(block_info)].toarray(), columns=ratio_columns)
+        df_pos_ngrams.insert(0, "idParticipant", [info["idParticipant"] for info in block_info])
+        df_pos_ngrams.insert(1, "interviewNumber", [info["interviewNumber"] for info in block_info])
+        df_pos_ngrams["status"] = [info["status"] for info in block_info]
+        sink.write_dataframe(df_pos_ngrams)
+
+def extract_pos_ngrams(pos_tags, ngram_orders=DEFAULT_NGRAM_ORDERS):
+    """
+    This function extracts the POS tag n-grams of a transcription as packed integers. N-grams don't cross sentence boundaries.
+
+    Parameters
+    ----------
+    pos_tags: array of tags (sentences are separated by a non Tag element, e.g. "\\n")
+    ngram_orders: list of n-gram orders to extract
+
+    Returns
+    ----------
+    ngram_keys: list of arrays of packed n-grams (one array per n-gram order)
+    """
+
+    tag_codes = encode_universal_tags(pos_tags, boundary_code=SENTENCE_BOUNDARY_CODE)
+    return [encode_pos_ngrams(tag_codes, n) for n in ngram_orders]
+
+def print_results(results):
+    print("")
+    print("POS N-GRAMS RESULTS (Average per transcription)")
+    print("------------------------")
+    means = results.means()
+    print(means[[x for x in means.index if x.endswith('Ratio')]].head(20))
+
+if __name__ == "__main__":
+    main()
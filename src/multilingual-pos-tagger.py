@@ -9,6 +9,9 @@ Tool parameters
 corpus_path: path to the folder containing CLEANED transcriptions (MUST contain only transcription files)
 language_code: language code that represents the language in which we wanna tag words
 universal_tag: path to a universal map configuration file (refer to README.md for more info)
+parse (optionnal): also saves the dependency parses (used by :mod:`src.multilingual-syntactic-measures`)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
+resume (optionnal): transcripts already tagged by the previous run (journal, out/Journals/tagger.jsonl) are skipped
 is_verbose: for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -28,14 +31,11 @@ import os
 import subprocess
 import sys
 
-import spacy
-
-from utils.corpus_util import obtain_corpus_classes
+from utils.corpus_util import add_corpus_filter_arguments, create_corpus_index, get_corpus_index
+from utils.journal_util import StageJournal
 from utils.nlp_util import UniversalPOS
-
-# Spacy Models (Supports Chinese, Danish, Dutch, English, French, German, Greek, Italian, 
-# Japanese, Lithuanian, Norwegian Bokmål, Polish, Portuguese, Romanian & Spanish)
-# https://spacy.io/usage/models for mor info
+from utils.spacy_util import SPACY_BATCH_SIZE, get_parser_version, get_spacy_model
+from utils.syntax_util import build_parse, save_parses
 
 # CONSTANTS
 TAGGED_DIALOG_OUTPUT_PATH = "out/TaggedDialogs"
@@ -48,8 +48,13 @@ def parse_args():
                     help='Language code (zh, da, nl, en, fr, de, el, it, ja, lt, nb, pl, pt, ro, es)')
     parser.add_argument('-u', '--universal_tag', default=False, action='store_true',
                     help='if you want the universal form of tags or with the morphological complexity of tags')
+    parser.add_argument('-p', '--parse', dest='parse', default=False, action='store_true',
+                    help='also save the dependency parses of the transcripts (for syntactic measures)')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                     help='print processing info')
+    parser.add_argument('--resume', dest='is_resume', default=False, action='store_true',
+                    help='skip the transcripts already tagged by the previous run (journal)')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
 def main():
@@ -67,87 +72,101 @@ def main():
 
     spacy_model = get_spacy_model(language_code=args.language_code)
 
-    corpus_classes = obtain_corpus_classes(args.corpus_path)
+    corpus_index = create_corpus_index(args.corpus_path, args)
+    corpus_classes = corpus_index.classes()
 
     if args.is_verbose:
         print("CORPUS CLASSES")
         print("------------------------")
         print(corpus_classes)
 
-    process_corpus(args.corpus_path, spacy_model, universal_tag=args.universal_tag)
+    # A journal is only resumed for the same corpus, model and options
+    journal_config = {"corpus_path": os.path.abspath(args.corpus_path), "language_code": args.language_code,
+                      "model_version": spacy_model.meta.get("version"), "universal_tag": args.universal_tag,
+                      "parse": args.parse}
+    with StageJournal("tagger", journal_config, args.is_resume) as journal:
+        process_corpus(corpus_index, spacy_model, universal_tag=args.universal_tag, parse=args.parse,
+                       is_verbose=args.is_verbose, journal=journal)
 
     print("-------------------")
     print("POS tagging task done.")
 
-def process_corpus(corpus_path, spacy_model, universal_tag=True, is_verbose=False):
+def process_corpus(corpus_index, spacy_model, universal_tag=True, parse=False, is_verbose=False, journal=None):
     """
     This is the main function that processes given corpus to tag it. It iterates thru every transcriptions and tag them.
+    Transcriptions are fed to spaCy in batches (nlp.pipe).
     Finally, it converts some tag to there universal form (e.g.: VBG --> VERB)
+    A transcription that can't be read or saved is reported and skipped, it doesn't abort the others.
+    With a journal, every transcription is recorded as soon as it is saved and the ones already tagged by the previous
+    run (and unchanged since) are skipped.
 
     Parameters
     ----------
-    corpus_path: path to a folder containing all transcriptions
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all transcriptions
     spacy_model: spaCy model used for POS tagging
     universal_tag: if you want universal tag or morphological tag
+    parse: if you want to save the dependency parses (list of Parse objects per transcription) made in the same spaCy run
     is_verbose: boolean value to print processing info to console
+    journal: journal of the run (see utils.journal_util.StageJournal), None to tag every transcription
     """
 
     if not os.path.exists(TAGGED_DIALOG_OUTPUT_PATH):
         os.makedirs(TAGGED_DIALOG_OUTPUT_PATH)
-    
-    for file in os.listdir(corpus_path):
-        file_name = os.fsdecode(file)
 
-        # To make sure we don't process hidden files
-        if not file_name.startswith("."):
-            if is_verbose:
-                    print("Processing transcript", file_name)
+    corpus_index = get_corpus_index(corpus_index)
+    file_names = [file_name for file_name in corpus_index.file_names()
+                  if journal is None or not journal.is_done(file_name, corpus_index.file_hash(file_name))]
+
+    # Every doc comes with its file name (transcriptions that can't be read are skipped)
+    docs = spacy_model.pipe(read_transcripts(corpus_index, file_names, journal), batch_size=SPACY_BATCH_SIZE,
+                            as_tuples=True)
 
-            file_path = corpus_path + "/" + file_name
-            output_file_path = TAGGED_DIALOG_OUTPUT_PATH + "/" + file_name
+    for doc, file_name in docs:
+        if is_verbose:
+                print("Processing transcript", file_name)
 
-            input_file = open(file_path, "r")
-            doc = spacy_model(input_file.read())
-                
+        output_file_path = TAGGED_DIALOG_OUTPUT_PATH + "/" + file_name
+
+        try:
             with open(output_file_path, 'w') as output_file:
-                for token in doc:
-                    if universal_tag:
-                        output_file.write(token.text + " " + token.lemma_ + " " + token.pos_ + "\n")
-                    else:
-                        output_file.write(token.text + " " + token.lemma_ + " " + token.tag_ + "\n")
+                output_file.write(format_tagged_doc(doc, universal_tag))
+
+            if parse:
+                save_parses([build_parse(sentence) for sentence in doc.sents], file_name,
+                            get_parser_version(spacy_model.lang))
+        except Exception as e:
+            report_error(file_name, e, corpus_index, journal)
+            continue
 
+        if journal is not None:
+            journal.record(file_name, corpus_index.file_hash(file_name))
 
-def get_spacy_model(language_code):
+def format_tagged_doc(doc, universal_tag=True):
     """
-    This function will fetch the good spaCy model depending on the given language code.
+    This function formats the tags of a spaCy doc as the tagged transcript files: one "word lemma tag" line per token.
+    """
+    if universal_tag:
+        return "".join(token.text + " " + token.lemma_ + " " + token.pos_ + "\n" for token in doc)
+    return "".join(token.text + " " + token.lemma_ + " " + token.tag_ + "\n" for token in doc)
 
-    Parameters
-    ----------
-    language_code: language code (e.g. fr, en, es)
-    universal_tag: if we want the universal tag or keep the morphological complexity of tags
+def read_transcripts(corpus_index, file_names, journal=None):
+    """
+    This function reads transcriptions one at a time (generator), so that nlp.pipe never holds the whole corpus in memory.
+    Every transcription is yielded with its file name, the ones that can't be read are reported and skipped.
     """
-    switcher = {
-        "zh": lambda: spacy.load("zh_core_web_sm"),
-        "da": lambda: spacy.load("da_core_news_sm"),
-        "nl": lambda: spacy.load("nl_core_news_sm"),
-        "en": lambda: spacy.load("en_core_web_sm"),
-        "fr": lambda: spacy.load("fr_core_news_sm"),
-        "de": lambda: spacy.load("de_core_news_sm"),
-        "el": lambda: spacy.load("el_core_news_sm"),
-        "it": lambda: spacy.load("it_core_news_sm"),
-        "ja": lambda: spacy.load("ja_core_news_sm"),
-        "lt": lambda: spacy.load("lt_core_news_sm"),
-        "nb": lambda: spacy.load("nb_core_news_sm"),
-        "pl": lambda: spacy.load("pl_core_news_sm"),
-        "pt": lambda: spacy.load("pt_core_news_sm"),
-        "ro": lambda: spacy.load("ro_core_news_sm"),
-        "es": lambda: spacy.load("es_core_news_sm")
-    }
-    model = switcher[language_code]()
-
-    if not model:
-        return spacy.load("en_core_web_sm")
-    return model
+    for file_name in file_names:
+        try:
+            with open(corpus_index.file_path(file_name), "r") as input_file:
+                text = input_file.read()
+        except Exception as e:
+            report_error(file_name, e, corpus_index, journal)
+            continue
+        yield text, file_name
+
+def report_error(file_name, error, corpus_index, journal=None):
+    print("Couldn't process", file_name, ":", str(error) or type(error).__name__)
+    if journal is not None:
+        journal.record_error(file_name, corpus_index.file_hash(file_name), str(error) or type(error).__name__)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.multilingual-syntactic-measures` implements a multilingual tool that calculates syntactic complexity metrics
+out of the dependency parses of transcriptions (using spaCy).
+Here's a list of the calculated metrics:
+- Number of sentences
+- Mean and maximum dependency tree depth (per sentence)
+- Mean dependency distance (in words, punctuation excluded)
+- Number of clauses and clauses per sentence
+
+Dependency parses saved by the :mod:`src.multilingual-pos-tagger` tool (-p flag) are reused, so transcriptions aren't parsed twice.
+Transcriptions without saved parses are parsed in batches (nlp.pipe) with the same cached spaCy model and their parses are saved.
+
+Tool parameters
+----------
+corpus_path: path to the folder containing CLEANED transcriptions (same as the POS tagger, MUST contain only transcription files)
+language_code: language code that represents the language of the transcriptions
+features_output_path (optionnal): file path for the extracted measures in a .csv, .parquet or .feather file (e.g.: out/syntactic-measures.csv)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
+verbose (optionnal): for debugging purpose
+
+This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios
+for evaluating and monitor patient's linguistic/phonetic functions.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from utils.corpus_util import add_corpus_filter_arguments, create_corpus_index, get_corpus_index
+from utils.sink_util import FeatureSink, make_schema
+from utils.spacy_util import SPACY_BATCH_SIZE, get_parser_version, get_spacy_model
+from utils.syntax_util import build_parse, compute_dependency_distances, count_clauses, load_parses, save_parses
+
+# Constants
+SYNTACTIC_FEATURES_EXPORT_PATH = "out/ExtractedFeatures/syntactic_features.csv"
+SYNTACTIC_FEATURES = ["idParticipant", "interviewNumber", "nb_sentences", "mean_max_depth", "max_depth",
+                      "mean_dependency_distance", "nb_clauses", "clauses_per_sentence", "status"]
+SYNTACTIC_SCHEMA = make_schema(SYNTACTIC_FEATURES, int_columns=["nb_sentences", "max_depth", "nb_clauses"])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Multilingual syntactic feature calculator.')
+    parser.add_argument(dest='corpus_path',
+                    help='path to the folder containing all normalized transcripts')
+    parser.add_argument(dest='language_code',
+                    help='Language code (zh, da, nl, en, fr, de, el, it, ja, lt, nb, pl, pt, ro, es)')
+    parser.add_argument('-f', '--features_output_path', dest='features_output_path',
+                    help='path to folder where syntactic features will be stored (.csv, .parquet or .feather file)')
+    parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
+                    help='print processing info')
+    add_corpus_filter_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if not os.path.isdir(args.corpus_path):
+        print("Given corpus path is not a directory")
+        sys.exit(1)
+    if not os.path.exists(args.corpus_path):
+        print("Given corpus path doesn't exist.")
+        sys.exit(1)
+
+    corpus_index = create_corpus_index(args.corpus_path, args)
+    corpus_classes = corpus_index.classes()
+
+    if args.is_verbose:
+        print("CORPUS CLASSES")
+        print("------------------------")
+        print(corpus_classes)
+
+    output_path = args.features_output_path if args.features_output_path else SYNTACTIC_FEATURES_EXPORT_PATH
+    with FeatureSink(output_path, SYNTACTIC_SCHEMA) as sink:
+        process_corpus(corpus_index, args.language_code, args.is_verbose, sink)
+
+    print_results(sink)
+
+def process_corpus(corpus_index, language_code, is_verbose=False, sink=None):
+    """
+    This is the main function that processes given transcriptions corpus to calculate syntactic measures.
+
+    Parameters
+    ----------
+    corpus_index: index of the CLEANED transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all CLEANED transcriptions.
+    language_code: language code of the transcriptions (e.g. fr, en, es)
+    is_verbose: boolean value to print processing info to console
+    sink: feature sink of the measures (see utils.sink_util.FeatureSink), None to return them
+
+    Returns
+    ----------
+    syntactic_matrix: array of syntactic metrics (empty with a sink).
+    """
+
+    corpus_index = get_corpus_index(corpus_index)
+    file_names = corpus_index.file_names()
+
+    corpus_parses = load_corpus_parses(corpus_index, file_names, language_code, is_verbose)
+
+    syntactic_matrix = []
+    # With a sink, every row is written as soon as it is calculated
+    add_row = sink.write_row if sink is not None else syntactic_matrix.append
+    for file_name in file_names:
+        participant_info = corpus_index.participant_info(file_name)
+
+        add_row((participant_info["idParticipant"],)
+                + (participant_info["interviewNumber"],)
+                + estimate_syntactics(corpus_parses[file_name])
+                + (participant_info["status"],))
+
+    return syntactic_matrix
+
+def load_corpus_parses(corpus_index, file_names, language_code, is_verbose=False):
+    """
+    This function loads the dependency parses of every transcription. Parses saved by the POS tagger are reused
+    (unless the transcription is more recent or they were made for another language, spaCy model or spaCy version). Other transcriptions are parsed in batches with nlp.pipe and their parses are saved.
+
+    Parameters
+    ----------
+    corpus_index: index of the CLEANED transcriptions (see utils.corpus_util.CorpusIndex)
+    file_names: transcriptions to load
+    language_code: language code of the transcriptions (e.g. fr, en, es)
+    is_verbose: boolean value to print processing info to console
+
+    Returns
+    ----------
+    corpus_parses: dictionary of the list of Parse objects (one per sentence) of every transcription
+    """
+
+    corpus_parses = {}
+    files_to_parse = []
+    parser_version = get_parser_version(language_code)
+
+    for file_name in file_names:
+        parses = load_parses(file_name, parser_version, corpus_index.modification_time(file_name))
+        if parses is not None:
+            corpus_parses[file_name] = parses
+        else:
+            files_to_parse.append(file_name)
+
+    if files_to_parse:
+        spacy_model = get_spacy_model(language_code)
+        texts = (read_transcript(corpus_index.file_path(file_name)) for file_name in files_to_parse)
+
+        for file_name, doc in zip(files_to_parse, spacy_model.pipe(texts, batch_size=SPACY_BATCH_SIZE)):
+            if is_verbose:
+                print("Parsing transcript", file_name)
+
+            corpus_parses[file_name] = [build_parse(sentence) for sentence in doc.sents]
+            save_parses(corpus_parses[file_name], file_name, parser_version)
+
+    return corpus_parses
+
+def read_transcript(file_path):
+    with open(file_path, "r") as input_file:
+        return input_file.read()
+
+def estimate_syntactics(parses):
+    """
+    This function estimates syntactic metrics of a transcription's dependency parses. (Refer to the files documentation for information on those metrics)
+
+    Parameters
+    ----------
+    parses: list of Parse objects (one per sentence)
+
+    Returns
+    ----------
+    syntactic_features: array of syntactic metrics for the given dialog
+    """
+
+    # Whitespace only "sentences" (e.g. line breaks) aren't counted
+    parses = [parse for parse in parses if any(word.strip() for (word, _, _, _) in parse.parsing)]
+
+    nb_sentences = len(parses)
+    mean_max_depth = 0
+    max_depth = 0
+    mean_dependency_distance = 0
+    nb_clauses = 0
+    clauses_per_sentence = 0
+
+    if nb_sentences > 0:
+        depths = np.array([parse.max_depth for parse in parses])
+        mean_max_depth = depths.mean()
+        max_depth = int(depths.max())
+
+        dependency_distances = np.concatenate([compute_dependency_distances(parse) for parse in parses])
+        if len(dependency_distances) > 0:
+            mean_dependency_distance = dependency_distances.mean()
+
+        nb_clauses = sum(count_clauses(parse) for parse in parses)
+        clauses_per_sentence = nb_clauses / nb_sentences
+
+    return (nb_sentences, mean_max_depth, max_depth, mean_dependency_distance, nb_clauses, clauses_per_sentence)
+
+def print_results(results):
+    print("")
+    print("SYNTACTIC MEASURES RESULTS (Average per transcription)")
+    print("------------------------")
+    print(results.means())
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,9 @@ corpus_path: path to the folder containing transcriptions (MUST contain only tra
 synonym_conf_path (optionnal): file path of the synonym reducing task configuration file (refer to README.md for more info)
 interjections_conf_path (optionnal): file path of the interjections extraction task configuration file (refer to README.md for more info)
 expressions_conf_path (optionnal): file path of the expressions extraction task configuration file (refer to README.md for more info)
-features_output_path (optionnal): file path for the extracted measures in a .csv file (e.g.: out/extracted-measures.csv)
+features_output_path (optionnal): file path for the extracted measures in a .csv, .parquet or .feather file (e.g.: out/extracted-measures.csv)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
+resume (optionnal): transcripts already normalized by the previous run (journal, out/Journals/normalizer.jsonl) are skipped
 verbose (optionnal): for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -39,15 +41,18 @@ import re
 import sys
 from collections import defaultdict
 
-import pandas as pd
-
 from utils.cleaning_util import *
-from utils.corpus_util import (extract_participant_info,
+from utils.corpus_util import (add_corpus_filter_arguments,
+                               create_corpus_index,
+                               extract_participant_info,
                                extract_transcript_lines,
                                extract_two_speaker_dialogs,
-                               obtain_corpus_classes)
-from utils.data_util import export_dataframe, save_dialog_in_file
+                               get_corpus_index)
+from utils.cache_util import hash_file
+from utils.data_util import save_dialog_in_file
+from utils.journal_util import StageJournal
 from utils.pickle_util import write_pickle
+from utils.sink_util import FeatureSink, make_schema
 
 ## CONSTANTS ##
 CLEANED_DIALOG_PAR_PATH = 'out/CleanedDialogs/PAR/Original/'
@@ -56,11 +61,23 @@ CLEANED_DIALOG_INT_PATH = 'out/CleanedDialogs/INT/Original/'
 CLEANED_DIALOG_PAR_SYN_PATH = 'out/CleanedDialogs/PAR/SynonymReduced/'
 CLEANED_DIALOG_INT_SYN_PATH = 'out/CleanedDialogs/INT/SynonymReduced/'
 
+# Time segments (start and end in milliseconds) of the participant's utterances, for the phonetic measures
+DIALOG_INFO_PAR_PATH = 'out/DialogsInfo/PAR/'
+
 MARKERS_DISTRIBUTION_PATH = 'out/ExtractedFeatures/discursive_markers_distribution.csv'
 
-CLEANING_MEASURES_DICT = {"nbPausesTotal", "nbPausesShort", "nbPausesMedium", "nbPausesLong",
-                          "nbPausesOther", "nbExpressions", "nbInterjections", "nbIncWords",
-                          "nbIncPhrases", "nbErrors", "nbRepetitions", "nbRetracings", "nbSynonyms"}
+# For now, text files and chat files are supported
+TRANSCRIPT_EXTENSIONS = (".cha", ".txt")
+
+# A list (not a set) so the columns of the measures are always in the same order
+CLEANING_MEASURES = ["nbPausesTotal", "nbPausesShort", "nbPausesMedium", "nbPausesLong",
+                     "nbPausesOther", "nbExpressions", "nbInterjections", "nbIncWords",
+                     "nbIncPhrases", "nbErrors", "nbRepetitions", "nbRetracings", "nbSynonyms"]
+# Columns of the measures (see normalize_transcript), counts are integers and ratios floats
+CLEANING_SCHEMA = make_schema(["idParticipant", "interviewNumber"]
+                              + [column for measure in CLEANING_MEASURES for column in [measure, measure + "Ratio"]]
+                              + ["totalWordCount", "status"],
+                              int_columns=CLEANING_MEASURES + ["totalWordCount"])
 
 
 def parse_args():
@@ -74,9 +91,12 @@ def parse_args():
     parser.add_argument('-e', '--expressions_conf_path', dest='expressions_conf_path', default=None,
                         help='file path to config file for expression removal task')
     parser.add_argument('-f', '--features_output_path', dest='features_output_path',
-                        help='path to folder where normalizing features will be stored (.csv file)')
+                        help='path to folder where normalizing features will be stored (.csv, .parquet or .feather file)')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                         help='print processing info')
+    parser.add_argument('--resume', dest='is_resume', default=False, action='store_true',
+                        help='skip the transcripts already normalized by the previous run (journal)')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
 
@@ -96,128 +116,183 @@ def main():
         print("Given expressions config file path doesn't exist.")
         sys.exit(1)
 
-    corpus_classes = obtain_corpus_classes(args.corpus_path)
+    corpus_index = create_corpus_index(args.corpus_path, args, TRANSCRIPT_EXTENSIONS)
+    corpus_classes = corpus_index.classes()
 
     if args.is_verbose:
         print("CORPUS CLASSES")
         print("------------------------")
         print(corpus_classes)
 
-    cleaning_results = process_corpus(args.corpus_path, args.synonyms_conf_path,
-                                      args.interjections_conf_path, args.expressions_conf_path, args.is_verbose)
-
-    df_cleaning_results = pd.DataFrame(cleaning_results)
-
-    print_results(df_cleaning_results)
-
+    # A journal is only resumed for the same corpus and configuration files
+    journal_config = {"corpus_path": os.path.abspath(args.corpus_path),
+                      "configs": [hash_file(conf_path) if conf_path else None
+                                  for conf_path in [args.synonyms_conf_path, args.interjections_conf_path,
+                                                    args.expressions_conf_path]]}
     output_path = args.features_output_path if args.features_output_path else MARKERS_DISTRIBUTION_PATH
-    export_dataframe(df_cleaning_results, output_path)
+    with StageJournal("normalizer", journal_config, args.is_resume) as journal, \
+         FeatureSink(output_path, CLEANING_SCHEMA) as sink:
+        process_corpus(corpus_index, args.synonyms_conf_path, args.interjections_conf_path,
+                       args.expressions_conf_path, args.is_verbose, journal, sink)
 
+    print_results(sink)
 
-def process_corpus(corpus_path, synonyms_conf_path=None, interjections_conf_path=None, expressions_conf_path=None, is_verbose=False):
+
+def process_corpus(corpus_index, synonyms_conf_path=None, interjections_conf_path=None, expressions_conf_path=None, is_verbose=False,
+                   journal=None, sink=None):
     """
     This is the main function that processes given corpus to normalize it and clean it. It iterates thru every transcriptions and clean them while
     extracting cleaning/normalizing measures as FREQUENCIES and RATIOS which can be use for evaluating participant's dialogs.
+    A transcription that can't be processed is reported and skipped, it doesn't abort the others.
+    With a journal, every transcription is recorded as soon as it is processed and the ones already done by the previous
+    run (and unchanged since) are skipped: their measures are read from the journal.
+    With a sink, the measures of every transcription are written to the output file as soon as they are extracted
+    instead of being returned.
 
     Parameters
     ----------
-    corpus_path: path to a folder containing all transcriptions
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all transcriptions
     synonyms_conf_path: path to a configuration file for synonym reducing task (refer to README.md for more info)
     interjections_conf_path: path to a configuration file for interjection extraction task (refer to README.md for more info)
     expressions_conf_path: path to a configuration file for expression extraction task (refer to README.md for more info)
     is_verbose: boolean value to print processing info to console
+    journal: journal of the run (see utils.journal_util.StageJournal), None to process every transcription
+    sink: feature sink of the measures (see utils.sink_util.FeatureSink), None to return them
 
     Returns
     -------
-    cleaning results: a list of all cleaning/normalizing measures extracted during this process
+    cleaning results: a list of all cleaning/normalizing measures extracted during this process (empty with a sink)
     """
     cleaning_results = []
+    add_results = sink.write_row if sink is not None else cleaning_results.append
+
+    corpus_index = get_corpus_index(corpus_index, TRANSCRIPT_EXTENSIONS)
 
     # We iterate thru all files in corpus (all transcriptions)
-    for file in os.listdir(corpus_path):
-        file_name = os.fsdecode(file)
-        is_chat_file = file_name.endswith(".cha")
-        is_txt_file = file_name.endswith(".txt")
-
-        participant_dialog = {}
-        interviewer_dialog = {}
-        results = defaultdict(int)
-        participant_info = {}
-
-        # To make sure we don't process hidden files
-        if not file_name.startswith("."):
-            # For now, text files and chat files are supported
-            if is_txt_file or is_chat_file:
-                if is_verbose:
-                    print("Processing transcript", file_name)
-
-                transcript_lines = extract_transcript_lines(
-                    os.path.join(corpus_path, file_name), is_chat_file)
-
-                participant_info = extract_participant_info(file_name)
-
-                # Chat files normaly contains two speaker dialog which has to be extracted seperatly
-                if is_chat_file:
-                    participant_dialog, interviewer_dialog = extract_two_speaker_dialogs(
-                        transcript_lines, '*PAR:', '*EXP:')
-
-                    cleaning_measures_int, clean_interviewer_dialog, clean_interviewer_dialog_syn = clean_transcription(interviewer_dialog,
-                                                                                                                        synonyms_conf_path,
-                                                                                                                        interjections_conf_path,
-                                                                                                                        expressions_conf_path,
-                                                                                                                        is_chat_file=is_chat_file)
-                    # Save interviewer's dialog with and wihtout synonym reducing
-                    file_path = CLEANED_DIALOG_INT_PATH + \
-                        re.sub(r'\.\w+$', ".txt", file_name)
-                    save_dialog_in_file(clean_interviewer_dialog, file_path)
-
-                    if synonyms_conf_path is not None:
-                        file_path = CLEANED_DIALOG_INT_SYN_PATH + \
-                            re.sub(r'\.\w+$', ".txt", file_name)
-                        save_dialog_in_file(
-                            clean_interviewer_dialog_syn, file_path)
-
-                # In the case of a text file, there's no dialog information to extract nor a interviewer's dialog, only a participant's dialog.
-                elif is_txt_file:
-                    participant_dialog = transcript_lines
-
-                cleaning_measures_par, clean_participant_dialog, clean_participant_dialog_syn = clean_transcription(participant_dialog,
-                                                                                                                    synonyms_conf_path,
-                                                                                                                    interjections_conf_path,
-                                                                                                                    expressions_conf_path,
-                                                                                                                    is_chat_file=is_chat_file)
-
-                # Save the participant's cleaned dialogs with and without synonym reducing
-                file_path = CLEANED_DIALOG_PAR_PATH + \
-                    re.sub(r'\.\w+$', ".txt", file_name)
-                save_dialog_in_file(clean_participant_dialog, file_path)
-
-                if synonyms_conf_path is not None:
-                    file_path = CLEANED_DIALOG_PAR_SYN_PATH + \
-                        re.sub(r'\.\w+$', ".txt", file_name)
-                    save_dialog_in_file(
-                        clean_participant_dialog_syn, file_path)
-
-                # We then add the participant's ID, interview number and status (class) to our results
-                results["idParticipant"] = participant_info["idParticipant"]
-                results["interviewNumber"] = participant_info["interviewNumber"]
-                total_word_count = sum(
-                    transcript["totalWordCount"] for transcript in cleaning_measures_par)
-
-                for measure in CLEANING_MEASURES_DICT:
-                    measure_value = sum(transcript[measure]
-                                        for transcript in cleaning_measures_par)
-                    results[measure] = measure_value
-                    results[measure + "Ratio"] = measure_value / \
-                        total_word_count
-                results["totalWordCount"] = total_word_count
-                results["status"] = participant_info["status"]
-
-                cleaning_results.append(results)
+    for file_name in corpus_index.file_names():
+        # Transcripts are only hashed to be journaled
+        file_hash = corpus_index.file_hash(file_name) if journal is not None else None
+        if journal is not None and journal.is_done(file_name, file_hash):
+            add_results(journal.row(file_name))
+            continue
+
+        if is_verbose:
+            print("Processing transcript", file_name)
+
+        try:
+            results, cleaned_dialogs, time_segments = normalize_transcript(corpus_index.file_path(file_name),
+                                                                           synonyms_conf_path,
+                                                                           interjections_conf_path,
+                                                                           expressions_conf_path)
+
+            save_normalized_transcript(file_name, cleaned_dialogs, time_segments)
+        except Exception as e:
+            print("Couldn't process", file_name, ":", str(e) or type(e).__name__)
+            if journal is not None:
+                journal.record_error(file_name, file_hash, str(e) or type(e).__name__)
+            continue
+
+        if journal is not None:
+            journal.record(file_name, file_hash, results)
+
+        add_results(results)
 
     return cleaning_results
 
 
+def normalize_transcript(file_path, synonyms_conf_path=None, interjections_conf_path=None, expressions_conf_path=None):
+    """
+    This function cleans and normalizes one transcription (.cha or .txt) and extracts its cleaning/normalizing measures.
+    Nothing is written: the cleaned dialogs are returned so they can be saved (see save_normalized_transcript) or
+    passed in memory to the next stages (see run-pipeline).
+
+    Parameters
+    ----------
+    file_path: path to a transcription (.cha or .txt)
+    synonyms_conf_path: path to a configuration file for synonym reducing task (refer to README.md for more info)
+    interjections_conf_path: path to a configuration file for interjection extraction task (refer to README.md for more info)
+    expressions_conf_path: path to a configuration file for expression extraction task (refer to README.md for more info)
+
+    Returns
+    -------
+    results: cleaning/normalizing measures (FREQUENCIES and RATIOS) of the participant's dialog with the participant's info
+    cleaned_dialogs: cleaned dialogs by output folder (e.g. CLEANED_DIALOG_PAR_PATH: participant's cleaned dialog)
+    time_segments: time segments (start and end in milliseconds) of the participant's utterances
+    """
+    file_name = os.path.basename(file_path)
+    is_chat_file = file_name.endswith(".cha")
+
+    results = defaultdict(int)
+    cleaned_dialogs = {}
+
+    transcript_lines = extract_transcript_lines(file_path, is_chat_file)
+
+    participant_info = extract_participant_info(file_name)
+
+    # Chat files normaly contains two speaker dialog which has to be extracted seperatly
+    if is_chat_file:
+        participant_dialog, interviewer_dialog = extract_two_speaker_dialogs(
+            transcript_lines, '*PAR:', '*EXP:')
+
+        cleaning_measures_int, clean_interviewer_dialog, clean_interviewer_dialog_syn, _ = clean_transcription(interviewer_dialog,
+                                                                                                            synonyms_conf_path,
+                                                                                                            interjections_conf_path,
+                                                                                                            expressions_conf_path,
+                                                                                                            is_chat_file=is_chat_file)
+        # Interviewer's dialog with and wihtout synonym reducing
+        cleaned_dialogs[CLEANED_DIALOG_INT_PATH] = clean_interviewer_dialog
+        if synonyms_conf_path is not None:
+            cleaned_dialogs[CLEANED_DIALOG_INT_SYN_PATH] = clean_interviewer_dialog_syn
+
+    # In the case of a text file, there's no dialog information to extract nor a interviewer's dialog, only a participant's dialog.
+    else:
+        participant_dialog = transcript_lines
+
+    cleaning_measures_par, clean_participant_dialog, clean_participant_dialog_syn, time_segments = clean_transcription(participant_dialog,
+                                                                                                        synonyms_conf_path,
+                                                                                                        interjections_conf_path,
+                                                                                                        expressions_conf_path,
+                                                                                                        is_chat_file=is_chat_file)
+
+    # The participant's cleaned dialogs with and without synonym reducing
+    cleaned_dialogs[CLEANED_DIALOG_PAR_PATH] = clean_participant_dialog
+    if synonyms_conf_path is not None:
+        cleaned_dialogs[CLEANED_DIALOG_PAR_SYN_PATH] = clean_participant_dialog_syn
+
+    # We then add the participant's ID, interview number and status (class) to our results
+    results["idParticipant"] = participant_info["idParticipant"]
+    results["interviewNumber"] = participant_info["interviewNumber"]
+    total_word_count = sum(
+        transcript["totalWordCount"] for transcript in cleaning_measures_par)
+
+    for measure in CLEANING_MEASURES:
+        measure_value = sum(transcript[measure]
+                            for transcript in cleaning_measures_par)
+        results[measure] = measure_value
+        results[measure + "Ratio"] = measure_value / \
+            total_word_count
+    results["totalWordCount"] = total_word_count
+    results["status"] = participant_info["status"]
+
+    return results, cleaned_dialogs, time_segments
+
+
+def save_normalized_transcript(file_name, cleaned_dialogs, time_segments):
+    """
+    This function saves the cleaned dialogs of a transcription (one .txt file per output folder) and the time segments
+    of the participant's utterances (chat files with time bullets only). The time segments saved by a previous run are
+    removed if the transcription has none anymore, so the phonetic measures never use stale segments.
+    """
+    for output_path, dialog in cleaned_dialogs.items():
+        save_dialog_in_file(dialog, output_path + re.sub(r'\.\w+$', ".txt", file_name))
+
+    segments_path = DIALOG_INFO_PAR_PATH + re.sub(r'\.\w+$', ".pkl", file_name)
+    if time_segments:
+        write_pickle(time_segments, segments_path)
+    elif os.path.exists(segments_path):
+        os.remove(segments_path)
+
+
 def clean_transcription(transcription, syn_conf_file=None, interjection_conf_file=None, expression_conf_file=None, is_chat_file=False):
     """
     This function cleans dialogs by extracting symbols, marking and words that reduces transcript's informative value.
@@ -236,10 +311,12 @@ def clean_transcription(transcription, syn_conf_file=None, interjection_conf_fil
     cleaning_measures: array of frequencies of different markers found in the transcription
     complete_clean_dialog: cleaned transcription without synonym reducing
     complete_clean_dialog_syn: cleaned transcription with synonym reducing
+    time_segments: time segments (start and end in milliseconds) of the utterances, from their time bullets
     """
     complete_clean_dialog = ''
     complete_clean_dialog_syn = ''
     cleaning_measures = []
+    time_segments = []
     nb_interjections, nb_expressions, nb_synonyms = 0, 0, 0
 
     for line in transcription:
@@ -251,6 +328,10 @@ def clean_transcription(transcription, syn_conf_file=None, interjection_conf_fil
         else:
             clean = line
 
+        # Time bullets align utterances with the audio, they are kept even if the utterance is empty once cleaned
+        clean, utterance_time_segments = remove_time_bullets(clean)
+        time_segments.extend(utterance_time_segments)
+
         # Here we clean the dialogs in a pipeline of cleaning tasks (view README.md for more info)
         clean, nb_pauses = remove_pauses(clean)
         clean = remove_parentheses(clean)
@@ -307,15 +388,15 @@ def clean_transcription(transcription, syn_conf_file=None, interjection_conf_fil
 
         cleaning_measures.append(curr_cleaning_measures)
 
-    return cleaning_measures, complete_clean_dialog, complete_clean_dialog_syn
+    return cleaning_measures, complete_clean_dialog, complete_clean_dialog_syn, time_segments
 
 
 def print_results(results):
     print("")
     print("CLEANING RESULTS (Average per transcription)")
     print("------------------------")
-    print(results[[x for x in results if not x.endswith("Ratio")]].drop(
-        'idParticipant', 1).drop('interviewNumber', 1).drop('status', 1).mean())
+    means = results.means()
+    print(means[[x for x in means.index if not x.endswith("Ratio")]])
 
 
 if __name__ == "__main__":
@@ -3,11 +3,18 @@
 """
 The :mod:`src.pseudonymise-participants` implements a processing task that pseudonymise personnal data of patients.
 
-This is an incremental process which can be modified as desired.
+This is an incremental process which can be modified as desired: only the header of the transcripts is read (up to the
+first utterance), transcripts are processed in parallel and transcripts already pseudonymised (and unchanged since) are skipped.
+Pseudonymised information is saved in a single encrypted store (out/PseudonymisedInfo/participants.sqlite) indexed by
+(status, idParticipant, interviewNumber), see :mod:`utils.participant_store_util`.
+The secret key is created once (out/secret.key) and reused by the next runs, so every pseudonymised information can be decrypted.
 
 Tool parameters
 ----------
 corpus_path: path to the folder containing transcriptions (MUST be a .cha format and contain personnal data in a standardized format, see documentation)
+jobs (optionnal): number of transcripts processed in parallel
+force (optionnal): pseudonymise every transcript, even those already done
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed (refer to README.md for more info)
 is_verbose: for debugging purpose
 
 This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios 
@@ -24,21 +31,28 @@ for evaluating and monitor patient's linguistic/phonetic functions.
 import argparse
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.fernet import Fernet
-import json
 import re
-from utils.corpus_util import (extract_participant_info,
-                               extract_transcript_lines)
+from utils.corpus_util import add_corpus_filter_arguments, create_corpus_index, extract_header_lines, get_corpus_index
+from utils.participant_store_util import ParticipantStore, normalize_participant_key
 
 PSEUDONYMISED_DIALOGS_INFO_PATH = 'out/PseudonymisedInfo/'
+PARTICIPANT_STORE_PATH = PSEUDONYMISED_DIALOGS_INFO_PATH + 'participants.sqlite'
 SECRET_KEY_PATH = 'out/secret.key'
+DEFAULT_JOBS = 8
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Extract participants\' information and pseudonymise it.')
     parser.add_argument(dest='corpus_path',
                         help='Path to the folder containing all transcripts')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=DEFAULT_JOBS,
+                    help='number of transcripts processed in parallel')
+    parser.add_argument('--force', dest='is_force', default=False, action='store_true',
+                    help='pseudonymise every transcript (even those already pseudonymised)')
     parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
                     help='print processing info')
+    add_corpus_filter_arguments(parser)
     return parser.parse_args()
 
 def main():
@@ -51,35 +65,49 @@ def main():
         print("Given corpus path doesn't exist.")
         sys.exit(1)
 
-    participants_info = extract_participant_info(args.corpus_path, args.is_verbose)
+    corpus_index = create_corpus_index(args.corpus_path, args)
 
-def extract_participant_info(corpus_path, is_verbose=True):
+    pseudonymise_corpus(corpus_index, args.jobs, args.is_force, args.is_verbose)
+
+def pseudonymise_corpus(corpus_index, jobs=DEFAULT_JOBS, is_force=False, is_verbose=True):
     """
-    Main function that processes every file of the dataset
+    Main function that processes every file of the dataset (in parallel). Files already pseudonymised,
+    and unchanged since, are skipped unless is_force is True. Information is encrypted and saved in the participant store.
+    A file that can't be processed (e.g. unreadable or with a malformed @ID line) is reported and skipped, the
+    information of the other files is saved.
+    corpus_index is the index of the transcripts (see utils.corpus_util.CorpusIndex) or the path to their folder.
     """
-    participants_info = []
-    crypt_key = generate_key()
+    corpus_index = get_corpus_index(corpus_index)
+    crypt_key = load_or_generate_key()
 
-    for file in os.listdir(corpus_path):
-        file_name = os.fsdecode(file)
+    with ParticipantStore(PARTICIPANT_STORE_PATH, crypt_key) as store:
+        source_mtimes = {} if is_force else store.source_mtimes()
 
-        participant_info = {}
+        file_names = [file_name for file_name in corpus_index.file_names()
+                      if not is_pseudonymised(corpus_index, file_name, source_mtimes)]
 
-        # To make sure we don't process hidden files
-        if not file_name.startswith("."):
+        def process_file(file_name):
             if is_verbose:
                 print("Processing transcript", file_name)
 
-            transcript_lines = extract_transcript_lines(os.path.join(corpus_path, file_name), is_chat_file=True)
+            try:
+                header_lines = extract_header_lines(corpus_index.file_path(file_name))
+
+                participant_info = extract_info_from_transcript(file_name, header_lines)
+            except Exception as e:
+                print("Couldn't process", file_name, ":", str(e) or type(e).__name__)
+                return None
+
+            return (get_participant_key(corpus_index, file_name), participant_info,
+                    corpus_index.modification_time(file_name))
 
-            participant_info = extract_info_from_transcript(file_name, transcript_lines)
-            
-            pseudonymised_info = pseudonymise_info(participant_info, crypt_key)
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            records = [record for record in executor.map(process_file, file_names) if record is not None]
 
-            export_pseudonymised_info(pseudonymised_info, file_name)
+        store.upsert_many(records)
 
     print("-------------------")
-    print("Pseudonymization task done.")
+    print("Pseudonymization task done.", len(records), "of", len(file_names), "transcript(s) pseudonymised.")
 
 def extract_info_from_transcript(file_name, lines):
     """
@@ -105,34 +133,42 @@ def extract_info_from_transcript(file_name, lines):
 
     return participant_info
 
-def pseudonymise_info(participant_info, key):
+def load_or_generate_key():
     """
-    Encrypt participants information
+    Loads the secret key, it is generated (and saved) if it doesn't exist yet
     """
-    f = Fernet(key)
-    return f.encrypt(json.dumps(participant_info).encode())
+    if os.path.exists(SECRET_KEY_PATH):
+        with open(SECRET_KEY_PATH, "rb") as key_file:
+            return key_file.read().strip()
+    return generate_key()
 
 def generate_key():
     """
     Generates a key and save it into a file
     """
     key = Fernet.generate_key()
-    with open(SECRET_KEY_PATH, "wb+") as key_file:
+    dirname = os.path.dirname(SECRET_KEY_PATH)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    # The key file is only created if it doesn't exist, an existing key is never overwritten
+    with open(SECRET_KEY_PATH, "xb") as key_file:
         key_file.write(key)
     return key
 
-def export_pseudonymised_info(pseudonymised_info, file_name):
+def get_participant_key(corpus_index, file_name):
     """
-    Exports pseudonymised information to text file
+    Returns the participant key (status, idParticipant, interviewNumber) of a transcript
     """
-    file_path = PSEUDONYMISED_DIALOGS_INFO_PATH + re.sub(r'\.\w+$', ".txt", file_name)
-    dirname = os.path.dirname(file_path)
-    if not os.path.exists(dirname):
-        os.makedirs(dirname)
-    with open(file_path, "wb") as f:
-        f.write(pseudonymised_info)
-        f.close()
-    return
+    participant_info = corpus_index.participant_info(file_name)
+    return normalize_participant_key((participant_info["status"], participant_info["idParticipant"],
+                                      participant_info["interviewNumber"]))
+
+def is_pseudonymised(corpus_index, file_name, source_mtimes):
+    """
+    Checks if a transcript was already pseudonymised (and not modified since)
+    """
+    source_mtime = source_mtimes.get(get_participant_key(corpus_index, file_name))
+    return source_mtime is not None and source_mtime >= corpus_index.modification_time(file_name)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,660 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.run-pipeline` implements an end-to-end runner of the pipeline in a single process:
+normalizer --> POS tagger --> POS adjustment --> POS distribution --> linguistic measures (--> phonetic measures).
+
+Every stage is the function of its tool (same code, same results), but transcripts and tags are passed in memory from
+one stage to the next instead of being written to out/ and read back by the next script, and Python, pandas and spaCy
+are loaded once. Tags are formatted and parsed exactly as the tagged files are, so the exported measures (.csv files)
+are identical to the ones of the tools run one after the other.
+
+Tool parameters
+----------
+corpus_path: path to the folder containing transcriptions (MUST contain only transcription files)
+language_code: language code of the spaCy model (zh, da, nl, en, fr, de, el, it, ja, lt, nb, pl, pt, ro, es)
+synonym_conf_path (optionnal): file path of the synonym reducing task configuration file (the synonym reduced dialogs are tagged)
+interjections_conf_path (optionnal): file path of the interjections extraction task configuration file
+expressions_conf_path (optionnal): file path of the expressions extraction task configuration file
+universal_tag (optionnal): universal form of tags (instead of the morphological tags)
+window_sizes (optionnal): window sizes (in words) used for the windowed linguistic measures (default: 50)
+audio_corpus_path (optionnal): path to the folder containing audios, to also compute the phonetic measures
+segments (optionnal): phonetic measures computed over the participant's utterances only (time bullets of the transcripts)
+jobs (optionnal): number of audio files processed in parallel
+write_intermediates (optionnal): also write the intermediate transcripts (cleaned, tagged and adjusted) in out/
+cache (optionnal): incremental rebuild, only the artifacts of modified transcripts, configuration files or code are recomputed
+streaming (optionnal): every transcript flows thru the stages as soon as it is ready (bounded queues, workers per stage)
+classes, participants, modified_after, modified_before (optionnal): only the matching transcripts (and audios) are processed
+verbose (optionnal): for debugging purpose
+
+This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios
+for evaluating and monitor patient's linguistic/phonetic functions.
+"""
+
+import argparse
+import importlib
+import io
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from utils import cleaning_util, corpus_util, data_util, lexical_util, nlp_util, spacy_util
+from utils.cache_util import BlobCache
+from utils.corpus_util import (add_corpus_filter_arguments, create_corpus_index, extract_participant_info,
+                               get_corpus_index, read_tags_from_text)
+from utils.data_util import format_tags, save_dialog_in_file
+from utils.nlp_util import UniversalPOS
+from utils.pipeline_util import (END_OF_STREAM, ArtifactStore, StreamingStage, get_utils_modules, hash_config_files,
+                                 hash_sources, hash_text)
+from utils.sink_util import FeatureSink
+from utils.spacy_util import SPACY_BATCH_SIZE, get_parser_version, get_spacy_model
+
+# The stages are the tools' modules (their file names aren't valid identifiers)
+normalizer = importlib.import_module("multilingual-text-normalizer")
+tagger = importlib.import_module("multilingual-pos-tagger")
+pos_distribution = importlib.import_module("multilingual-pos-distribution")
+linguistic_measures = importlib.import_module("multilingual-linguistic-measures")
+
+# CONSTANTS
+# POS adjustment module of each language (languages without one skip this stage)
+ADJUSTMENT_MODULES = {"en": "english-pos-adjustment", "fr": "french-pos-adjustment"}
+# Artifacts of every stage (and phonetic measures) of the incremental rebuild
+PIPELINE_CACHE_PATH = "out/Cache/pipeline_artifacts.sqlite"
+DEFAULT_CACHE_SIZE_MB = 256
+# Streaming execution: maximum number of transcripts waiting in each queue and number of workers of the stages
+DEFAULT_QUEUE_SIZE = 128
+DEFAULT_NORMALIZE_WORKERS = 2
+DEFAULT_MEASURE_WORKERS = 2
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='End-to-end pipeline runner (single process, in memory).')
+    parser.add_argument(dest='corpus_path',
+                        help='path to the folder containing all transcripts')
+    parser.add_argument(dest='language_code',
+                        help='Language code (zh, da, nl, en, fr, de, el, it, ja, lt, nb, pl, pt, ro, es)')
+    parser.add_argument('-s', '--synonyms_conf_path', dest='synonyms_conf_path', default=None,
+                        help='file path to config file for synonym reduction task')
+    parser.add_argument('-i', '--interjections_conf_path', dest='interjections_conf_path', default=None,
+                        help='file path to config file for interjection removal task')
+    parser.add_argument('-e', '--expressions_conf_path', dest='expressions_conf_path', default=None,
+                        help='file path to config file for expression removal task')
+    parser.add_argument('-u', '--universal_tag', default=False, action='store_true',
+                        help='if you want the universal form of tags or with the morphological complexity of tags')
+    parser.add_argument('-w', '--window_sizes', dest='window_sizes', type=int, nargs='+',
+                        default=linguistic_measures.DEFAULT_WINDOW_SIZES,
+                        help='window sizes (in words) for the windowed measures (MATTR, Yule\'s K and entropy)')
+    parser.add_argument('-a', '--audio_corpus_path', dest='audio_corpus_path', default=None,
+                        help='path to the folder containing all audios (phonetic measures are skipped without it)')
+    parser.add_argument('--segments', dest='is_segments', default=False, action='store_true',
+                        help='phonetic measures over the participant\'s utterances only (time bullets of the transcripts)')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='number of audio files processed in parallel (worker processes)')
+    parser.add_argument('--write_intermediates', dest='is_write_intermediates', default=False, action='store_true',
+                        help='also write the cleaned, tagged and adjusted transcripts in out/ (as the tools do)')
+    parser.add_argument('--cache', dest='is_cache', default=False, action='store_true',
+                        help='incremental rebuild: only recompute the artifacts of modified transcripts, configs or code')
+    parser.add_argument('--cache_path', dest='cache_path', default=PIPELINE_CACHE_PATH,
+                        help='path to the cache file (sqlite)')
+    parser.add_argument('--cache_size', dest='cache_size', type=float, default=DEFAULT_CACHE_SIZE_MB,
+                        help='maximum size of the cache in MB (least recently used artifacts are evicted)')
+    parser.add_argument('--clear_cache', dest='is_clear_cache', default=False, action='store_true',
+                        help='remove every entry of the cache before processing')
+    parser.add_argument('--streaming', dest='is_streaming', default=False, action='store_true',
+                        help='streaming execution: every transcript flows thru the stages as soon as it is ready')
+    parser.add_argument('--queue_size', dest='queue_size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='streaming: maximum number of transcripts waiting between two stages')
+    parser.add_argument('--normalize_workers', dest='normalize_workers', type=int, default=DEFAULT_NORMALIZE_WORKERS,
+                        help='streaming: number of normalizer workers (threads, they only overlap the file reads and '
+                             'cache accesses: the cleaning itself holds the GIL)')
+    parser.add_argument('--measure_workers', dest='measure_workers', type=int, default=DEFAULT_MEASURE_WORKERS,
+                        help='streaming: number of adjustment and measures workers (threads, they only overlap the '
+                             'cache accesses: the measures themselves hold the GIL)')
+    parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
+                        help='print processing info')
+    add_corpus_filter_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if not os.path.isdir(args.corpus_path):
+        print("Given corpus path is not a directory")
+        sys.exit(1)
+    if not os.path.exists(args.corpus_path):
+        print("Given corpus path doesn't exist.")
+        sys.exit(1)
+    if not args.language_code:
+        print("Missing language code.")
+        sys.exit(1)
+    if args.interjections_conf_path and not os.path.exists(args.interjections_conf_path):
+        print("Given interjections config file path doesn't exist.")
+        sys.exit(1)
+    if args.expressions_conf_path and not os.path.exists(args.expressions_conf_path):
+        print("Given expressions config file path doesn't exist.")
+        sys.exit(1)
+    if args.audio_corpus_path and not os.path.isdir(args.audio_corpus_path):
+        print("Given audio corpus path is not a directory")
+        sys.exit(1)
+
+    corpus_index = create_corpus_index(args.corpus_path, args, normalizer.TRANSCRIPT_EXTENSIONS)
+    audio_corpus_index = create_corpus_index(args.audio_corpus_path, args) if args.audio_corpus_path else None
+    corpus_classes = corpus_index.classes()
+
+    if args.is_verbose:
+        print("CORPUS CLASSES")
+        print("------------------------")
+        print(corpus_classes)
+
+    cache_options = (args.cache_path, int(args.cache_size * (1 << 20))) if args.is_cache else None
+    if args.is_clear_cache and os.path.exists(args.cache_path):
+        with BlobCache(args.cache_path) as cache:
+            cache.clear()
+
+    streaming_options = (args.queue_size, args.normalize_workers, args.measure_workers) if args.is_streaming else None
+
+    run_pipeline(corpus_index, args.language_code, args.synonyms_conf_path, args.interjections_conf_path,
+                 args.expressions_conf_path, universal_tag=args.universal_tag, window_sizes=args.window_sizes,
+                 audio_corpus_index=audio_corpus_index, is_segments=args.is_segments, jobs=args.jobs,
+                 is_write_intermediates=args.is_write_intermediates, cache_options=cache_options,
+                 streaming_options=streaming_options, is_verbose=args.is_verbose)
+
+    print("-------------------")
+    print("Pipeline done.")
+
+def run_pipeline(corpus_index, language_code, synonyms_conf_path=None, interjections_conf_path=None,
+                 expressions_conf_path=None, universal_tag=False, window_sizes=linguistic_measures.DEFAULT_WINDOW_SIZES,
+                 audio_corpus_index=None, is_segments=False, jobs=1, is_write_intermediates=False, cache_options=None,
+                 streaming_options=None, is_verbose=False):
+    """
+    This is the main function that runs every stage of the pipeline on the given corpus and exports the measures of
+    every stage (same .csv files as the tools). Transcripts are processed in sorted file name order, as the tools do.
+    With a cache, the artifacts of every stage are stored and only the stale ones are recomputed (see
+    :mod:`utils.pipeline_util`): the .csv files are re-assembled from the cached rows of unchanged transcripts.
+
+    Parameters
+    ----------
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex), or path to a folder containing all transcriptions
+    language_code: language code of the spaCy model
+    synonyms_conf_path: path to a configuration file for synonym reducing task (the synonym reduced dialogs are tagged)
+    interjections_conf_path: path to a configuration file for interjection extraction task
+    expressions_conf_path: path to a configuration file for expression extraction task
+    universal_tag: if you want universal tag or morphological tag
+    window_sizes: window sizes (in words) used for the windowed linguistic measures
+    audio_corpus_index: index of the audios (or path to a folder containing all audios), None to skip the phonetic measures
+    is_segments: if True, phonetic measures are computed over the participant's utterances only
+    jobs: number of worker processes of the phonetic measures
+    is_write_intermediates: if True, the intermediate transcripts are also written in out/ (as the tools do)
+    cache_options: (cache path, maximum size in bytes) of the artifacts cache, None to compute every artifact
+    streaming_options: (queue size, normalizer workers, measures workers) of the streaming execution,
+                       None to run the stages one after the other
+    is_verbose: boolean value to print processing info to console
+    """
+
+    stages = TranscriptStages(language_code, synonyms_conf_path, interjections_conf_path, expressions_conf_path,
+                              universal_tag, window_sizes, is_write_intermediates, is_verbose)
+
+    transcripts = list_transcripts(get_corpus_index(corpus_index, normalizer.TRANSCRIPT_EXTENSIONS))
+
+    open_store = lambda: ArtifactStore(BlobCache(*cache_options) if cache_options else None)
+    # The measures of every transcript are written as soon as it is measured
+    with ResultsExporter(stages, transcripts) as exporter:
+        if streaming_options is None:
+            store = run_stages(stages, transcripts, open_store, on_measured=exporter.add)
+        else:
+            store = run_streaming_stages(stages, transcripts, open_store, *streaming_options,
+                                         on_measured=exporter.add)
+    exporter.print_results()
+
+    if audio_corpus_index is not None:
+        start_time = time.perf_counter()
+        # Rows are written as soon as every audio file is measured
+        with create_phonetic_sink() as sink:
+            measure_phonetics(audio_corpus_index, transcripts, is_segments, cache_options, jobs, is_verbose, sink)
+        importlib.import_module("multilingual-phonetic-measures").print_results(sink)
+        print_stage_time("Phonetic measures", start_time)
+
+    if cache_options:
+        store.print_summary()
+
+def list_transcripts(corpus_index):
+    """
+    This function returns the transcripts of a corpus index in file name order: a dictionary per transcript (file path,
+    file name and hash) which the stages complete. The transcripts' hashes are the inputs of the normalizer's artifacts.
+    """
+    return [{"file_path": corpus_index.file_path(file_name), "file_name": file_name,
+             "file_hash": corpus_index.file_hash(file_name)}
+            for file_name in corpus_index.file_names()]
+
+def measure_phonetics(audio_corpus_index, transcripts, is_segments=False, cache_options=None, jobs=1, is_verbose=False,
+                      sink=None):
+    """
+    This function calculates the phonetic measures of the audios (see multilingual-phonetic-measures), with the time
+    segments of the normalized transcripts (passed in memory) if is_segments is True.
+
+    Returns
+    ----------
+    phonetic_matrix: array of phonetic metrics (one row per audio file), empty if they are written to the given sink
+    """
+    # Only imported when needed (audio libraries). The phonetic measures have their own cache entries (keyed by
+    # the audio content and every parameter, time segments included), stored in the same cache file
+    phonetic_measures = importlib.import_module("multilingual-phonetic-measures")
+    return phonetic_measures.process_corpus(audio_corpus_index, is_segments=is_segments, cache_options=cache_options,
+                                            jobs=jobs, dialog_time_segments=get_dialog_time_segments(transcripts),
+                                            is_verbose=is_verbose, sink=sink)
+
+def get_dialog_time_segments(transcripts):
+    """Returns the time segments of the participant's utterances by transcript name (without extension)."""
+    return {re.sub(r'\.\w+$', "", transcript["file_name"]): transcript["time_segments"]
+            for transcript in transcripts if transcript["time_segments"]}
+
+def create_phonetic_sink():
+    """Returns the feature sink of the phonetic measures (same .csv file as the tool)."""
+    phonetic_measures = importlib.import_module("multilingual-phonetic-measures")
+    return FeatureSink(phonetic_measures.PHONETIC_FEATURES_EXPORT_PATH,
+                       phonetic_measures.get_phonetic_schema(phonetic_measures.DEFAULT_FEATURE_SETS))
+
+def export_phonetic_results(phonetic_matrix):
+    """This function exports and prints the phonetic measures of every audio file (same .csv file as the tool)."""
+    with create_phonetic_sink() as sink:
+        sink.write_rows(phonetic_matrix)
+    importlib.import_module("multilingual-phonetic-measures").print_results(sink)
+
+def run_stages(stages, transcripts, open_store, on_measured=None):
+    """
+    This function runs the stages one after the other: every transcript is normalized, then every transcript is tagged
+    (in spaCy batches), etc.
+
+    Parameters
+    ----------
+    on_measured: function called with every transcript once measured (e.g. ResultsExporter.add), None to keep the
+                 transcripts as they are
+
+    Returns
+    ----------
+    store: the artifact store (with the counts of artifacts computed and reused)
+    """
+    store = open_store()
+    try:
+        start_time = time.perf_counter()
+        for transcript in transcripts:
+            stages.normalize(store, transcript)
+        print_stage_time("Normalization", start_time)
+
+        # The next stages process the cleaned transcripts in their file name order (as the tools do on out/CleanedDialogs)
+        dialogs = sorted(transcripts, key=lambda transcript: transcript["dialog_name"])
+
+        start_time = time.perf_counter()
+        stages.tag(store, dialogs)
+        print_stage_time("POS tagging", start_time)
+
+        start_time = time.perf_counter()
+        for transcript in dialogs:
+            stages.adjust(store, transcript)
+            stages.measure(store, transcript)
+            if on_measured is not None:
+                on_measured(transcript)
+        print_stage_time("POS adjustment and measures", start_time)
+    finally:
+        store.close()
+
+    return store
+
+def run_streaming_stages(stages, transcripts, open_store, queue_size=DEFAULT_QUEUE_SIZE,
+                         normalize_workers=DEFAULT_NORMALIZE_WORKERS, measure_workers=DEFAULT_MEASURE_WORKERS,
+                         on_measured=None):
+    """
+    This function runs the stages in streaming: every transcript flows thru normalizer --> tagger --> adjustment and
+    measures as soon as it is ready, over bounded queues (see :class:`utils.pipeline_util.StreamingStage`), so every
+    stage works at the same time and the first measures are ready seconds after the start.
+    The tagger has one worker (one spaCy model) which tags the transcripts already waiting in its queue in one batch.
+    Workers are threads: the cleaning and the measures hold the GIL, so several workers only overlap the file reads
+    and the cache accesses (and spaCy, which releases it).
+
+    Parameters
+    ----------
+    queue_size: maximum number of transcripts waiting in each queue (backpressure)
+    normalize_workers: number of normalizer workers (threads)
+    measure_workers: number of adjustment and measures workers (threads)
+    on_measured: function called (in this thread) with every transcript once measured (e.g. ResultsExporter.add)
+
+    Returns
+    ----------
+    store: the artifact store (with the counts of artifacts computed and reused by every worker)
+    """
+    start_time = time.perf_counter()
+    files_queue, normalized_queue, tagged_queue, measured_queue = (queue.Queue(maxsize=queue_size) for _ in range(4))
+
+    # Every worker has its own store (sqlite connections can't be shared between threads)
+    close_store = lambda store: store.close()
+    pipeline = [StreamingStage(stages.normalize, files_queue, normalized_queue, normalize_workers,
+                               setup=open_store, teardown=close_store),
+                StreamingStage(stages.tag, normalized_queue, tagged_queue, 1, batch_size=SPACY_BATCH_SIZE,
+                               setup=open_store, teardown=close_store),
+                StreamingStage(lambda store, transcript: stages.measure(store, stages.adjust(store, transcript)),
+                               tagged_queue, measured_queue, measure_workers, setup=open_store, teardown=close_store)]
+    for stage in pipeline:
+        stage.start()
+
+    def feed():
+        for transcript in transcripts:
+            files_queue.put(transcript)
+        files_queue.put(END_OF_STREAM)
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    nb_measured = 0
+    for transcript in iter(measured_queue.get, END_OF_STREAM):
+        nb_measured += 1
+        if nb_measured == 1:
+            print("First measures (" + transcript["file_name"] + ") ready in", round(time.perf_counter() - start_time, 2), "s")
+        if on_measured is not None:
+            on_measured(transcript)
+
+    feeder.join()
+    for stage in pipeline:
+        stage.join()
+
+    store = ArtifactStore()
+    for stage in pipeline:
+        for worker_store in stage.states:
+            store.merge(worker_store)
+
+    print_stage_time("Streaming pipeline (" + str(nb_measured) + " transcripts)", start_time)
+    return store
+
+def export_results(stages, transcripts):
+    """
+    This function prints and exports the measures of every stage (same .csv files as the tools), out of the measures of
+    every (already measured) transcript (see ResultsExporter).
+    """
+    with ResultsExporter(stages, transcripts) as exporter:
+        for transcript in transcripts:
+            exporter.add(transcript)
+    exporter.print_results()
+
+class ResultsExporter:
+    """
+    A results exporter writes the measures of every stage (same .csv files as the tools) while the transcripts are
+    measured, in the tools' order: the normalizer measures in file name order, the others in cleaned transcript file
+    name order. A transcript measured before the previous ones (e.g. by another streaming worker) waits in a reorder
+    buffer, without its dialogs (dropped once measured): only its measures are kept until they are written.
+
+    Example:
+        with ResultsExporter(stages, transcripts) as exporter:
+            run_stages(stages, transcripts, open_store, on_measured=exporter.add)
+        exporter.print_results()
+    """
+    def __init__(self, stages, transcripts):
+        """
+        stages: the transcript stages (see TranscriptStages)
+        transcripts: every transcript to export, in file name order (see list_transcripts)
+        """
+        self.stages = stages
+        # Position of every transcript in both orders (the cleaned transcript name only depends on the file name)
+        self.file_positions = {transcript["file_name"]: position for position, transcript in enumerate(transcripts)}
+        self.dialog_positions = {file_name: position for position, file_name in
+                                 enumerate(sorted(self.file_positions, key=get_dialog_name))}
+        self.file_pending, self.dialog_pending = {}, {}
+        self.next_file_position, self.next_dialog_position = 0, 0
+        self.adjustment_counts = Counter()
+
+        self.cleaning_sink = FeatureSink(normalizer.MARKERS_DISTRIBUTION_PATH, normalizer.CLEANING_SCHEMA)
+        self.pos_sink = FeatureSink(pos_distribution.POS_DISTRIBUTION_FEATURES_PATH,
+                                    pos_distribution.POS_DISTRIBUTION_SCHEMA)
+        self.linguistic_sink = FeatureSink(linguistic_measures.LINGUISTIC_FEATURES_EXPORT_PATH,
+                                           linguistic_measures.get_linguistic_schema(stages.window_sizes))
+
+    def add(self, transcript):
+        """Adds a measured transcript: its measures are written once every previous transcript is."""
+        transcript.pop("dialog", None)
+        transcript.pop("tagged_dialog", None)
+        if "adjustment_counts" in transcript:
+            self.adjustment_counts.update(transcript["adjustment_counts"])
+
+        self.file_pending[self.file_positions[transcript["file_name"]]] = transcript["results"]
+        self.dialog_pending[self.dialog_positions[transcript["file_name"]]] = (transcript["dialog_name"],
+                                                                               transcript["pos_counts"],
+                                                                               transcript["linguistics"])
+        self._write_ready()
+
+    def close(self):
+        # Transcripts that failed in a stage are skipped, the next ones are still written
+        self._write_ready(is_final=True)
+        for sink in (self.cleaning_sink, self.pos_sink, self.linguistic_sink):
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def print_results(self):
+        normalizer.print_results(self.cleaning_sink)
+        if self.stages.adjustment is not None:
+            self.stages.print_adjustment_results(self.adjustment_counts)
+        pos_distribution.print_results(self.pos_sink)
+        linguistic_measures.print_results(self.linguistic_sink)
+
+    def _write_ready(self, is_final=False):
+        """Writes the measures of the pending transcripts that are next in order (every pending one if is_final)."""
+        for position in pop_ready(self.file_pending, self.next_file_position, is_final):
+            self.cleaning_sink.write_row(self.file_pending.pop(position))
+            self.next_file_position = position + 1
+
+        for position in pop_ready(self.dialog_pending, self.next_dialog_position, is_final):
+            dialog_name, pos_counts, linguistics = self.dialog_pending.pop(position)
+            pos_counts = np.array([pos_counts], dtype=np.int64).reshape(1, UniversalPOS.NB_TAG_CODES)
+            self.pos_sink.write_dataframe(pos_distribution.build_pos_distribution(
+                [extract_participant_info(dialog_name)], pos_counts))
+            self.linguistic_sink.write_row(linguistics)
+            self.next_dialog_position = position + 1
+
+def pop_ready(pending, next_position, is_final=False):
+    """Yields the pending positions that follow next_position without a gap (every pending one, sorted, if is_final)."""
+    if is_final:
+        yield from sorted(pending)
+        return
+    while next_position in pending:
+        yield next_position
+        next_position += 1
+
+def get_dialog_name(file_name):
+    """Returns the name of a cleaned transcript (the tools' .txt file) out of the transcript's file name."""
+    return re.sub(r'\.\w+$', ".txt", file_name)
+
+class TranscriptStages:
+    """
+    The stages of the pipeline for one transcript. A transcript is a dictionary which every stage completes
+    (e.g. the normalizer adds the cleaned dialog, the tagger the tagged dialog) and every stage reads and stores its
+    artifacts in the given artifact store, so the same stages are run one after the other or in streaming.
+
+    The stages form a DAG over the transcripts' artifacts:
+
+    transcript --> normalize --> tag --> adjust --> pos_distribution
+                       |                   +------> linguistic
+                       +-------------------------> phonetic (time segments, with the audio file)
+
+    The hash of an artifact's content is an input of its downstream artifacts and the code version of a stage is the
+    hash of its modules' source (see get_stage_modules).
+    """
+    def __init__(self, language_code, synonyms_conf_path=None, interjections_conf_path=None, expressions_conf_path=None,
+                 universal_tag=False, window_sizes=linguistic_measures.DEFAULT_WINDOW_SIZES,
+                 is_write_intermediates=False, is_verbose=False):
+        self.language_code = language_code
+        self.synonyms_conf_path = synonyms_conf_path
+        self.interjections_conf_path = interjections_conf_path
+        self.expressions_conf_path = expressions_conf_path
+        self.universal_tag = universal_tag
+        self.window_sizes = window_sizes
+        self.is_write_intermediates = is_write_intermediates
+        self.is_verbose = is_verbose
+
+        if language_code in ADJUSTMENT_MODULES:
+            self.adjustment = importlib.import_module(ADJUSTMENT_MODULES[language_code])
+        else:
+            self.adjustment = None
+        self.code_versions = {stage: hash_sources(*modules) for stage, modules in get_stage_modules(self.adjustment).items()}
+
+        # The synonym reduced dialogs are tagged if the synonym reducing task is done
+        if synonyms_conf_path is None:
+            self.dialog_path = normalizer.CLEANED_DIALOG_PAR_PATH
+        else:
+            self.dialog_path = normalizer.CLEANED_DIALOG_PAR_SYN_PATH
+        self.normalize_config = {"configs": hash_config_files(synonyms_conf_path, interjections_conf_path,
+                                                              expressions_conf_path)}
+        # Same versions as the saved parses (language, model and its version, spaCy version)
+        self.tag_config = {"parser_version": get_parser_version(language_code), "universal_tag": universal_tag}
+
+    def normalize(self, store, transcript):
+        """
+        Cleans and normalizes a transcription (see multilingual-text-normalizer). The artifact depends on the transcript
+        (content and file name) and on the configuration files (content).
+        Adds: results (cleaning measures), time_segments, dialog_name, dialog (to tag) and dialog_hash.
+        """
+        if self.is_verbose:
+            print("Normalizing transcript", transcript["file_name"])
+
+        def normalize():
+            results, cleaned_dialogs, time_segments = normalizer.normalize_transcript(transcript["file_path"],
+                                                                                      self.synonyms_conf_path,
+                                                                                      self.interjections_conf_path,
+                                                                                      self.expressions_conf_path)
+            return {"results": results, "cleaned_dialogs": cleaned_dialogs, "time_segments": time_segments}
+
+        normalized, _ = store.get_or_compute("normalize", [transcript["file_hash"], transcript["file_name"]],
+                                             self.normalize_config, self.code_versions["normalize"], normalize)
+        # Time segments are (start, end) tuples (lists once stored as JSON)
+        time_segments = [tuple(time_segment) for time_segment in normalized["time_segments"]]
+        if self.is_write_intermediates:
+            normalizer.save_normalized_transcript(transcript["file_name"], normalized["cleaned_dialogs"], time_segments)
+
+        dialog = read_as_text_file(normalized["cleaned_dialogs"][self.dialog_path])
+        transcript.update({"results": normalized["results"], "time_segments": time_segments,
+                           "dialog_name": get_dialog_name(transcript["file_name"]),
+                           "dialog": dialog, "dialog_hash": hash_text(dialog)})
+        return transcript
+
+    def tag(self, store, transcripts):
+        """
+        Tags cleaned dialogs with spaCy, in one batch (see multilingual-pos-tagger). Only the dialogs without a tagged
+        artifact are fed to spaCy (the model isn't even loaded if there's none).
+        Adds: tagged_dialog and tagged_hash.
+        """
+        def tag(missing):
+            if self.is_verbose:
+                for index in missing:
+                    print("Tagging transcript", transcripts[index]["dialog_name"])
+            spacy_model = get_spacy_model(language_code=self.language_code)
+            docs = spacy_model.pipe((transcripts[index]["dialog"] for index in missing), batch_size=SPACY_BATCH_SIZE)
+            return [tagger.format_tagged_doc(doc, self.universal_tag) for doc in docs]
+
+        artifacts = store.get_or_compute_many("tag", [[transcript["dialog_hash"]] for transcript in transcripts],
+                                              self.tag_config, self.code_versions["tag"], tag)
+
+        for transcript, (tagged_dialog, tagged_hash) in zip(transcripts, artifacts):
+            if self.is_write_intermediates:
+                save_dialog_in_file(tagged_dialog, tagger.TAGGED_DIALOG_OUTPUT_PATH + "/" + transcript["dialog_name"])
+            transcript.update({"tagged_dialog": tagged_dialog, "tagged_hash": tagged_hash})
+        return transcripts
+
+    def adjust(self, store, transcript):
+        """
+        Adjusts the POS tags with the adjustment module of the language (see english-pos-adjustment and
+        french-pos-adjustment), nothing is done for the other languages.
+        Replaces: tagged_dialog and tagged_hash by the adjusted ones. Adds: adjustment_counts.
+        """
+        if self.adjustment is None:
+            return transcript
+
+        if self.is_verbose:
+            print("Adjusting transcript", transcript["dialog_name"])
+
+        def adjust():
+            tags = read_tags_from_text(transcript["tagged_dialog"])
+            # The english adjustment increments its results, the french one returns the number of adjustments
+            if hasattr(self.adjustment, "Results"):
+                adjusted_tags, results = self.adjustment.adjust_pos_tags(tags, self.adjustment.Results())
+                counts = dict(results.__dict__)
+            else:
+                adjusted_tags, adjustment_count = self.adjustment.adjust_pos_tags(tags)
+                counts = {"adjustment_count": adjustment_count}
+            return {"dialog": format_tags(adjusted_tags), "counts": counts}
+
+        adjusted, adjusted_hash = store.get_or_compute("adjust", [transcript["tagged_hash"]], {},
+                                                       self.code_versions["adjust"], adjust)
+        if self.is_write_intermediates:
+            save_dialog_in_file(adjusted["dialog"], self.adjustment.ADJUSTED_DIALOG_OUTPUT_PATH + transcript["dialog_name"])
+
+        transcript.update({"tagged_dialog": adjusted["dialog"], "tagged_hash": adjusted_hash,
+                           "adjustment_counts": adjusted["counts"]})
+        return transcript
+
+    def measure(self, store, transcript):
+        """
+        Calculates the POS tag counts (see multilingual-pos-distribution) and the linguistic measures
+        (see multilingual-linguistic-measures) of a tagged transcript.
+        Adds: pos_counts and linguistics (measures row).
+        """
+        if self.is_verbose:
+            print("Measuring transcript", transcript["dialog_name"])
+
+        tags = []
+        def read_tags():
+            if not tags:
+                tags.append(read_tags_from_text(transcript["tagged_dialog"]))
+            return tags[0]
+
+        pos_counts, _ = store.get_or_compute("pos_distribution", [transcript["tagged_hash"]], {},
+                                             self.code_versions["pos_distribution"],
+                                             lambda: pos_distribution.calculate_pos_frequency(read_tags())[0].tolist())
+        linguistics, _ = store.get_or_compute("linguistic", [transcript["tagged_hash"], transcript["dialog_name"]],
+                                              {"window_sizes": list(self.window_sizes)},
+                                              self.code_versions["linguistic"],
+                                              lambda: list(linguistic_measures.process_tagged_transcripts(
+                                                  [(transcript["dialog_name"], read_tags())], self.window_sizes)[0]))
+
+        transcript.update({"pos_counts": pos_counts, "linguistics": linguistics})
+        return transcript
+
+    def print_adjustment_results(self, adjustment_counts):
+        """Prints the adjustment results summed over every transcript (as the adjustment tool does)."""
+        if hasattr(self.adjustment, "Results"):
+            adjustment_results = self.adjustment.Results()
+            for attribute, count in adjustment_counts.items():
+                setattr(adjustment_results, attribute, count)
+            self.adjustment.print_results(adjustment_results)
+        else:
+            self.adjustment.print_results(adjustment_counts["adjustment_count"])
+
+def get_stage_modules(adjustment=None):
+    """
+    Returns the stages of the pipeline (in execution order) and the modules of their code (the code version of a stage
+    is the hash of those modules' source): the tool of the stage, the utils modules this pipeline runs it with (e.g. the
+    tags are parsed in memory by corpus_util) and every utils module they use (see utils.pipeline_util.get_utils_modules).
+    """
+    stage_modules = {"normalize": get_utils_modules(normalizer, cleaning_util, corpus_util, data_util),
+                     "tag": get_utils_modules(tagger, corpus_util, data_util, nlp_util, spacy_util)}
+    if adjustment is not None:
+        stage_modules["adjust"] = get_utils_modules(adjustment, corpus_util, data_util, nlp_util)
+    stage_modules["pos_distribution"] = get_utils_modules(pos_distribution, corpus_util, nlp_util)
+    stage_modules["linguistic"] = get_utils_modules(linguistic_measures, corpus_util, lexical_util, nlp_util)
+    return stage_modules
+
+def read_as_text_file(text):
+    """
+    Returns a text as it is read back from a text file (universal newlines), the way the tagger reads the cleaned dialogs.
+    """
+    return io.StringIO(text, newline=None).read()
+
+def print_stage_time(stage_name, start_time):
+    print(stage_name, "done in", round(time.perf_counter() - start_time, 2), "s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.run-sharded-pipeline` implements a sharded execution of the pipeline (see :mod:`src.run-pipeline`) over
+several nodes: workers on every node share a directory (e.g. an NFS mount), without any broker.
+
+    plan  : the corpus is indexed and split into shards (balanced by transcript size), one work queue per plan
+    work  : every worker claims the next shard (atomic rename, see :mod:`utils.shard_util`), runs the pipeline stages on
+            its transcripts (and their audios) and writes the measures of the shard in the shared directory
+    merge : the measures of every shard are combined into the standard .csv files (out/ExtractedFeatures/)
+    retry : the failed shards are put back in the work queue (e.g. after a transient error), the done ones are kept
+    status: number of shards to do, claimed, done and failed
+
+A shard's results are the measures of every transcript (not .csv files), so the merged .csv files are identical to the
+ones of run-pipeline on the whole corpus. The shards of a dead worker are processed again by another worker once their
+claim timed out. It can be run locally with several worker processes (work --processes) against one directory.
+
+Tool parameters
+----------
+plan: corpus_path, language_code and the options of run-pipeline (synonym_conf_path, interjections_conf_path,
+      expressions_conf_path, universal_tag, window_sizes, audio_corpus_path, segments), shard_size (optionnal): average number of
+      transcripts per shard, classes, participants, modified_after, modified_before (optionnal): only the matching transcripts are processed
+work: processes (optionnal): number of worker processes on this node, worker_id (optionnal), claim_timeout (optionnal),
+      cache (optionnal): artifacts cache of the node (local path), jobs (optionnal): audio files processed in parallel
+merge: exports the measures of every shard (every shard must be done)
+retry: puts the failed shards back in the work queue
+work_dir (optionnal): shared directory of the work queue (default: out/Shards)
+verbose (optionnal): for debugging purpose
+
+This module is part of the work on a multilingual approach for extracting measures out of transcriptions and audios
+for evaluating and monitor patient's linguistic/phonetic functions.
+"""
+
+import argparse
+import heapq
+import importlib
+import math
+import os
+import re
+import sys
+import time
+from multiprocessing import Process
+
+from utils.cache_util import BlobCache
+from utils.corpus_util import CorpusIndex, add_corpus_filter_arguments, create_corpus_index
+from utils.pipeline_util import ArtifactStore, hash_config_files
+from utils.shard_util import DEFAULT_CLAIM_TIMEOUT, ShardQueue
+
+# The pipeline's stages and exports are the ones of run-pipeline (its file name isn't a valid identifier)
+pipeline = importlib.import_module("run-pipeline")
+normalizer = pipeline.normalizer
+
+# CONSTANTS
+SHARDS_WORK_DIR = "out/Shards"
+DEFAULT_SHARD_SIZE = 500
+# Values of a transcript kept in the results of a shard (the ones exported by run-pipeline)
+SHARD_TRANSCRIPT_KEYS = ["file_name", "results", "dialog_name", "adjustment_counts", "pos_counts", "linguistics"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Sharded pipeline runner (plan, work and merge over a shared directory).')
+    parser.add_argument('-d', '--work_dir', dest='work_dir', default=SHARDS_WORK_DIR,
+                        help='shared directory of the work queue (e.g. on an NFS mount)')
+    parser.add_argument('-v', '--verbose', dest='is_verbose', default=False, action='store_true',
+                        help='print processing info')
+    subparsers = parser.add_subparsers(dest='command')
+
+    plan_parser = subparsers.add_parser('plan', help='split the corpus into shards (creates the work queue)')
+    plan_parser.add_argument(dest='corpus_path',
+                             help='path to the folder containing all transcripts (same path on every node)')
+    plan_parser.add_argument(dest='language_code',
+                             help='Language code (zh, da, nl, en, fr, de, el, it, ja, lt, nb, pl, pt, ro, es)')
+    plan_parser.add_argument('-s', '--synonyms_conf_path', dest='synonyms_conf_path', default=None,
+                             help='file path to config file for synonym reduction task')
+    plan_parser.add_argument('-i', '--interjections_conf_path', dest='interjections_conf_path', default=None,
+                             help='file path to config file for interjection removal task')
+    plan_parser.add_argument('-e', '--expressions_conf_path', dest='expressions_conf_path', default=None,
+                             help='file path to config file for expression removal task')
+    plan_parser.add_argument('-u', '--universal_tag', default=False, action='store_true',
+                             help='if you want the universal form of tags or with the morphological complexity of tags')
+    plan_parser.add_argument('-w', '--window_sizes', dest='window_sizes', type=int, nargs='+',
+                             default=pipeline.linguistic_measures.DEFAULT_WINDOW_SIZES,
+                             help='window sizes (in words) for the windowed measures (MATTR, Yule\'s K and entropy)')
+    plan_parser.add_argument('-a', '--audio_corpus_path', dest='audio_corpus_path', default=None,
+                             help='path to the folder containing all audios (phonetic measures are skipped without it)')
+    plan_parser.add_argument('--segments', dest='is_segments', default=False, action='store_true',
+                             help='phonetic measures over the participant\'s utterances only (time bullets of the transcripts)')
+    plan_parser.add_argument('--shard_size', dest='shard_size', type=int, default=DEFAULT_SHARD_SIZE,
+                             help='average number of transcripts per shard (shards are balanced by transcript size)')
+    add_corpus_filter_arguments(plan_parser)
+
+    work_parser = subparsers.add_parser('work', help='process shards until there\'s none left')
+    work_parser.add_argument('-p', '--processes', dest='processes', type=int, default=1,
+                             help='number of worker processes on this node')
+    work_parser.add_argument('--worker_id', dest='worker_id', default=None,
+                             help='name of the worker in the claims (default: host name and process id)')
+    work_parser.add_argument('--claim_timeout', dest='claim_timeout', type=float, default=DEFAULT_CLAIM_TIMEOUT,
+                             help='seconds after which the claim of a dead worker is released')
+    work_parser.add_argument('--cache', dest='is_cache', default=False, action='store_true',
+                             help='incremental rebuild with an artifacts cache of this node')
+    work_parser.add_argument('--cache_path', dest='cache_path', default=pipeline.PIPELINE_CACHE_PATH,
+                             help='path to the cache file (sqlite, on a local disk)')
+    work_parser.add_argument('--cache_size', dest='cache_size', type=float, default=pipeline.DEFAULT_CACHE_SIZE_MB,
+                             help='maximum size of the cache in MB (least recently used artifacts are evicted)')
+    work_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                             help='number of audio files processed in parallel (worker processes)')
+
+    subparsers.add_parser('merge', help='export the measures of every shard (.csv files)')
+    subparsers.add_parser('retry', help='put the failed shards back in the work queue')
+    subparsers.add_parser('status', help='print the number of shards to do, claimed, done and failed')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.command is None:
+        print("Missing command (plan, work, merge, retry or status).")
+        sys.exit(1)
+
+    if args.command == 'plan':
+        if not os.path.isdir(args.corpus_path):
+            print("Given corpus path is not a directory")
+            sys.exit(1)
+        for conf_path in [args.synonyms_conf_path, args.interjections_conf_path, args.expressions_conf_path]:
+            if conf_path and not os.path.exists(conf_path):
+                print("Given config file path doesn't exist :", conf_path)
+                sys.exit(1)
+        if args.audio_corpus_path and not os.path.isdir(args.audio_corpus_path):
+            print("Given audio corpus path is not a directory")
+            sys.exit(1)
+        if args.shard_size < 1:
+            print("Shard size must be at least 1.")
+            sys.exit(1)
+
+        corpus_index = create_corpus_index(args.corpus_path, args, normalizer.TRANSCRIPT_EXTENSIONS)
+        audio_corpus_index = create_corpus_index(args.audio_corpus_path, args) if args.audio_corpus_path else None
+        plan_shards(args.work_dir, corpus_index, args.language_code, args.synonyms_conf_path,
+                    args.interjections_conf_path, args.expressions_conf_path, args.universal_tag, args.window_sizes,
+                    audio_corpus_index, args.is_segments, args.shard_size)
+        return
+
+    if not os.path.exists(os.path.join(args.work_dir, "plan.json")):
+        print("Given work directory has no plan (run the plan command first).")
+        sys.exit(1)
+
+    if args.command == 'work':
+        cache_options = (args.cache_path, int(args.cache_size * (1 << 20))) if args.is_cache else None
+        worker_options = dict(claim_timeout=args.claim_timeout, cache_options=cache_options, jobs=args.jobs,
+                              is_verbose=args.is_verbose)
+        if args.processes > 1:
+            # Local workers (e.g. to test the queue, or to use every core of a node), each one with its own id
+            workers = [Process(target=work, args=(args.work_dir, args.worker_id + "-" + str(i) if args.worker_id else None),
+                               kwargs=worker_options)
+                       for i in range(args.processes)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            work(args.work_dir, args.worker_id, **worker_options)
+    elif args.command == 'merge':
+        if not merge_shards(args.work_dir):
+            sys.exit(1)
+    elif args.command == 'retry':
+        shard_ids = ShardQueue(args.work_dir).retry_failed()
+        print(len(shard_ids), "failed shard(s) put back in the queue :", ", ".join(shard_ids))
+
+    print_status(ShardQueue(args.work_dir).status())
+
+def plan_shards(work_dir, corpus_index, language_code, synonyms_conf_path=None, interjections_conf_path=None,
+                expressions_conf_path=None, universal_tag=False,
+                window_sizes=pipeline.linguistic_measures.DEFAULT_WINDOW_SIZES, audio_corpus_index=None,
+                is_segments=False, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    This function splits the transcripts of a corpus index into shards and creates the work queue of the plan.
+    Shards are balanced by transcript size (the largest transcript goes to the smallest shard) and every audio file goes
+    to the shard of its transcript (same name without extension), so its time segments are in the same shard.
+    Paths are saved as absolute paths (the shared directories must have the same path on every node) with the hashes of
+    the configuration files (workers refuse a plan whose configuration files changed).
+
+    Parameters
+    ----------
+    work_dir: shared directory of the work queue
+    corpus_index: index of the transcriptions to process (see utils.corpus_util.CorpusIndex)
+    audio_corpus_index: index of the audios, None to skip the phonetic measures
+    shard_size: number of transcripts per shard
+    (the other parameters are the ones of run-pipeline)
+    """
+    file_names = corpus_index.file_names()
+    nb_shards = max(math.ceil(len(file_names) / shard_size), 1)
+
+    # Largest transcripts first, each one in the smallest shard so far
+    shards_heap = [(0, shard_number) for shard_number in range(nb_shards)]
+    shard_numbers = {}
+    for file_name in sorted(file_names, key=lambda file_name: -corpus_index.file_size(file_name)):
+        shard_bytes, shard_number = heapq.heappop(shards_heap)
+        shard_numbers[file_name] = shard_number
+        heapq.heappush(shards_heap, (shard_bytes + corpus_index.file_size(file_name), shard_number))
+
+    shards = [{"shard_id": "shard-" + str(shard_number).zfill(5), "transcripts": [], "audios": []}
+              for shard_number in range(nb_shards)]
+    for file_name in file_names:
+        shards[shard_numbers[file_name]]["transcripts"].append(file_name)
+
+    if audio_corpus_index is not None:
+        transcript_shards = {re.sub(r'\.\w+$', "", file_name): shard_number
+                             for file_name, shard_number in shard_numbers.items()}
+        for i, file_name in enumerate(audio_corpus_index.file_names()):
+            shard_number = transcript_shards.get(re.sub(r'\.\w+$', "", file_name), i % nb_shards)
+            shards[shard_number]["audios"].append(file_name)
+
+    plan = {"corpus_path": os.path.abspath(corpus_index.corpus_path),
+            "language_code": language_code,
+            "conf_paths": [os.path.abspath(conf_path) if conf_path else None
+                           for conf_path in [synonyms_conf_path, interjections_conf_path, expressions_conf_path]],
+            "universal_tag": universal_tag,
+            "window_sizes": list(window_sizes),
+            "audio_corpus_path": os.path.abspath(audio_corpus_index.corpus_path) if audio_corpus_index else None,
+            "is_segments": is_segments,
+            "nb_shards": nb_shards}
+    plan["config_hashes"] = hash_config_files(*plan["conf_paths"])
+
+    ShardQueue(work_dir).create(plan, shards)
+
+    print("Planned", len(file_names), "transcripts in", nb_shards, "shard(s) in", work_dir)
+
+def work(work_dir, worker_id=None, claim_timeout=DEFAULT_CLAIM_TIMEOUT, cache_options=None, jobs=1, is_verbose=False):
+    """
+    This function claims and processes shards until there's none left. The stages are the ones of run-pipeline
+    (run one after the other on the shard's transcripts), the results of a shard are the measures of every transcript
+    and audio file. A shard that can't be processed is moved to failed/ (with the error) and the worker goes on.
+    """
+    shard_queue = ShardQueue(work_dir, claim_timeout, worker_id)
+    plan = shard_queue.read_plan()
+
+    if hash_config_files(*plan["conf_paths"]) != plan["config_hashes"]:
+        print("Configuration files changed since the plan, run the plan command again.")
+        sys.exit(1)
+
+    stages = create_stages(plan, is_verbose=is_verbose)
+    corpus_index = CorpusIndex(plan["corpus_path"], normalizer.TRANSCRIPT_EXTENSIONS)
+    audio_corpus_index = CorpusIndex(plan["audio_corpus_path"]) if plan["audio_corpus_path"] else None
+    open_store = lambda: ArtifactStore(BlobCache(*cache_options) if cache_options else None)
+
+    nb_shards = 0
+    shard = shard_queue.claim()
+    while shard is not None:
+        print("Worker", shard_queue.worker_id, "processing", shard["shard_id"],
+              "(" + str(len(shard["transcripts"])), "transcripts,", len(shard["audios"]), "audios)")
+        start_time = time.perf_counter()
+        try:
+            with shard_queue.heartbeat(shard):
+                results = process_shard(shard, stages, corpus_index, audio_corpus_index, plan["is_segments"],
+                                        open_store, cache_options, jobs)
+        except Exception as e:
+            print("Couldn't process", shard["shard_id"], ":", str(e) or type(e).__name__)
+            shard_queue.fail(shard, str(e) or type(e).__name__)
+        else:
+            shard_queue.complete(shard, results)
+            nb_shards += 1
+            pipeline.print_stage_time(shard["shard_id"], start_time)
+        shard = shard_queue.claim()
+
+    print("Worker", shard_queue.worker_id, "done,", nb_shards, "shard(s) processed.")
+
+def process_shard(shard, stages, corpus_index, audio_corpus_index, is_segments=False, open_store=ArtifactStore,
+                  cache_options=None, jobs=1):
+    """
+    This function runs the pipeline stages on the transcripts of a shard and the phonetic measures on its audios.
+
+    Returns
+    ----------
+    results: measures of every transcript (the values exported by run-pipeline) and of every audio file
+    """
+    shard_index = corpus_index.filter(file_names=shard["transcripts"])
+    missing_file_names = sorted(set(shard["transcripts"]) - set(shard_index.file_names()))
+    if missing_file_names:
+        raise IOError("transcripts removed since the plan: " + ", ".join(missing_file_names))
+
+    transcripts = pipeline.list_transcripts(shard_index)
+    pipeline.run_stages(stages, transcripts, open_store)
+
+    phonetics = []
+    if audio_corpus_index is not None:
+        phonetic_measures = importlib.import_module("multilingual-phonetic-measures")
+        for file_name, phonetics_row, error in phonetic_measures.process_audio_files(
+                audio_corpus_index.filter(file_names=shard["audios"]), is_segments=is_segments,
+                cache_options=cache_options, jobs=jobs,
+                dialog_time_segments=pipeline.get_dialog_time_segments(transcripts)):
+            if error:
+                print("Couldn't process", file_name, ":", error)
+            else:
+                phonetics.append([file_name, phonetics_row])
+
+    return {"shard_id": shard["shard_id"],
+            "transcripts": [{key: transcript[key] for key in SHARD_TRANSCRIPT_KEYS if key in transcript}
+                            for transcript in transcripts],
+            "phonetics": phonetics}
+
+def merge_shards(work_dir):
+    """
+    This function combines the measures of every shard into the standard .csv files (same files, in the same order, as
+    run-pipeline on the whole corpus). Nothing is exported unless every shard is done.
+
+    Returns
+    ----------
+    is_merged: False if some shards aren't done (they are printed)
+    """
+    shard_queue = ShardQueue(work_dir)
+    plan = shard_queue.read_plan()
+    status = shard_queue.status()
+
+    if len(status["done"]) != plan["nb_shards"]:
+        print("Shards not done yet :", ", ".join(status["todo"] + status["claimed"] + status["failed"]))
+        if status["failed"]:
+            print("Failed shards can be put back in the queue with the retry command.")
+        return False
+
+    transcripts, phonetics = [], []
+    for shard_id in status["done"]:
+        results = shard_queue.read_results(shard_id)
+        transcripts.extend(results["transcripts"])
+        phonetics.extend(results["phonetics"])
+
+    # Transcripts (and audio files) in file name order, as run-pipeline processes them
+    transcripts.sort(key=lambda transcript: transcript["file_name"])
+    pipeline.export_results(create_stages(plan), transcripts)
+
+    if plan["audio_corpus_path"]:
+        phonetics.sort(key=lambda phonetic: phonetic[0])
+        pipeline.export_phonetic_results([phonetics_row for _, phonetics_row in phonetics])
+
+    return True
+
+def create_stages(plan, is_verbose=False):
+    """Returns the pipeline stages (see run-pipeline) configured as the plan."""
+    return pipeline.TranscriptStages(plan["language_code"], *plan["conf_paths"], universal_tag=plan["universal_tag"],
+                                     window_sizes=plan["window_sizes"], is_verbose=is_verbose)
+
+def print_status(status):
+    print("")
+    print("SHARDS")
+    print("------------------------")
+    for state, shard_ids in status.items():
+        print(state, len(shard_ids))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.audio_util` reads audio signals of the corpus (.wav and .mp3) as NumPy arrays, either at once or block by block.
+MP3 files are decoded in memory by streaming ffmpeg's raw PCM output block by block and WAV files are memory-mapped:
+nothing is written to disk and the signal doesn't have to be held in memory at once.
+"""
+
+import struct
+import subprocess
+
+import numpy as np
+import scipy.io.wavfile as wav
+from pydub.utils import get_encoder_name
+
+# CONSTANTS
+# Number of samples decoded at a time from an MP3 file
+MP3_BLOCK_SAMPLES = 1 << 16
+PCM_DTYPE = np.dtype("<i2")
+
+def get_full_scale(dtype):
+    """Returns the full scale amplitude of samples of the given type (e.g. 32768 for 16 bits PCM, 1.0 for float signals)."""
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        return float(np.iinfo(dtype).max + 1)
+    return 1.0
+
+def is_mp3_file(file_path):
+    return file_path.lower().endswith(".mp3")
+
+def is_wav_file(file_path):
+    return file_path.lower().endswith(".wav")
+
+class Mp3Stream:
+    """
+    An MP3 stream decodes an MP3 file with ffmpeg and yields its signal (16 bits PCM, downmixed to mono) block by block.
+    ffmpeg writes a WAV stream on its standard output: the header gives the sample rate, then samples are read as they're decoded.
+
+    Example:
+        with Mp3Stream(file_path) as stream:
+            for block in stream:
+                ... # stream.rate is the sample rate
+    """
+    def __init__(self, file_path, block_samples=MP3_BLOCK_SAMPLES, max_duration=None):
+        """Starts the decoding and reads the sample rate."""
+        command = [get_encoder_name(), "-v", "quiet", "-i", file_path]
+        if max_duration is not None:
+            command += ["-t", str(max_duration)]
+        command += ["-f", "wav", "-acodec", "pcm_s16le", "-ac", "1", "-"]
+
+        self.file_path = file_path
+        self.block_samples = block_samples
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            self.rate = self._read_wav_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_wav_header(self):
+        """Reads the WAV header up to the data chunk and returns the sample rate."""
+        header = self.process.stdout.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise IOError("ffmpeg couldn't decode " + self.file_path)
+
+        rate = None
+        while True:
+            chunk_header = self.process.stdout.read(8)
+            if len(chunk_header) < 8:
+                raise IOError("ffmpeg couldn't decode " + self.file_path)
+            chunk_id, chunk_size = chunk_header[:4], struct.unpack("<I", chunk_header[4:])[0]
+            if chunk_id == b"data" and rate is not None:
+                return rate
+            chunk = self.process.stdout.read(chunk_size + chunk_size % 2)
+            if chunk_id == b"fmt ":
+                rate = struct.unpack("<I", chunk[4:8])[0]
+
+    def __iter__(self):
+        block_bytes = self.block_samples * PCM_DTYPE.itemsize
+        try:
+            while True:
+                data = self.process.stdout.read(block_bytes)
+                if not data:
+                    break
+                # An odd number of bytes can only happen if ffmpeg was interrupted
+                data = data[:len(data) - len(data) % PCM_DTYPE.itemsize]
+                yield np.frombuffer(data, dtype=PCM_DTYPE)
+            if self.process.wait() != 0:
+                raise IOError("ffmpeg couldn't decode " + self.file_path)
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops the decoding (if it isn't done yet)."""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_mp3(file_path, max_duration=None):
+    """
+    Decodes an MP3 file in memory.
+
+    Returns
+    ----------
+    rate: sample rate of the signal
+    signal: int16 array of the (mono) signal
+    """
+    with Mp3Stream(file_path, max_duration=max_duration) as stream:
+        blocks = list(stream)
+    signal = np.concatenate(blocks) if blocks else np.zeros(0, dtype=PCM_DTYPE)
+    return stream.rate, signal
+
+def read_audio(file_path, mp3_max_duration=None, mmap=False):
+    """
+    Reads an audio file (.wav or .mp3) as a NumPy array. With mmap, WAV files are memory-mapped
+    (only the slices of the signal that are used are read).
+
+    Returns
+    ----------
+    rate: sample rate of the signal
+    signal: array of the signal
+    """
+    if is_mp3_file(file_path):
+        return read_mp3(file_path, max_duration=mp3_max_duration)
+    return wav.read(file_path, mmap=mmap)
+
+def open_audio_blocks(file_path, block_samples=MP3_BLOCK_SAMPLES, mp3_max_duration=None):
+    """
+    Opens an audio file (.wav or .mp3) to read its signal block by block. WAV files are memory-mapped,
+    so only the block being processed is loaded in memory.
+
+    Returns
+    ----------
+    rate: sample rate of the signal
+    blocks: iterable of arrays of (at most) block_samples samples
+    """
+    if is_mp3_file(file_path):
+        stream = Mp3Stream(file_path, block_samples=block_samples, max_duration=mp3_max_duration)
+        return stream.rate, stream
+
+    rate, signal = wav.read(file_path, mmap=True)
+    return rate, (signal[start:start + block_samples] for start in range(0, len(signal), block_samples))
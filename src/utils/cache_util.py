@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.cache_util` implements a content-addressed cache: values (bytes or NumPy arrays) are stored in a single
+sqlite file under keys derived from the hash of their inputs (e.g. an audio file's content and the parameters used
+to compute its measures). The cache size is limited: least recently used entries are evicted first.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# CONSTANTS
+HASH_BLOCK_SIZE = 1 << 20
+DEFAULT_CACHE_SIZE = 256 * (1 << 20)
+# Seconds a connection waits for another process to release the database
+SQLITE_TIMEOUT = 60
+
+def hash_file(file_path):
+    """Returns the sha256 hash (hexadecimal) of a file's content, read block by block."""
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(HASH_BLOCK_SIZE), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def make_cache_key(*parts):
+    """
+    Returns a cache key (sha256 hash, hexadecimal) out of the given parts (e.g. a content hash and a dictionary
+    of parameters). Parts must be JSON serializable, dictionaries are serialized with sorted keys.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class BlobCache:
+    """
+    A blob cache stores values under keys in a single sqlite file. Every entry records its size and last access time:
+    once the total size goes above max_size, least recently used entries are evicted.
+    Several processes can use the same cache (sqlite handles the locking).
+
+    Example:
+        with BlobCache("out/Cache/features.sqlite") as cache:
+            features = cache.get_array(key)
+            if features is None:
+                features = ...
+                cache.put_array(key, features)
+    """
+    def __init__(self, cache_path, max_size=DEFAULT_CACHE_SIZE):
+        """Opens (or creates) the cache file."""
+        dirname = os.path.dirname(cache_path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.connection = sqlite3.connect(cache_path, timeout=SQLITE_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blobs (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                                "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access)")
+        self.connection.commit()
+
+    def get(self, key):
+        """Returns the value (bytes) stored under a key, None if there is none."""
+        row = self.connection.execute("SELECT value FROM blobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE blobs SET last_access = ? WHERE key = ?", (time.time(), key))
+        return bytes(row[0])
+
+    def put(self, key, value):
+        """Stores a value (bytes) under a key (replacing the previous one) and evicts entries if the cache is too big."""
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO blobs (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                                    (key, sqlite3.Binary(value), len(value), time.time()))
+            self._evict()
+
+    def get_array(self, key):
+        """Returns the NumPy array stored under a key, None if there is none."""
+        value = self.get(key)
+        if value is None:
+            return None
+        return np.load(io.BytesIO(value), allow_pickle=False)
+
+    def put_array(self, key, array):
+        """Stores a NumPy array (numeric) under a key."""
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(array), allow_pickle=False)
+        self.put(key, buffer.getvalue())
+
+    def delete(self, key):
+        with self.connection:
+            self.connection.execute("DELETE FROM blobs WHERE key = ?", (key,))
+
+    def clear(self):
+        """Removes every entry."""
+        with self.connection:
+            self.connection.execute("DELETE FROM blobs")
+        self.connection.execute("VACUUM")
+
+    def size(self):
+        """Total size (bytes) of the stored values."""
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+    def __contains__(self, key):
+        return self.connection.execute("SELECT 1 FROM blobs WHERE key = ?", (key,)).fetchone() is not None
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return
+
+        # Least recently used entries are removed until the cache fits
+        evicted_keys = []
+        for key, size in self.connection.execute("SELECT key, size FROM blobs ORDER BY last_access"):
+            evicted_keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM blobs WHERE key = ?", evicted_keys)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
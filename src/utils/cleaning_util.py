@@ -2,6 +2,16 @@ import re
 import os
 import json
 
+# This function removes time bullets from dialogs and returns their time segments (start and end in milliseconds).
+# In chat files (.cha), utterances are aligned with the audio by a time bullet (between two \x15 characters, or •)
+# EXAMPLE: *PAR: the boy is taking cookies . \x1512340_15670\x15
+def remove_time_bullets(dialog):
+    p = re.compile(r'[\x15•](\d+)_(\d+)[\x15•]')
+    time_segments = [(int(start), int(end)) for start, end in re.findall(p, dialog)]
+    clean = re.sub(p, '', dialog)
+
+    return (clean, time_segments)
+
 # This function removes pauses from dialogs.
 # Pauses should be marked as following : 
 # Short pause : (.), Medium pause : (..), Long pause : (...), Other pause : (....) or more dots
@@ -1,8 +1,25 @@
+import atexit
+import copy
+import datetime
+import hashlib
+import io
+import json
 import os
 import re
+from utils.cache_util import hash_file
 from utils.nlp_util import Tag
 from nltk.tokenize import sent_tokenize
 
+# CONSTANTS
+# File name format: status_idParticipant-interviewNumber.* (e.g. AD_101-1.cha)
+PARTICIPANT_INFO_PATTERN = re.compile(r'(.*)_([0-9]+)-([0-9a-z])+')
+# Manifests of the corpus indexes (see CorpusIndex)
+CORPUS_MANIFEST_PATH = 'out/CorpusManifests/'
+# Manifests of another version are rebuilt
+CORPUS_MANIFEST_VERSION = 1
+# The manifest is written every time this number of files were hashed (and at exit)
+HASHES_PER_MANIFEST_WRITE = 64
+
 # This function will return classes found in corpus data set
 # E.g. : AD_101-1.txt file indicates there's a AD class in corpus
 def obtain_corpus_classes(corpus_path):
@@ -21,21 +38,212 @@ def obtain_corpus_classes(corpus_path):
 # Status -> AD
 # Participant nb -> 101
 # Inteview nb -> 1
+# An empty dictionary is returned (and the error printed) if the file name doesn't have this format
 def extract_participant_info(file_name):
-    participant_info = {}
-    pattern = re.compile(r'(.*)_([0-9]+)-([0-9a-z])+')
-    re_participant_info = re.search(pattern, file_name)
+    participant_info = parse_participant_info(file_name)
 
-    if len(re_participant_info.groups()) != 3:
+    if participant_info is None:
         print("File name with wrong format :", file_name)
         print("Should be status_idParticipant-interviewNumber.*")
-    else:
-        participant_info["status"] = re_participant_info.group(1)
-        participant_info["idParticipant"] = re_participant_info.group(2)
-        participant_info["interviewNumber"] = re_participant_info.group(3)
+        return {}
 
     return participant_info
 
+# This function parses the participant info of a file name (see extract_participant_info), None if it doesn't match.
+# The pattern is compiled once (module constant).
+def parse_participant_info(file_name):
+    re_participant_info = PARTICIPANT_INFO_PATTERN.search(file_name)
+
+    if re_participant_info is None:
+        return None
+
+    return {"status": re_participant_info.group(1),
+            "idParticipant": re_participant_info.group(2),
+            "interviewNumber": re_participant_info.group(3)}
+
+# A corpus index lists the files of a corpus folder with one directory scan (os.scandir) and keeps, for every file,
+# the participant info of its name, its size and modification time. The content hash (sha256) of a file is only
+# computed when a tool asks for it (file_hash), so a scan never reads the files (e.g. hour long audios).
+# Those are cached in a manifest (one JSON file per corpus folder, under out/CorpusManifests): a file whose size and
+# modification time didn't change since the last scan keeps its hash and isn't hashed again. Files whose name doesn't
+# have the status_idParticipant-interviewNumber format are reported and left out.
+# Every tool lists its corpus with an index, which can be filtered (class, participant and modification date range).
+# E.g. : CorpusIndex("data/transcripts", extensions=(".cha", ".txt")).filter(classes=["AD"]).file_names()
+class CorpusIndex:
+    def __init__(self, corpus_path, extensions=None, manifest_path=CORPUS_MANIFEST_PATH, is_verbose=False):
+        self.corpus_path = corpus_path
+        self.extensions = tuple(extensions) if extensions else None
+        self.manifest_file_path = get_manifest_file_path(corpus_path, manifest_path)
+
+        manifest = read_manifest(self.manifest_file_path)
+        # Every file of the folder (the manifest), self.entries being the indexed ones (entries are shared)
+        self.manifest_entries = {}
+        self.entries = {}
+        self.invalid_file_names = []
+        # Files hashed since the manifest was written (shared with the filtered indexes)
+        self.unsaved_hashes = []
+        nb_modified = 0
+
+        with os.scandir(corpus_path) as dir_entries:
+            for dir_entry in dir_entries:
+                file_name = os.fsdecode(dir_entry.name)
+
+                # To make sure we don't process hidden files (or folders)
+                if file_name.startswith(".") or not dir_entry.is_file():
+                    continue
+
+                stat = dir_entry.stat()
+                entry = manifest.get(file_name)
+                if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                    # Hashed on demand only (see file_hash)
+                    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "mtime": stat.st_mtime,
+                             "hash": None, "participant_info": parse_participant_info(file_name)}
+                    nb_modified += 1
+                self.manifest_entries[file_name] = entry
+
+                # Only the files of the given extensions with a valid name are indexed
+                if self.extensions and not file_name.endswith(self.extensions):
+                    continue
+                if entry["participant_info"] is None:
+                    print("File name with wrong format :", file_name)
+                    print("Should be status_idParticipant-interviewNumber.*")
+                    self.invalid_file_names.append(file_name)
+                    continue
+                self.entries[file_name] = entry
+
+        if nb_modified or len(manifest) != len(self.manifest_entries):
+            self.save_manifest()
+        # The hashes computed after the scan are saved at exit
+        atexit.register(self.save_manifest_hashes)
+
+        if is_verbose:
+            print("Indexed", len(self.entries), "files of", corpus_path, "(" + str(nb_modified), "new or modified)")
+
+    # Sorted file names of the indexed files
+    def file_names(self):
+        return sorted(self.entries)
+
+    def file_path(self, file_name):
+        return os.path.join(self.corpus_path, file_name)
+
+    def participant_info(self, file_name):
+        return dict(self.entries[file_name]["participant_info"])
+
+    # Content hash of a file, computed on first request and kept in the manifest
+    def file_hash(self, file_name):
+        entry = self.entries[file_name]
+        if entry.get("hash") is None:
+            entry["hash"] = hash_file(self.file_path(file_name))
+            self.unsaved_hashes.append(file_name)
+            if len(self.unsaved_hashes) >= HASHES_PER_MANIFEST_WRITE:
+                self.save_manifest()
+        return entry["hash"]
+
+    def save_manifest(self):
+        write_manifest(self.manifest_file_path, self.corpus_path, self.manifest_entries)
+        del self.unsaved_hashes[:]
+
+    def save_manifest_hashes(self):
+        if self.unsaved_hashes:
+            self.save_manifest()
+
+    def file_size(self, file_name):
+        return self.entries[file_name]["size"]
+
+    def modification_time(self, file_name):
+        return self.entries[file_name]["mtime"]
+
+    # Classes found in the corpus (e.g. AD, CTRL)
+    def classes(self):
+        return set(entry["participant_info"]["status"] for entry in self.entries.values())
+
+    # This function returns a new index of the files matching every given filter:
+    # classes (status), participants (idParticipant), modification date range (dates or "YYYY-MM-DD" strings,
+    # modified_before is exclusive) and file names (e.g. the files of a shard)
+    def filter(self, classes=None, participants=None, modified_after=None, modified_before=None, file_names=None):
+        modified_after = to_timestamp(modified_after)
+        modified_before = to_timestamp(modified_before)
+        participants = set(str(participant) for participant in participants) if participants else None
+        file_names = set(file_names) if file_names is not None else None
+
+        filtered_index = copy.copy(self)
+        filtered_index.entries = {}
+        for file_name, entry in self.entries.items():
+            participant_info = entry["participant_info"]
+            if classes and participant_info["status"] not in classes:
+                continue
+            if participants and participant_info["idParticipant"] not in participants:
+                continue
+            if modified_after is not None and entry["mtime"] < modified_after:
+                continue
+            if modified_before is not None and entry["mtime"] >= modified_before:
+                continue
+            if file_names is not None and file_name not in file_names:
+                continue
+            filtered_index.entries[file_name] = entry
+
+        return filtered_index
+
+    def __len__(self):
+        return len(self.entries)
+
+# This function adds the corpus filter arguments (class, participant and modification date range) to a tool's parser
+def add_corpus_filter_arguments(parser):
+    parser.add_argument('--classes', dest='classes', nargs='+', default=None,
+                    help='only process the transcripts of those classes (e.g. AD CTRL)')
+    parser.add_argument('--participants', dest='participants', nargs='+', default=None,
+                    help='only process the transcripts of those participants (idParticipant)')
+    parser.add_argument('--modified_after', dest='modified_after', default=None,
+                    help='only process the files modified on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--modified_before', dest='modified_before', default=None,
+                    help='only process the files modified before this date (YYYY-MM-DD)')
+
+# This function creates the index of a corpus folder, filtered with the corpus filter arguments of a tool
+def create_corpus_index(corpus_path, args, extensions=None):
+    corpus_index = CorpusIndex(corpus_path, extensions, is_verbose=args.is_verbose)
+    return corpus_index.filter(args.classes, args.participants, args.modified_after, args.modified_before)
+
+# This function returns the index of a corpus: a corpus index is returned as is, a folder is indexed
+def get_corpus_index(corpus, extensions=None):
+    if isinstance(corpus, CorpusIndex):
+        return corpus
+    return CorpusIndex(corpus, extensions)
+
+# This function returns the manifest file of a corpus folder (named after the hash of the folder's absolute path)
+def get_manifest_file_path(corpus_path, manifest_path=CORPUS_MANIFEST_PATH):
+    corpus_key = hashlib.sha256(os.path.abspath(corpus_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(manifest_path, corpus_key + ".json")
+
+def read_manifest(manifest_file_path):
+    if not os.path.exists(manifest_file_path):
+        return {}
+    try:
+        with open(manifest_file_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        return manifest["files"] if manifest.get("version") == CORPUS_MANIFEST_VERSION else {}
+    except (ValueError, KeyError, AttributeError):
+        # A corrupted manifest is rebuilt
+        return {}
+
+# The manifest is written in a temporary file and then renamed, so a manifest is never read half written
+# (e.g. by another tool scanning the same corpus)
+def write_manifest(manifest_file_path, corpus_path, entries):
+    os.makedirs(os.path.dirname(manifest_file_path), exist_ok=True)
+    temporary_path = manifest_file_path + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_path, "w") as manifest_file:
+        json.dump({"version": CORPUS_MANIFEST_VERSION, "corpus_path": os.path.abspath(corpus_path), "files": entries},
+                  manifest_file)
+    os.replace(temporary_path, manifest_file_path)
+
+def to_timestamp(date):
+    if date is None:
+        return None
+    if isinstance(date, str):
+        date = datetime.datetime.strptime(date, "%Y-%m-%d")
+    elif not isinstance(date, datetime.datetime):
+        date = datetime.datetime(date.year, date.month, date.day)
+    return date.timestamp()
+
 # This function extracts lines of transcripts as sentences. This method is dependant on the transcript format.
 def extract_transcript_lines(file_path, is_chat_file=True):
     with open(file_path, 'r') as file:
@@ -50,21 +258,45 @@ def extract_transcript_lines(file_path, is_chat_file=True):
     
     return lines
 
+# This function extracts the header lines of a chat transcript (.cha), the lines before the first utterance.
+# The file is read line by line and reading stops at the first utterance (line starting with "*"),
+# so only the first kilobytes of the file are read.
+# E.g. : @Begin, @Languages, @Participants, @ID lines
+def extract_header_lines(file_path, utterance_code='*'):
+    header_lines = []
+
+    with open(file_path, 'r') as file:
+        for line in file:
+            if line.startswith(utterance_code):
+                break
+            header_lines.append(line.rstrip('\r\n'))
+
+    return header_lines
+
 # This function extracts lines of transcripts as sentences. This method is dependant on the transcript format.
 def extract_tags(file_path):
+    with open(file_path, 'r') as file:
+        return parse_tag_lines(file)
+
+# This function parses tagged lines ("word lemma tag") as POS tags, any other line is a sentence break ("\n").
+# Lines can come from a tagged transcript file or from memory (see read_tags_from_text).
+def parse_tag_lines(lines):
     tags = []
 
-    file = open(file_path, 'r')
-    for line in file:
+    for line in lines:
         if len(line.split(' ')) == 3: # 
             tag = line.split(' ')
             tags.append(Tag(tag[0], tag[1], tag[2].strip().replace("\n", "")))
         else:
             tags.append("\n")
-        
-    file.close()
+
     return tags
 
+# This function parses tags formatted in memory exactly as extract_tags parses a tagged transcript file
+# (same universal newlines), so in-memory stages get the same tags as stages chained thru files.
+def read_tags_from_text(text):
+    return parse_tag_lines(io.StringIO(text, newline=None))
+
 # This function extract dialogs from transcripts of a 2-speaker dialog.
 def extract_two_speaker_dialogs(lines, speaker_1_code, speaker_2_code):
     speaker_1_dialog = []
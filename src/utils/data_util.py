@@ -1,4 +1,7 @@
 import os
+
+import numpy as np
+
 from utils.nlp_util import Tag
 
 # This function simply saves a dialog in a text file
@@ -17,16 +20,25 @@ def save_tags_in_file(tags, file_path):
     if not os.path.exists(dirname):
         os.makedirs(dirname)
     with open(file_path, "w+") as f:
-        for tag in tags:
-            if type(tag) is Tag:
-                f.write(tag.original + " " + tag.lemma + " " + tag.tag + "\n")
-            else:
-                f.write(os.linesep)
+        f.write(format_tags(tags))
         f.close()
     return
 
+# This function formats tags (POS tags) as a tagged dialog file: one "word lemma tag" line per tag
+def format_tags(tags):
+    return "".join(tag.original + " " + tag.lemma + " " + tag.tag + "\n" if type(tag) is Tag else os.linesep
+                   for tag in tags)
+
 # This function exports a dataframe to a csv file.
 def export_dataframe(df, output_path="/"): 
     if not os.path.exists(os.path.dirname(output_path)):
         os.makedirs(os.path.dirname(output_path))
     df.to_csv(output_path)
+
+# This function exports a sparse feature matrix (scipy.sparse) with its column and row names to a compressed .npz file.
+def export_sparse_matrix(matrix, columns, rows, output_path="/"):
+    if not os.path.exists(os.path.dirname(output_path)):
+        os.makedirs(os.path.dirname(output_path))
+    matrix = matrix.tocsr()
+    np.savez_compressed(output_path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                        shape=matrix.shape, columns=np.array(columns), rows=np.array(rows))
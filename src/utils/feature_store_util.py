@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.feature_store_util` implements the feature store: the feature files of every tool (e.g.
+discursive_markers_distribution.csv, pos_distribution.csv, linguistic_features.csv, phonetic_features.csv) are ingested
+as tables of typed Parquet partitions with the same keys, and joined into one wide table for modeling.
+
+    out/FeatureStore/manifest.json                  tables, their columns and partitions
+    out/FeatureStore/<table>/part-<status>.parquet  rows of one class, sorted by idParticipant and interviewNumber
+
+Every table has the same key columns and types (idParticipant, interviewNumber and status: text as spelled in the file
+names, see utils.sink_util.KEY_TYPES), whatever the source file (.csv with its index column, .parquet or .feather).
+Partitions are written in row groups of ROW_GROUP_SIZE rows sorted by keys, so a join only reads the needed partitions
+(classes), row groups (participants, thru the idParticipant statistics of the row groups) and columns (projection),
+then joins the tables on their keys index. pyarrow is needed.
+"""
+
+import importlib
+import json
+import os
+import re
+import shutil
+from collections import Counter
+
+import pandas as pd
+
+from utils.sink_util import KEY_TYPES, import_pyarrow
+
+# CONSTANTS
+FEATURE_STORE_PATH = "out/FeatureStore/"
+# Keys of every table, in this order
+KEY_COLUMNS = ["idParticipant", "interviewNumber", "status"]
+FEATURE_FILE_EXTENSIONS = (".csv", ".parquet", ".feather")
+JOIN_TYPES = ["inner", "outer", "left"]
+# Rows per row group of a partition (bounded, so that a participant's rows are found in few row groups)
+ROW_GROUP_SIZE = 128
+
+class FeatureStore:
+    """
+    A feature store keeps the feature files of the tools as tables of Parquet partitions (see module documentation).
+
+    Example:
+        feature_store = FeatureStore()
+        feature_store.ingest("out/ExtractedFeatures/linguistic_features.csv")
+        feature_store.ingest("out/ExtractedFeatures/phonetic_features.csv")
+        df_features = feature_store.join(columns=["ttr", "mean_1"], classes=["AD", "CTRL"])
+    """
+    def __init__(self, store_path=FEATURE_STORE_PATH):
+        """
+        store_path: folder of the store (created by the first ingestion)
+        """
+        self.store_path = store_path
+        self.manifest = read_store_manifest(os.path.join(store_path, "manifest.json"))
+
+    def tables(self):
+        return sorted(self.manifest["tables"])
+
+    def table_info(self, table):
+        """Returns the source, columns (without the keys), partitions and number of rows of a table."""
+        return self.manifest["tables"][table]
+
+    def ingest(self, feature_path, table=None):
+        """
+        Ingests a feature file (.csv, .parquet or .feather) as a table, replacing the table of the same name: its rows
+        are split by class (status) into Parquet partitions sorted by keys, in row groups of ROW_GROUP_SIZE rows. Raises ValueError if the file has no key
+        columns or a key twice.
+
+        feature_path: path to the feature file
+        table: name of the table (default: name of the file without extension)
+
+        Returns the number of rows of the table.
+        """
+        table = table if table else os.path.splitext(os.path.basename(feature_path))[0]
+        df_features = to_key_types(read_feature_file(feature_path))
+
+        duplicates = df_features.duplicated(KEY_COLUMNS)
+        if duplicates.any():
+            raise ValueError("key " + "/".join(str(key) for key in df_features.loc[duplicates, KEY_COLUMNS].iloc[0])
+                             + " twice in " + feature_path)
+
+        columns = [column for column in df_features.columns if column not in KEY_COLUMNS]
+        df_features = df_features[KEY_COLUMNS + columns].sort_values(KEY_COLUMNS, ignore_index=True)
+
+        pyarrow = import_pyarrow()
+        parquet = importlib.import_module("pyarrow.parquet")
+        table_path = os.path.join(self.store_path, table)
+        shutil.rmtree(table_path, ignore_errors=True)
+        os.makedirs(table_path)
+
+        partitions = {}
+        for status, df_partition in df_features.groupby("status", sort=True):
+            file_name = "part-" + re.sub(r'[^\w-]', "_", status) + ".parquet"
+            parquet.write_table(pyarrow.Table.from_pandas(df_partition, preserve_index=False),
+                                os.path.join(table_path, file_name), row_group_size=ROW_GROUP_SIZE)
+            partitions[status] = file_name
+
+        self.manifest["tables"][table] = {"source": os.path.abspath(feature_path), "columns": columns,
+                                          "partitions": partitions, "nb_rows": len(df_features)}
+        write_store_manifest(os.path.join(self.store_path, "manifest.json"), self.manifest)
+        return len(df_features)
+
+    def join(self, tables=None, columns=None, classes=None, participants=None, how="inner"):
+        """
+        Joins tables into one wide table indexed by the keys (idParticipant, interviewNumber, status), sorted by keys.
+        A column found in several tables (e.g. totalWordCount) is named <table>.<column>.
+
+        tables: names of the tables to join (default: every table)
+        columns: projection, only those columns are read ("column" from every table having it, or "table.column"),
+                 tables without any of them are left out (default: every column)
+        classes: only the partitions of those classes are read (default: every class)
+        participants: only the rows of those participants are read (row group statistics, default: every participant)
+        how: type of join (inner: rows found in every table, outer: rows found in any table, left: rows of the first table)
+
+        Returns the wide table (dataframe).
+        """
+        tables = tables if tables else self.tables()
+        unknown_tables = [table for table in tables if table not in self.manifest["tables"]]
+        if unknown_tables:
+            raise ValueError("unknown tables: " + ", ".join(unknown_tables))
+        if how not in JOIN_TYPES:
+            raise ValueError("unknown join type: " + how)
+
+        projection = self._project(tables, columns)
+        column_counts = Counter(column for table in tables for column in self.table_info(table)["columns"])
+
+        df_wide = None
+        for table in tables:
+            if columns is not None and not projection[table]:
+                continue
+            df_table = self._read_table(table, projection[table], classes, participants).set_index(KEY_COLUMNS)
+            df_table.columns = [table + "." + column if column_counts[column] > 1 else column
+                                for column in df_table.columns]
+            df_wide = df_table if df_wide is None else df_wide.join(df_table, how=how)
+
+        if df_wide is None:
+            return pd.DataFrame(columns=KEY_COLUMNS).set_index(KEY_COLUMNS)
+        return df_wide.sort_index()
+
+    def _project(self, tables, columns):
+        """Returns the columns to read of every table (every column without a projection)."""
+        projection = {table: [] if columns is not None else list(self.table_info(table)["columns"])
+                      for table in tables}
+        for column in columns if columns is not None else []:
+            table, _, table_column = column.rpartition(".")
+            if table in projection and table_column in self.table_info(table)["columns"]:
+                projection[table].append(table_column)
+                continue
+            matching_tables = [table for table in tables if column in self.table_info(table)["columns"]]
+            if not matching_tables:
+                raise ValueError("unknown column: " + column)
+            for table in matching_tables:
+                projection[table].append(column)
+        # Columns in the order of the table
+        return {table: [column for column in self.table_info(table)["columns"] if column in projection[table]]
+                for table in tables}
+
+    def _read_table(self, table, columns, classes=None, participants=None):
+        import_pyarrow()
+        parquet = importlib.import_module("pyarrow.parquet")
+        filters = [("idParticipant", "in", [str(participant) for participant in participants])] if participants else None
+
+        df_partitions = []
+        for status, file_name in sorted(self.table_info(table)["partitions"].items()):
+            # Partitions of the other classes aren't read
+            if classes and status not in classes:
+                continue
+            df_partitions.append(parquet.read_table(os.path.join(self.store_path, table, file_name),
+                                                    columns=KEY_COLUMNS + columns, filters=filters).to_pandas())
+
+        if not df_partitions:
+            return pd.DataFrame(columns=KEY_COLUMNS + columns)
+        return pd.concat(df_partitions, ignore_index=True)
+
+def read_feature_file(feature_path):
+    """
+    Reads a feature file (.csv, .parquet or .feather, see utils.sink_util.FeatureSink) without its index column.
+    Raises ValueError if it has no key columns.
+    """
+    extension = os.path.splitext(feature_path)[1].lower()
+    if extension == ".parquet":
+        import_pyarrow()
+        df_features = pd.read_parquet(feature_path)
+    elif extension == ".feather":
+        import_pyarrow()
+        df_features = pd.read_feather(feature_path)
+    else:
+        # Keys are read as text, so an interview number isn't turned into a number, and measures as written
+        # (round trip), so the stored values are the exact values of the tools
+        df_features = pd.read_csv(feature_path, dtype={column: str for column in KEY_COLUMNS},
+                                  float_precision="round_trip")
+        df_features = df_features.drop(columns=[column for column in df_features.columns
+                                                if column.startswith("Unnamed: ")])
+
+    missing_columns = [column for column in KEY_COLUMNS if column not in df_features.columns]
+    if missing_columns:
+        raise ValueError("no " + ", ".join(missing_columns) + " column in " + feature_path + " (not a feature file)")
+    return df_features
+
+def to_key_types(df_features):
+    """Converts the key columns to their types (see utils.sink_util.KEY_TYPES)."""
+    df_features = df_features.copy()
+    for column in KEY_COLUMNS:
+        df_features[column] = df_features[column].astype(str).str.strip().astype(KEY_TYPES[column])
+    return df_features
+
+def list_feature_files(features_path):
+    """Returns the feature files (.csv, .parquet and .feather) of a folder, in file name order."""
+    return [os.path.join(features_path, file_name) for file_name in sorted(os.listdir(features_path))
+            if file_name.lower().endswith(FEATURE_FILE_EXTENSIONS)]
+
+def read_store_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {"tables": {}}
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+def write_store_manifest(manifest_path, manifest):
+    # Written thru a temporary file renamed once written, so it's never read half written
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
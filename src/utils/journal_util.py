@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.journal_util` implements the journal of a stage: an append-only JSON lines file with one line per
+processed file (its hash, its result row or its error), written (and flushed to disk) as soon as the file is processed.
+If a long run dies (e.g. OOM), it is resumed from the journal: files already done (and unchanged since) are skipped and
+the final .csv file is rebuilt out of their journaled rows. A journal is only resumed with the same configuration
+(same corpus and parameters), otherwise it is started over.
+"""
+
+import json
+import os
+
+# CONSTANTS
+JOURNALS_PATH = "out/Journals/"
+
+class StageJournal:
+    """
+    The journal of a stage (out/Journals/<stage>.jsonl). The first line is the configuration of the run, the next ones
+    the processed files: {"file_name", "file_hash", "status": "done" or "error", "row" or "error"}.
+
+    Example:
+        with StageJournal("normalizer", {"corpus_path": corpus_path}, is_resume=True) as journal:
+            if not journal.is_done(file_name, file_hash):
+                journal.record(file_name, file_hash, row)
+    """
+    def __init__(self, stage, config, is_resume=False, journals_path=JOURNALS_PATH):
+        """
+        stage: name of the stage (name of the journal file)
+        config: JSON serializable configuration of the run (a journal of another configuration isn't resumed)
+        is_resume: if False, the journal is started over
+        """
+        self.file_path = os.path.join(journals_path, stage + ".jsonl")
+        self.config = json.loads(json.dumps(config))
+        self.entries = read_journal(self.file_path, self.config) if is_resume else None
+
+        if is_resume and self.entries is None:
+            print("No journal to resume for", stage, "(or another configuration), every file is processed")
+
+        os.makedirs(journals_path, exist_ok=True)
+        if self.entries is None:
+            self.entries = {}
+            self.journal_file = open(self.file_path, "w")
+            self._write({"config": self.config})
+        else:
+            is_line_cut = not lines_end(self.file_path)
+            self.journal_file = open(self.file_path, "a")
+            if is_line_cut:
+                # The line cut by the crash is ended, so the next entry is on its own line
+                self.journal_file.write("\n")
+
+    def is_done(self, file_name, file_hash):
+        """Checks if a file was processed (without error) by a previous run and not modified since."""
+        entry = self.entries.get(file_name)
+        return entry is not None and entry["status"] == "done" and entry["file_hash"] == file_hash
+
+    def row(self, file_name):
+        """Returns the result row journaled for a file."""
+        return self.entries[file_name].get("row")
+
+    def record(self, file_name, file_hash, row=None):
+        """Records a processed file and its result row (JSON serializable, None if the stage has none)."""
+        self._record({"file_name": file_name, "file_hash": file_hash, "status": "done", "row": row})
+
+    def record_error(self, file_name, file_hash, error):
+        """Records a file that couldn't be processed (it is processed again by the next run)."""
+        self._record({"file_name": file_name, "file_hash": file_hash, "status": "error", "error": error})
+
+    def close(self):
+        self.journal_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _record(self, entry):
+        self.entries[entry["file_name"]] = entry
+        self._write(entry)
+
+    def _write(self, entry):
+        # Flushed to disk at once, so a line is lost only if the run dies while writing it
+        self.journal_file.write(json.dumps(entry) + "\n")
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+def read_journal(file_path, config):
+    """
+    Reads the entries of a journal by file name (the last entry of a file wins). Returns None if there's no journal
+    or if it was written with another configuration. A line cut by a crash (the last one) is ignored.
+    """
+    if not os.path.exists(file_path):
+        return None
+
+    entries = {}
+    with open(file_path, "r") as journal_file:
+        lines = journal_file.readlines()
+
+    for i, line in enumerate(lines):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            if i == 0:
+                return None
+            continue
+        if i == 0:
+            if entry.get("config") != config:
+                return None
+        else:
+            entries[entry["file_name"]] = entry
+
+    return entries if lines else None
+
+def lines_end(file_path):
+    """Checks if the last line of a file is complete (ends with a new line)."""
+    with open(file_path, "rb") as journal_file:
+        journal_file.seek(0, os.SEEK_END)
+        if journal_file.tell() == 0:
+            return True
+        journal_file.seek(-1, os.SEEK_END)
+        return journal_file.read(1) == b"\n"
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.lexical_util` defines incremental counters used to compute lexical richness
+measures (type token ratio, Yule's K, entropy) over sliding windows of a transcription
+or over a transcription that grows utterance by utterance (e.g. a live transcription stream).
+"""
+
+import math
+from collections import defaultdict
+
+from utils.nlp_util import Tag
+
+# Used for Brunet's W Index (Brunet, 1978). 0.172 is the original value proposed by Brunet
+BRUNET_C = 0.172
+
+class SlidingWindowCounter:
+    """
+    A sliding window counter keeps the word counts of the last `window_size` words seen.
+    Adding a word (and dropping the oldest one) updates, in constant time, the statistics needed
+    by the windowed measures: the number of types, the sum of squared counts (Yule's K) and the
+    sum of count * log2(count) (entropy).
+    """
+    def __init__(self, window_size):
+        """Initializes the data."""
+        self.window_size = window_size
+        self.counts = defaultdict(int)
+        self.types = 0
+        self.sum_squares = 0
+        self.sum_count_log = 0.0
+
+    def add(self, word):
+        """Adds a word to the window."""
+        count = self.counts[word]
+        if count == 0:
+            self.types += 1
+        self.sum_squares += 2 * count + 1
+        self.sum_count_log += _count_log(count + 1) - _count_log(count)
+        self.counts[word] = count + 1
+
+    def remove(self, word):
+        """Removes a word from the window."""
+        count = self.counts[word]
+        if count == 1:
+            self.types -= 1
+            del self.counts[word]
+        else:
+            self.counts[word] = count - 1
+        self.sum_squares -= 2 * count - 1
+        self.sum_count_log -= _count_log(count) - _count_log(count - 1)
+
+    def ttr(self, size):
+        """Type token ratio of the current window."""
+        return self.types / size
+
+    def yule_k(self, size):
+        """Yule's characteristic K of the current window (same formula as the whole text measure)."""
+        return 10000 * ((self.sum_squares - size) / (size ** 2)) - (1 / size)
+
+    def entropy(self, size):
+        """Entropy of the current window: H = log2(N) - sum(c * log2(c)) / N"""
+        return max(math.log(size, 2) - self.sum_count_log / size, 0.0)
+
+def _count_log(count):
+    return count * math.log(count, 2) if count > 1 else 0.0
+
+def estimate_windowed_measures(words, window_size):
+    """
+    This function estimates the moving-average type token ratio (MATTR) as well as the windowed
+    Yule's K and entropy of a list of words. Every window of `window_size` consecutive words is evaluated
+    and the measures are averaged over all windows. Texts shorter than the window are evaluated as a single window.
+
+    It runs in O(n) since the window counter is updated incrementally as the window slides.
+
+    Parameters
+    ----------
+    words: list of words of the transcription
+    window_size: number of words in each window
+
+    Returns
+    ----------
+    windowed_measures: (mattr, windowed Yule's K, windowed entropy)
+    """
+
+    text_size = len(words)
+    if text_size == 0 or window_size <= 0:
+        return (0, 0, 0)
+
+    size = min(window_size, text_size)
+    counter = SlidingWindowCounter(size)
+    for word in words[:size]:
+        counter.add(word)
+
+    ttr_sum = counter.ttr(size)
+    yule_k_sum = counter.yule_k(size)
+    entropy_sum = counter.entropy(size)
+
+    for i in range(size, text_size):
+        counter.remove(words[i - size])
+        counter.add(words[i])
+
+        ttr_sum += counter.ttr(size)
+        yule_k_sum += counter.yule_k(size)
+        entropy_sum += counter.entropy(size)
+
+    nb_windows = text_size - size + 1
+    return (ttr_sum / nb_windows, yule_k_sum / nb_windows, entropy_sum / nb_windows)
+
+class LexicalAccumulator:
+    """
+    A lexical accumulator maintains the linguistic measures of a transcription that is fed token by token
+    (e.g. utterance by utterance from a live session). Every update costs O(1) per token and the full measure
+    tuple is returned in O(1): like the sliding window counter, the entropy is derived from the sum of count * log2(count),
+    updated at every word (with a compensated summation so long transcriptions don't accumulate rounding errors).
+    It is the implementation of the measures: :func:`estimate_linguistics` of :mod:`src.multilingual-linguistic-measures`
+    feeds a whole transcription to an accumulator.
+
+    Example:
+        accumulator = LexicalAccumulator(word_filter=lambda word: spell.known([word]))
+        accumulator.add_tokens(utterance_tags)
+        measures = accumulator.measures()
+    """
+    def __init__(self, word_filter=None):
+        """Initializes the data. word_filter (optionnal) is used to keep only some words (e.g. known words)."""
+        self.word_filter = word_filter
+        self.text_size = 0
+        self.lemma_counts = defaultdict(int)
+        self.word_counts = defaultdict(int)
+        self.hapax_legomena = 0
+        self.hapax_dislegomena = 0
+        self.sum_squares = 0
+        self.sum_count_log = 0.0
+        # Running compensation of the sum_count_log rounding errors (Kahan summation)
+        self.sum_count_log_error = 0.0
+
+    def add_tokens(self, tags):
+        """Adds POS tags (Tag objects) to the transcription. Anything else (e.g. sentence separators) is ignored."""
+        for tag in tags:
+            if type(tag) is Tag and (self.word_filter is None or self.word_filter(tag.original)):
+                self.add_word(tag.original, tag.lemma)
+
+    def add_word(self, word, lemma):
+        """Adds a single word and its lemma to the transcription."""
+        self.text_size += 1
+
+        lemma_count = self.lemma_counts[lemma] + 1
+        self.lemma_counts[lemma] = lemma_count
+        if lemma_count == 1:
+            self.hapax_legomena += 1
+        elif lemma_count == 2:
+            self.hapax_legomena -= 1
+            self.hapax_dislegomena += 1
+        elif lemma_count == 3:
+            self.hapax_dislegomena -= 1
+
+        word_count = self.word_counts[word]
+        self.sum_squares += 2 * word_count + 1
+        self._add_count_log(_count_log(word_count + 1) - _count_log(word_count))
+        self.word_counts[word] = word_count + 1
+
+    def _add_count_log(self, value):
+        """Adds a value to sum_count_log with Kahan's compensated summation."""
+        value -= self.sum_count_log_error
+        total = self.sum_count_log + value
+        self.sum_count_log_error = (total - self.sum_count_log) - value
+        self.sum_count_log = total
+
+    @property
+    def vocab_size(self):
+        return len(self.lemma_counts)
+
+    def measures(self):
+        """
+        Returns the linguistic measures of the accumulated transcription:
+        (text_size, vocab_size, hapax_legomena, hapax_dislegomena, brunet_index, honore_r_statistics, ttr, sichel_s, yule_k, entropy)
+        """
+        text_size = self.text_size
+        vocab_size = self.vocab_size
+        brunet_index, honore_r_statistics, ttr, sichel_s, yule_k, entropy = 0, 0, 0, 0, 0, 0
+
+        if text_size > 0 and vocab_size > 0:
+            brunet_index = text_size ** vocab_size ** (-BRUNET_C)
+        if text_size > 0 and vocab_size > 0 and (1 - (self.hapax_legomena / vocab_size) > 0):
+            honore_r_statistics = (100 * math.log(text_size)) / (1 - (self.hapax_legomena / vocab_size))
+        if vocab_size > 0:
+            ttr = self.hapax_legomena / vocab_size
+            sichel_s = self.hapax_dislegomena / vocab_size
+        if text_size > 0:
+            yule_k = 10000 * ((self.sum_squares - text_size) / (text_size ** 2)) - (1 / text_size)
+            # H = log2(N) - sum(c * log2(c)) / N, equal to -sum(c/N * log2(c/N)) up to floating point rounding
+            entropy = max(math.log(text_size, 2) - self.sum_count_log / text_size, 0.0)
+
+        return (text_size, vocab_size, self.hapax_legomena, self.hapax_dislegomena, brunet_index,
+                honore_r_statistics, ttr, sichel_s, yule_k, entropy)
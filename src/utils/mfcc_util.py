@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.mfcc_util` computes MFCC features the same way as python_speech_features.mfcc (same parameters and defaults),
+with the mel filterbank and the DCT/lifter matrix computed once per configuration (cached), zero-copy framing
+(stride tricks) and real FFTs computed on batches of frames, so memory stays bounded on long recordings.
+"""
+
+import decimal
+import math
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# CONSTANTS
+# Number of frames transformed at a time by the real FFT
+FFT_BATCH_FRAMES = 4096
+EPS = np.finfo(float).eps
+
+def round_half_up(number):
+    return int(decimal.Decimal(number).quantize(decimal.Decimal('1'), rounding=decimal.ROUND_HALF_UP))
+
+def hz_to_mel(hz):
+    return 2595 * np.log10(1 + hz / 700.)
+
+def mel_to_hz(mel):
+    return 700 * (10 ** (mel / 2595.0) - 1)
+
+def count_frames(nb_samples, frame_len, frame_step):
+    """Number of frames of a signal (the last frame is zero-padded)."""
+    if nb_samples <= frame_len:
+        return 1
+    return 1 + int(math.ceil((1.0 * nb_samples - frame_len) / frame_step))
+
+@lru_cache(maxsize=None)
+def get_mel_filterbank(nfilt, nfft, rate, lowfreq=0, highfreq=None):
+    """
+    Computes (once per configuration) the triangular mel filterbank, an array of shape (nfilt, nfft // 2 + 1).
+    """
+    highfreq = highfreq or rate / 2
+    if highfreq > rate / 2:
+        raise ValueError("highfreq is greater than rate/2")
+
+    mel_points = np.linspace(hz_to_mel(lowfreq), hz_to_mel(highfreq), nfilt + 2)
+    bins = np.floor((nfft + 1) * mel_to_hz(mel_points) / rate)
+
+    fft_bins = np.arange(nfft // 2 + 1)
+    left, center, right = bins[:-2, np.newaxis], bins[1:-1, np.newaxis], bins[2:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rising = np.where((fft_bins >= left) & (fft_bins < center), (fft_bins - left) / (center - left), 0)
+        falling = np.where((fft_bins >= center) & (fft_bins < right), (right - fft_bins) / (right - center), 0)
+
+    filterbank = rising + falling
+    filterbank.setflags(write=False)
+    return filterbank
+
+@lru_cache(maxsize=None)
+def get_cepstral_matrix(nfilt, numcep, ceplifter=22):
+    """
+    Computes (once per configuration) the matrix of shape (nfilt, numcep) that maps log filterbank energies to liftered cepstra:
+    the first numcep rows of the orthonormal DCT-II, scaled by the lifter.
+    """
+    k = np.arange(numcep)[:, np.newaxis]
+    n = np.arange(nfilt)
+    dct_matrix = np.sqrt(2.0 / nfilt) * np.cos(np.pi * k * (2 * n + 1) / (2 * nfilt))
+    dct_matrix[0] /= np.sqrt(2.0)
+
+    if ceplifter > 0:
+        dct_matrix *= (1 + (ceplifter / 2.) * np.sin(np.pi * np.arange(numcep) / ceplifter))[:, np.newaxis]
+
+    cepstral_matrix = np.ascontiguousarray(dct_matrix.T)
+    cepstral_matrix.setflags(write=False)
+    return cepstral_matrix
+
+def pad_signal(signal, frame_len, frame_step, preemph=0.97):
+    """
+    Applies the pre-emphasis filter to a signal and zero-pads it to a whole number of frames (a single new array).
+
+    Returns
+    ----------
+    padded_signal: float64 array
+    nb_frames: number of frames of the signal
+    """
+    signal = np.asarray(signal)
+    nb_frames = count_frames(len(signal), frame_len, frame_step)
+
+    padded_signal = np.zeros((nb_frames - 1) * frame_step + frame_len)
+    if len(signal) > 0:
+        padded_signal[0] = signal[0]
+        np.multiply(signal[:-1], -preemph, out=padded_signal[1:len(signal)])
+        padded_signal[1:len(signal)] += signal[1:]
+    return padded_signal, nb_frames
+
+def frame_signal(padded_signal, frame_len, frame_step, nb_frames):
+    """
+    Frames a padded signal into overlapping frames: a read-only view of shape (nb_frames, frame_len), no sample is copied.
+    """
+    padded_signal = np.ascontiguousarray(padded_signal)
+    stride = padded_signal.strides[0]
+    return as_strided(padded_signal, shape=(nb_frames, frame_len), strides=(frame_step * stride, stride), writeable=False)
+
+def power_spectrum(frames, nfft):
+    """Power spectrum of each frame (real FFT of size nfft), an array of shape (nb_frames, nfft // 2 + 1)."""
+    spectrum = np.fft.rfft(frames, nfft)
+    return (spectrum.real ** 2 + spectrum.imag ** 2) / nfft
+
+def mfcc_from_power_spectrum(power_spectrum_frames, rate, nfft, numcep=13, nfilt=26, lowfreq=0, highfreq=None,
+                             ceplifter=22, append_energy=True):
+    """
+    Computes MFCC frames out of power spectrum frames (see :func:`mfcc`), so a spectrum can be shared with other features.
+    """
+    filterbank = get_mel_filterbank(nfilt, nfft, rate, lowfreq, highfreq)
+    filterbank_energies = power_spectrum_frames @ filterbank.T
+    filterbank_energies[filterbank_energies == 0] = EPS
+
+    cepstra = np.log(filterbank_energies) @ get_cepstral_matrix(nfilt, numcep, ceplifter)
+    if append_energy:
+        # The first cepstral coefficient is replaced by the log of the frame energy
+        energy = power_spectrum_frames.sum(axis=1)
+        energy[energy == 0] = EPS
+        cepstra[:, 0] = np.log(energy)
+    return cepstra
+
+def mfcc(signal, rate=16000, winlen=0.025, winstep=0.01, numcep=13, nfilt=26, nfft=512, lowfreq=0, highfreq=None,
+         preemph=0.97, ceplifter=22, append_energy=True):
+    """
+    Computes the MFCC features of an audio signal. Parameters and results are the same as python_speech_features.mfcc
+    (rectangular window).
+
+    Parameters
+    ----------
+    signal: array of the (mono) signal
+    rate: sample rate of the signal
+    winlen: length of a frame in seconds
+    winstep: step between successive frames in seconds
+    numcep: number of cepstral coefficients
+    nfilt: number of mel filters
+    nfft: size of the FFT
+    lowfreq, highfreq: band edges of the mel filters in Hz (highfreq defaults to rate / 2)
+    preemph: pre-emphasis filter coefficient (0 is no filter)
+    ceplifter: lifter coefficient (0 is no lifter)
+    append_energy: if True, the first cepstral coefficient is replaced with the log of the frame energy
+
+    Returns
+    ----------
+    mfcc_features: array of shape (nb_frames, numcep)
+    """
+    frame_len = round_half_up(winlen * rate)
+    frame_step = round_half_up(winstep * rate)
+
+    padded_signal, nb_frames = pad_signal(signal, frame_len, frame_step, preemph)
+    frames = frame_signal(padded_signal, frame_len, frame_step, nb_frames)
+
+    mfcc_features = np.empty((nb_frames, numcep))
+    for start in range(0, nb_frames, FFT_BATCH_FRAMES):
+        mfcc_features[start:start + FFT_BATCH_FRAMES] = mfcc_from_power_spectrum(
+            power_spectrum(frames[start:start + FFT_BATCH_FRAMES], nfft), rate, nfft, numcep, nfilt,
+            lowfreq, highfreq, ceplifter, append_energy)
+    return mfcc_features
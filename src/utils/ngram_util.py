@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.ngram_util` defines the packed integer encoding of POS tag n-grams and the vectorized
+counting of those n-grams over a whole corpus (sparse document-term matrix).
+
+A tag n-gram is packed in a single integer: every tag code (see UniversalPOS.UNIVERSAL_TAG_CODES) takes
+NGRAM_CODE_BITS bits and a leading marker bit encodes the n-gram order, so that n-grams of different orders
+never collide (e.g. DET-NOUN-VERB -> 0b1_0110_1000_1110).
+"""
+
+import numpy as np
+from scipy import sparse
+
+from utils.nlp_util import UniversalPOS
+
+# CONSTANTS
+NGRAM_CODE_BITS = 4
+NGRAM_CODE_MASK = (1 << NGRAM_CODE_BITS) - 1
+MAX_NGRAM_ORDER = 15
+SENTENCE_BOUNDARY_CODE = -1
+
+assert UniversalPOS.NB_TAG_CODES <= (1 << NGRAM_CODE_BITS), "tag codes don't fit in NGRAM_CODE_BITS bits"
+
+def encode_pos_ngrams(tag_codes, n):
+    """
+    Encodes every n-gram of a tag code sequence as a packed integer. N-grams crossing a sentence boundary
+    (SENTENCE_BOUNDARY_CODE) are dropped.
+
+    Parameters
+    ----------
+    tag_codes: array of tag codes (with SENTENCE_BOUNDARY_CODE between sentences)
+    n: n-gram order (1 to MAX_NGRAM_ORDER)
+
+    Returns
+    ----------
+    ngram_keys: array (int64) of the packed n-grams
+    """
+    if n < 1 or n > MAX_NGRAM_ORDER:
+        raise ValueError("n-gram order must be between 1 and " + str(MAX_NGRAM_ORDER))
+
+    tag_codes = np.asarray(tag_codes, dtype=np.int64)
+    nb_ngrams = len(tag_codes) - n + 1
+    if nb_ngrams <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    ngram_keys = np.ones(nb_ngrams, dtype=np.int64)
+    for i in range(n):
+        ngram_keys = (ngram_keys << NGRAM_CODE_BITS) | (tag_codes[i:i + nb_ngrams] & NGRAM_CODE_MASK)
+
+    # An n-gram is valid if there's no boundary between its first and last tag
+    boundaries = np.concatenate(([0], np.cumsum(tag_codes == SENTENCE_BOUNDARY_CODE)))
+    is_valid = boundaries[n:] == boundaries[:nb_ngrams]
+
+    return ngram_keys[is_valid]
+
+def decode_pos_ngram(ngram_key):
+    """
+    Decodes a packed n-gram into its tags (e.g. "DET-NOUN-VERB"). The non universal tags are named "OTHER".
+    """
+    tags = []
+    ngram_key = int(ngram_key)
+    while ngram_key > 1:
+        code = ngram_key & NGRAM_CODE_MASK
+        tags.append(UniversalPOS.UNIVERSAL_TAGSET[code] if code < UniversalPOS.OTHER_TAG_CODE else "OTHER")
+        ngram_key >>= NGRAM_CODE_BITS
+    return "-".join(reversed(tags))
+
+def ngram_order(ngram_key):
+    """
+    Returns the order (n) of a packed n-gram.
+    """
+    return (int(ngram_key).bit_length() - 1) // NGRAM_CODE_BITS
+
+def count_corpus_ngrams(corpus_ngram_keys, top_k=None):
+    """
+    Counts the packed n-grams of every transcription of a corpus and keeps the top-K most frequent n-grams
+    (over the whole corpus) as the vocabulary.
+
+    Parameters
+    ----------
+    corpus_ngram_keys: list of arrays of packed n-grams (one array per transcription)
+    top_k: size of the vocabulary (None to keep every n-gram, 0 for an empty vocabulary)
+
+    Returns
+    ----------
+    ngram_counts: sparse matrix (CSR) of the n-gram counts (one row per transcription, one column per n-gram of the vocabulary)
+    vocabulary: array of the packed n-grams of each column (most frequent first)
+    """
+    nb_documents = len(corpus_ngram_keys)
+    document_lengths = [len(keys) for keys in corpus_ngram_keys]
+    # Empty vocabulary (no n-gram in the corpus or none kept): empty matrix with one row per transcription
+    if sum(document_lengths) == 0 or (top_k is not None and top_k < 1):
+        return sparse.csr_matrix((nb_documents, 0), dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    all_keys = np.concatenate(corpus_ngram_keys)
+    documents = np.repeat(np.arange(nb_documents), document_lengths)
+
+    # Vocabulary : most frequent n-grams first (ties broken by key for reproducible columns)
+    unique_keys, key_counts = np.unique(all_keys, return_counts=True)
+    order = np.lexsort((unique_keys, -key_counts))
+    vocabulary = unique_keys[order[:top_k]]
+
+    # Column of each n-gram in the vocabulary
+    sorted_vocabulary_idx = np.argsort(vocabulary)
+    sorted_vocabulary = vocabulary[sorted_vocabulary_idx]
+    positions = np.minimum(np.searchsorted(sorted_vocabulary, all_keys), len(vocabulary) - 1)
+    in_vocabulary = sorted_vocabulary[positions] == all_keys
+    columns = sorted_vocabulary_idx[positions[in_vocabulary]]
+
+    ngram_counts = sparse.coo_matrix((np.ones(len(columns), dtype=np.int64), (documents[in_vocabulary], columns)),
+                                     shape=(nb_documents, len(vocabulary))).tocsr()
+    ngram_counts.sum_duplicates()
+
+    return ngram_counts, vocabulary
@@ -15,6 +15,8 @@ used classes for NLP applications.
 
 # -*- coding: utf-8 -*-
 
+import numpy as np
+
 class UniversalPOS:
     # POS Universal tags
     ADJ_TAG = "ADJ"
@@ -33,6 +35,10 @@ class UniversalPOS:
     SCONJ_TAG = "SCONJ"
     VERB_TAG = "VERB"
     UNIVERSAL_TAGSET = [ADJ_TAG, ADP_TAG, ADV_TAG, AUX_TAG, CONJ_TAG, CCONJ_TAG, DET_TAG, INTJ_TAG, NOUN_TAG, NUM_TAG, PART_TAG, PRON_TAG, PUNCT_TAG, SCONJ_TAG, VERB_TAG]
+    # Integer codes of the universal tags (index in UNIVERSAL_TAGSET). Any other tag is coded as OTHER_TAG_CODE.
+    UNIVERSAL_TAG_CODES = {tag: code for code, tag in enumerate(UNIVERSAL_TAGSET)}
+    OTHER_TAG_CODE = len(UNIVERSAL_TAGSET)
+    NB_TAG_CODES = OTHER_TAG_CODE + 1
 
     def __init__(self, universal_map_file):
         self.universal_map = {}
@@ -52,6 +58,25 @@ class UniversalPOS:
         else:
             return
 
+def encode_universal_tags(pos_tags, boundary_code=None):
+    """
+    Encodes a list of POS tags as an array of small integer codes (see UniversalPOS.UNIVERSAL_TAG_CODES).
+    Tags with an empty tag are skipped. Sentence separators (anything that is not a Tag) are skipped too,
+    unless a boundary_code is given, in which case they are encoded with it.
+    """
+    tag_codes = UniversalPOS.UNIVERSAL_TAG_CODES
+    other_code = UniversalPOS.OTHER_TAG_CODE
+    codes = []
+
+    for pos_tag in pos_tags:
+        if type(pos_tag) is Tag:
+            if pos_tag.tag:
+                codes.append(tag_codes.get(pos_tag.tag, other_code))
+        elif boundary_code is not None:
+            codes.append(boundary_code)
+
+    return np.array(codes, dtype=np.int8)
+
 class Tag:
     """
     A tag object will be composed of four elements:
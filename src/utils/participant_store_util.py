@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.participant_store_util` implements an encrypted store of participants' information (age, gender and
+mental test score): a single sqlite file indexed by (status, idParticipant, interviewNumber) whose values are
+Fernet tokens. Participants are upserted in bulk and the information of many participants is decrypted in one call,
+as a DataFrame that can be joined with the extracted measures.
+"""
+
+import json
+import os
+import sqlite3
+
+import pandas as pd
+from cryptography.fernet import Fernet
+
+# CONSTANTS
+PARTICIPANT_KEYS = ["status", "idParticipant", "interviewNumber"]
+PARTICIPANT_INFO = ["age", "gender", "mentalTest"]
+
+class ParticipantStore:
+    """
+    A participant store saves the encrypted information of every transcript's participant under the key
+    (status, idParticipant, interviewNumber) (see :func:`utils.corpus_util.extract_participant_info`).
+    The modification time of the transcript the information comes from is kept to process only modified transcripts.
+
+    Example:
+        with ParticipantStore("out/PseudonymisedInfo/participants.sqlite", key) as store:
+            store.upsert_many([(("AD", "101", "1"), {"age": "57", "gender": "male", "mentalTest": "18"}, mtime)])
+            df_participants = store.load_participants([("AD", "101", "1")])
+    """
+    def __init__(self, store_path, key):
+        """Opens (or creates) the store, key is the Fernet key used to encrypt the information."""
+        dirname = os.path.dirname(store_path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+
+        self.fernet = Fernet(key)
+        self.connection = sqlite3.connect(store_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS participants (status TEXT NOT NULL, "
+                                "idParticipant TEXT NOT NULL, interviewNumber TEXT NOT NULL, info BLOB NOT NULL, "
+                                "source_mtime REAL, PRIMARY KEY (status, idParticipant, interviewNumber))")
+        self.connection.commit()
+
+    def upsert_many(self, records):
+        """
+        Inserts or replaces participants' information in one transaction.
+
+        Parameters
+        ----------
+        records: iterable of (participant key (status, idParticipant, interviewNumber), information dictionary,
+                 modification time of the transcript (or None))
+        """
+        rows = ((*normalize_participant_key(key), self.fernet.encrypt(json.dumps(info).encode()), source_mtime)
+                for key, info, source_mtime in records)
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO participants "
+                                        "(status, idParticipant, interviewNumber, info, source_mtime) "
+                                        "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def source_mtimes(self):
+        """Returns the modification time of the transcript of every stored participant key."""
+        rows = self.connection.execute("SELECT status, idParticipant, interviewNumber, source_mtime FROM participants")
+        return {(status, id_participant, interview_number): source_mtime
+                for status, id_participant, interview_number, source_mtime in rows}
+
+    def load_participants(self, keys=None):
+        """
+        Decrypts the information of the given participants (all of them if keys is None) in one call.
+        Participants that aren't in the store are left out.
+
+        Returns
+        ----------
+        df_participants: DataFrame with the columns status, idParticipant, interviewNumber, age, gender and mentalTest
+        """
+        query = "SELECT p.status, p.idParticipant, p.interviewNumber, p.info FROM participants p"
+        if keys is not None:
+            # The keys are joined with the primary key index (through a temporary table)
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS requested_keys (status TEXT, idParticipant TEXT, "
+                                    "interviewNumber TEXT)")
+            self.connection.execute("DELETE FROM requested_keys")
+            self.connection.executemany("INSERT INTO requested_keys VALUES (?, ?, ?)",
+                                        set(normalize_participant_key(key) for key in keys))
+            query += " JOIN requested_keys k USING (status, idParticipant, interviewNumber)"
+
+        rows = []
+        for status, id_participant, interview_number, info in self.connection.execute(query):
+            participant_info = json.loads(self.fernet.decrypt(bytes(info)))
+            rows.append([status, id_participant, interview_number]
+                        + [participant_info.get(column) for column in PARTICIPANT_INFO])
+        return pd.DataFrame(rows, columns=PARTICIPANT_KEYS + PARTICIPANT_INFO)
+
+    def join_participants(self, df_measures):
+        """
+        Joins the participants' information to a measures DataFrame (with the columns status, idParticipant and
+        interviewNumber). Only the participants of the measures are decrypted.
+        """
+        df_keys = df_measures[PARTICIPANT_KEYS].astype(str)
+        df_participants = self.load_participants(df_keys.itertuples(index=False, name=None))
+        df_joined = df_keys.merge(df_participants, how="left", on=PARTICIPANT_KEYS)
+        df_joined.index = df_measures.index
+        return pd.concat([df_measures, df_joined[PARTICIPANT_INFO]], axis=1)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def normalize_participant_key(key):
+    """Participant keys are stored as strings (e.g. ("AD", 101, 1) ==> ("AD", "101", "1"))."""
+    status, id_participant, interview_number = key
+    return (str(status), str(id_participant), str(interview_number))
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.phonetic_util` computes frame-level phonetic features of an audio signal fed block by block.
+The signal is framed into blocks of frames (spectral chunks) and the power spectrum of a chunk is computed once and shared
+by every registered feature (MFCCs, deltas, spectral centroid, spectral flux, ...). Frame values are streamed into
+moment accumulators, so memory is bounded by the number of frames computed at a time. An optional energy-based
+voice activity detector drops non-speech frames before any spectrum is computed and an optional pause detector
+measures silent intervals in the same pass.
+Blocks of frames overlap so that every frame is exactly the frame the whole-signal computation would give:
+the pre-emphasis filter carries the last sample of the previous block and the last frame is zero-padded the same way.
+"""
+
+import numpy as np
+
+from utils.audio_util import get_full_scale
+from utils.mfcc_util import (EPS, count_frames, frame_signal, mfcc_from_power_spectrum, power_spectrum,
+                             round_half_up)
+from utils.stats_util import MomentAccumulator
+
+# CONSTANTS
+# Number of frames computed at a time
+DEFAULT_FRAMES_PER_BLOCK = 4096
+# Number of frames before and after a frame used to compute its delta
+DELTA_WIDTH = 2
+# Voice activity detection thresholds (frame energy in dBFS): speech starts above VAD_ON_DB and stops below VAD_OFF_DB
+VAD_ON_DB = -40
+VAD_OFF_DB = -45
+# Pause detection: frames below PAUSE_DB (dBFS) are silent, pauses are categorized by duration in seconds
+# (same categories as the transcribed pauses counted by the normalizer: (.), (..), (...) and longer ones)
+PAUSE_DB = -45
+PAUSE_CATEGORIES = ["Short", "Medium", "Long", "Other"]
+PAUSE_DURATION_EDGES = [0.25, 0.5, 1, 2]
+
+class SpectralChunk:
+    """
+    A spectral chunk is a block of consecutive frames of the signal, raw and pre-emphasized. Its power spectrum and
+    MFCCs are computed on first use only, so they are computed once whatever the number of features using them.
+    """
+    def __init__(self, raw_frames, frames, frame_stream):
+        """Initializes the data."""
+        self.raw_frames = raw_frames
+        self.frames = frames
+        self.frame_stream = frame_stream
+        self._power_spectrum = None
+        self._mfcc = None
+        self._energy_db = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def select(self, mask):
+        """Returns the chunk of the selected frames (boolean mask), spectra are computed only for those frames."""
+        return SpectralChunk(self.raw_frames[mask], self.frames[mask], self.frame_stream)
+
+    @property
+    def power_spectrum(self):
+        if self._power_spectrum is None:
+            self._power_spectrum = power_spectrum(self.frames, self.frame_stream.nfft)
+        return self._power_spectrum
+
+    @property
+    def energy_db(self):
+        """Mean energy of each raw frame in dBFS."""
+        if self._energy_db is None:
+            energy = np.einsum('ij,ij->i', self.raw_frames, self.raw_frames)
+            energy /= self.raw_frames.shape[1] * self.frame_stream.full_scale ** 2
+            self._energy_db = 10 * np.log10(np.maximum(energy, EPS))
+        return self._energy_db
+
+    @property
+    def mfcc(self):
+        if self._mfcc is None:
+            stream = self.frame_stream
+            self._mfcc = mfcc_from_power_spectrum(self.power_spectrum, stream.rate, stream.nfft, stream.numcep,
+                                                  **stream.mfcc_params)
+        return self._mfcc
+
+class FrameStream:
+    """
+    A frame stream splits a signal given block by block into spectral chunks of (at most) frames_per_block frames.
+    Parameters are the same as :func:`utils.mfcc_util.mfcc`.
+
+    Example:
+        stream = FrameStream(rate, winlen=0.025, nfft=1200)
+        for block in blocks:
+            for chunk in stream.feed(block):
+                ...
+        for chunk in stream.flush():
+            ...
+    """
+    def __init__(self, rate, frames_per_block=DEFAULT_FRAMES_PER_BLOCK, winlen=0.025, winstep=0.01, numcep=13,
+                 nfft=512, preemph=0.97, **mfcc_params):
+        """Initializes the data."""
+        self.rate = rate
+        self.frames_per_block = frames_per_block
+        self.numcep = numcep
+        self.nfft = nfft
+        self.preemph = preemph
+        self.mfcc_params = mfcc_params
+
+        self.frame_len = round_half_up(winlen * rate)
+        self.frame_step = round_half_up(winstep * rate)
+        # Number of samples needed to compute frames_per_block frames
+        self.block_span = (frames_per_block - 1) * self.frame_step + self.frame_len
+
+        self.raw_buffer = np.zeros(0)
+        self.buffer = np.zeros(0)
+        self.previous_sample = None
+        self.full_scale = None
+        self.nb_samples = 0
+        self.nb_frames = 0
+
+    def feed(self, samples):
+        """
+        Adds samples to the stream and yields the spectral chunks (of frames_per_block frames) that can be computed.
+        """
+        if self.full_scale is None:
+            self.full_scale = get_full_scale(np.asarray(samples).dtype)
+        samples = np.asarray(samples, dtype=np.float64)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        if len(samples) == 0:
+            return
+
+        # Pre-emphasis filter, continued from the previous block
+        emphasized = np.empty(len(samples))
+        emphasized[1:] = samples[1:] - self.preemph * samples[:-1]
+        emphasized[0] = samples[0] if self.previous_sample is None else samples[0] - self.preemph * self.previous_sample
+        self.previous_sample = samples[-1]
+        self.nb_samples += len(samples)
+
+        self.raw_buffer = np.concatenate((self.raw_buffer, samples))
+        self.buffer = np.concatenate((self.buffer, emphasized))
+        while len(self.buffer) >= self.block_span:
+            yield self._create_chunk(self.raw_buffer[:self.block_span], self.buffer[:self.block_span], self.frames_per_block)
+            self.nb_frames += self.frames_per_block
+            self.raw_buffer = self.raw_buffer[self.frames_per_block * self.frame_step:]
+            self.buffer = self.buffer[self.frames_per_block * self.frame_step:]
+
+    def flush(self):
+        """
+        Yields the last spectral chunk (the last frame is zero-padded).
+        """
+        if self.nb_samples == 0:
+            return
+
+        remaining_frames = count_frames(self.nb_samples, self.frame_len, self.frame_step) - self.nb_frames
+        if remaining_frames > 0:
+            padded_length = (remaining_frames - 1) * self.frame_step + self.frame_len
+            padding = np.zeros(max(padded_length - len(self.buffer), 0))
+            yield self._create_chunk(np.concatenate((self.raw_buffer, padding)), np.concatenate((self.buffer, padding)),
+                                     remaining_frames)
+            self.nb_frames += remaining_frames
+        self.raw_buffer = np.zeros(0)
+        self.buffer = np.zeros(0)
+
+    def _create_chunk(self, raw_samples, emphasized_samples, nb_frames):
+        return SpectralChunk(frame_signal(raw_samples, self.frame_len, self.frame_step, nb_frames),
+                             frame_signal(emphasized_samples, self.frame_len, self.frame_step, nb_frames), self)
+
+class PhoneticFeature:
+    """
+    A phonetic feature computes values (rows of `dimension` values, one row per frame) out of spectral chunks.
+    Features that need context from neighbouring frames (e.g. deltas) may return rows later than their frames,
+    the rows that are left are returned by `flush()`.
+    Cepstral features have one value per cepstral coefficient (numcep), others have one value per frame.
+    """
+    name = None
+    is_cepstral = False
+    dimension = 1
+
+    def __init__(self, frame_stream):
+        """Initializes the data."""
+        self.frame_stream = frame_stream
+
+    def update(self, chunk):
+        """Returns the rows of the frames of a chunk."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Returns the rows left once every chunk was given."""
+        return np.zeros((0, self.dimension))
+
+class MfccFeature(PhoneticFeature):
+    name = "mfcc"
+    is_cepstral = True
+
+    def __init__(self, frame_stream):
+        super().__init__(frame_stream)
+        self.dimension = frame_stream.numcep
+
+    def update(self, chunk):
+        return chunk.mfcc
+
+class DeltaFeature(PhoneticFeature):
+    """
+    Deltas of MFCCs (order 1) or deltas of deltas (order 2), same results as python_speech_features.delta with N=2:
+    a frame needs the DELTA_WIDTH next frames, so the last frames of a chunk are kept until the next chunk (or flush).
+    """
+    name = "delta"
+    is_cepstral = True
+    order = 1
+
+    def __init__(self, frame_stream):
+        super().__init__(frame_stream)
+        self.dimension = frame_stream.numcep
+        self.delta_streams = [DeltaStream(self.dimension) for _ in range(self.order)]
+
+    def update(self, chunk):
+        rows = chunk.mfcc
+        for delta_stream in self.delta_streams:
+            rows = delta_stream.feed(rows)
+        return rows
+
+    def flush(self):
+        rows = np.zeros((0, self.dimension))
+        for delta_stream in self.delta_streams:
+            rows = np.concatenate((delta_stream.feed(rows), delta_stream.flush()))
+        return rows
+
+class DeltaDeltaFeature(DeltaFeature):
+    name = "delta_delta"
+    order = 2
+
+class SpectralCentroidFeature(PhoneticFeature):
+    """Power-weighted mean frequency (Hz) of each frame (0 for frames without energy)."""
+    name = "spectral_centroid"
+
+    def __init__(self, frame_stream):
+        super().__init__(frame_stream)
+        self.frequencies = np.fft.rfftfreq(frame_stream.nfft, 1.0 / frame_stream.rate)
+
+    def update(self, chunk):
+        total_power = chunk.power_spectrum.sum(axis=1)
+        weighted_power = chunk.power_spectrum @ self.frequencies
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total_power > 0, weighted_power / total_power, 0)[:, np.newaxis]
+
+class SpectralFluxFeature(PhoneticFeature):
+    """Euclidean distance between the magnitude spectra of each frame and the previous one (0 for the first frame)."""
+    name = "spectral_flux"
+
+    def __init__(self, frame_stream):
+        super().__init__(frame_stream)
+        self.previous_magnitude = None
+
+    def update(self, chunk):
+        magnitude = np.sqrt(chunk.power_spectrum)
+        previous_magnitude = magnitude[:1] if self.previous_magnitude is None else self.previous_magnitude
+        self.previous_magnitude = magnitude[-1:]
+
+        differences = np.diff(magnitude, axis=0, prepend=previous_magnitude)
+        return np.sqrt(np.einsum('ij,ij->i', differences, differences))[:, np.newaxis]
+
+class EnergyFeature(PhoneticFeature):
+    """Log energy of each raw frame."""
+    name = "energy"
+
+    def update(self, chunk):
+        energy = np.einsum('ij,ij->i', chunk.raw_frames, chunk.raw_frames)
+        return np.log(np.maximum(energy, EPS))[:, np.newaxis]
+
+class ZeroCrossingRateFeature(PhoneticFeature):
+    """Rate of sign changes between consecutive samples of each raw frame."""
+    name = "zcr"
+
+    def update(self, chunk):
+        sign_changes = np.count_nonzero(np.diff(np.signbit(chunk.raw_frames), axis=1), axis=1)
+        return (sign_changes / max(chunk.raw_frames.shape[1] - 1, 1))[:, np.newaxis]
+
+# Registered phonetic features, in the order of the measures columns
+PHONETIC_FEATURE_SETS = {feature.name: feature for feature in (MfccFeature, DeltaFeature, DeltaDeltaFeature,
+                                                               SpectralCentroidFeature, SpectralFluxFeature,
+                                                               EnergyFeature, ZeroCrossingRateFeature)}
+
+class DeltaStream:
+    """
+    A delta stream computes deltas of rows given block by block, vectorized over the rows of a block. The sequence is
+    padded with its first and last rows (python_speech_features.delta), the DELTA_WIDTH last rows are kept until more rows are given.
+    """
+    def __init__(self, dimension, width=DELTA_WIDTH):
+        """Initializes the data."""
+        self.dimension = dimension
+        self.width = width
+        self.denominator = 2 * sum(i ** 2 for i in range(1, width + 1))
+        self.buffer = None
+
+    def feed(self, rows):
+        """Adds rows and returns the deltas that can be computed."""
+        if len(rows) == 0:
+            return rows
+        if self.buffer is None:
+            self.buffer = np.concatenate((np.repeat(rows[:1], self.width, axis=0), rows))
+        else:
+            self.buffer = np.concatenate((self.buffer, rows))
+        return self._compute_deltas()
+
+    def flush(self):
+        """Returns the last deltas (the sequence is padded with its last row)."""
+        if self.buffer is None:
+            return np.zeros((0, self.dimension))
+        self.buffer = np.concatenate((self.buffer, np.repeat(self.buffer[-1:], self.width, axis=0)))
+        deltas = self._compute_deltas()
+        self.buffer = None
+        return deltas
+
+    def _compute_deltas(self):
+        nb_deltas = len(self.buffer) - 2 * self.width
+        if nb_deltas <= 0:
+            return np.zeros((0, self.dimension))
+
+        deltas = np.zeros((nb_deltas, self.dimension))
+        for n in range(1, self.width + 1):
+            deltas += n * (self.buffer[self.width + n:self.width + n + nb_deltas] - self.buffer[self.width - n:self.width - n + nb_deltas])
+        self.buffer = self.buffer[nb_deltas:]
+        return deltas / self.denominator
+
+class VoiceActivityDetector:
+    """
+    A voice activity detector labels frames as speech or non-speech out of their energy (dBFS, computed on raw frames),
+    with hysteresis: speech starts when the energy goes above on_db and stops when it goes below off_db, frames in between
+    keep the previous label. The label is carried from one chunk to the next. It also counts voiced frames and segments.
+    """
+    def __init__(self, on_db=VAD_ON_DB, off_db=VAD_OFF_DB):
+        """Initializes the data."""
+        if off_db > on_db:
+            raise ValueError("VAD off threshold must not be greater than the on threshold")
+        self.on_db = on_db
+        self.off_db = off_db
+        self.is_speech = False
+        self.nb_frames = 0
+        self.nb_voiced_frames = 0
+        self.nb_segments = 0
+
+    def detect(self, chunk):
+        """Returns the speech mask (boolean array) of the frames of a chunk."""
+        energy_db = chunk.energy_db
+
+        # +1 above on_db, -1 below off_db, 0 in between (keeps the last decision)
+        decisions = (energy_db > self.on_db).astype(np.int8) - (energy_db < self.off_db).astype(np.int8)
+        last_decisions = np.maximum.accumulate(np.where(decisions != 0, np.arange(len(decisions)), -1))
+        mask = np.where(last_decisions >= 0, decisions[np.maximum(last_decisions, 0)] > 0, self.is_speech)
+
+        if len(mask) > 0:
+            self.nb_segments += int(mask[0] and not self.is_speech) + np.count_nonzero(mask[1:] & ~mask[:-1])
+            self.is_speech = bool(mask[-1])
+        self.nb_frames += len(mask)
+        self.nb_voiced_frames += np.count_nonzero(mask)
+        return mask
+
+    def statistics(self, frame_duration):
+        """
+        Returns
+        ----------
+        voiced_statistics: voiced duration (s), voiced ratio, number of voiced segments and mean voiced segment duration (s)
+        """
+        voiced_duration = self.nb_voiced_frames * frame_duration
+        voiced_ratio = self.nb_voiced_frames / self.nb_frames if self.nb_frames > 0 else 0
+        mean_segment_duration = voiced_duration / self.nb_segments if self.nb_segments > 0 else 0
+        return np.array([voiced_duration, voiced_ratio, self.nb_segments, mean_segment_duration])
+
+    def merge(self, other):
+        """Merges the counts of another detector (e.g. of another utterance) into this one."""
+        self.nb_frames += other.nb_frames
+        self.nb_voiced_frames += other.nb_voiced_frames
+        self.nb_segments += other.nb_segments
+        return self
+
+class PauseDetector:
+    """
+    A pause detector finds pauses, runs of silent frames (energy below silence_db) between speech frames, in chunks given
+    one after the other (a pause can span several chunks). Silences at the start and the end of the signal aren't pauses.
+    Pauses are counted, and their durations summed, per category of PAUSE_CATEGORIES (pauses shorter than the first
+    edge of PAUSE_DURATION_EDGES are ignored).
+    """
+    def __init__(self, silence_db=PAUSE_DB):
+        """Initializes the data."""
+        self.silence_db = silence_db
+        self.has_speech = False
+        self.silent_frames = 0
+        self.pause_lengths = []
+
+    def update(self, chunk):
+        """Finds the pauses that end in a chunk."""
+        speech_frames = np.flatnonzero(chunk.energy_db >= self.silence_db)
+        if len(speech_frames) == 0:
+            self.silent_frames += len(chunk)
+            return
+
+        # Silent frames before the first speech frame continue the current silence
+        if self.has_speech and self.silent_frames + speech_frames[0] > 0:
+            self.pause_lengths.append(np.array([self.silent_frames + speech_frames[0]]))
+        gaps = np.diff(speech_frames) - 1
+        self.pause_lengths.append(gaps[gaps > 0])
+
+        self.has_speech = True
+        self.silent_frames = len(chunk) - 1 - speech_frames[-1]
+
+    def statistics(self, frame_duration):
+        """
+        Returns
+        ----------
+        pause_statistics: total number of pauses, number of pauses per category, total duration (s) of the pauses
+        per category and mean pause duration (s)
+        """
+        durations = np.concatenate(self.pause_lengths + [np.zeros(0)]) * frame_duration
+        durations = durations[durations >= PAUSE_DURATION_EDGES[0]]
+        categories = np.searchsorted(PAUSE_DURATION_EDGES, durations, side='right') - 1
+
+        nb_pauses = np.bincount(categories, minlength=len(PAUSE_CATEGORIES))
+        pause_durations = np.bincount(categories, weights=durations, minlength=len(PAUSE_CATEGORIES))
+        mean_duration = durations.mean() if len(durations) > 0 else 0
+        return np.concatenate([[len(durations)], nb_pauses, pause_durations, [mean_duration]])
+
+    def merge(self, other):
+        """Merges the pauses of another detector (e.g. of another utterance) into this one."""
+        self.pause_lengths.extend(other.pause_lengths)
+        return self
+
+class PhoneticFeatureExtractor:
+    """
+    A phonetic feature extractor streams the frames of a signal (given block by block) into the registered features
+    and accumulates their statistics (mean, kurtosis, skewness and variance of every dimension).
+    With a voice activity detector, non-speech frames are dropped before features are computed (deltas and spectral flux
+    are then computed over the sequence of speech frames).
+
+    Example:
+        extractor = PhoneticFeatureExtractor(rate, ["mfcc", "delta"], winlen=0.025, nfft=1200)
+        for block in blocks:
+            extractor.feed(block)
+        statistics = extractor.statistics()
+    """
+    def __init__(self, rate, feature_names, frames_per_block=DEFAULT_FRAMES_PER_BLOCK, vad=None, pause_detector=None,
+                 **stream_params):
+        """
+        Initializes the data (vad: optional VoiceActivityDetector, only the frames it detects as speech are used,
+        pause_detector: optional PauseDetector, it sees every frame).
+        """
+        self.frame_stream = FrameStream(rate, frames_per_block=frames_per_block, **stream_params)
+        self.vad = vad
+        self.pause_detector = pause_detector
+        self.features = [PHONETIC_FEATURE_SETS[feature_name](self.frame_stream) for feature_name in feature_names]
+        self.accumulators = [MomentAccumulator(feature.dimension) for feature in self.features]
+        self.is_flushed = False
+
+    def feed(self, samples):
+        """Adds samples of the signal."""
+        for chunk in self.frame_stream.feed(samples):
+            self._update(chunk)
+
+    def flush(self):
+        """Processes the last frames of the signal (done once, by `statistics()` if it wasn't called)."""
+        if self.is_flushed:
+            return
+        for chunk in self.frame_stream.flush():
+            self._update(chunk)
+        for feature, accumulator in zip(self.features, self.accumulators):
+            accumulator.update(feature.flush())
+        self.is_flushed = True
+
+    def merge(self, other):
+        """
+        Merges the statistics of another extractor (same features and detectors, e.g. of another utterance of the signal)
+        into this one. Both extractors are flushed: frames of different extractors are never contiguous.
+        """
+        self.flush()
+        other.flush()
+        for accumulator, other_accumulator in zip(self.accumulators, other.accumulators):
+            accumulator.merge(other_accumulator)
+        if self.vad is not None:
+            self.vad.merge(other.vad)
+        if self.pause_detector is not None:
+            self.pause_detector.merge(other.pause_detector)
+        return self
+
+    def _update(self, chunk):
+        if self.pause_detector is not None:
+            self.pause_detector.update(chunk)
+        if self.vad is not None:
+            chunk = chunk.select(self.vad.detect(chunk))
+            if len(chunk) == 0:
+                return
+        for feature, accumulator in zip(self.features, self.accumulators):
+            accumulator.update(feature.update(chunk))
+
+    def statistics(self):
+        """
+        Returns
+        ----------
+        statistics: for every feature (in the order of the features), its mean, kurtosis, skewness and variance arrays
+        """
+        self.flush()
+        statistics = []
+        for accumulator in self.accumulators:
+            statistics += [accumulator.mean(), accumulator.kurtosis(), accumulator.skewness(), accumulator.variance()]
+        return statistics
+
+    def voiced_statistics(self):
+        """Returns the voice activity statistics (see :meth:`VoiceActivityDetector.statistics`), frames last frame_step samples."""
+        self.flush()
+        return self.vad.statistics(self.frame_stream.frame_step / self.frame_stream.rate)
+
+    def pause_statistics(self):
+        """Returns the pause statistics (see :meth:`PauseDetector.statistics`), frames last frame_step samples."""
+        self.flush()
+        return self.pause_detector.statistics(self.frame_stream.frame_step / self.frame_stream.rate)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.pipeline_util` implements the incremental rebuild of the pipeline stages (make-style): every artifact
+of a stage (a transcript's cleaned dialog, tagged dialog, adjusted dialog or measures row) is stored under a key
+derived from the hashes of its inputs, of the stage's configuration and of the stage's code. The hash of an artifact's
+content is an input of the downstream artifacts, so only the artifacts of modified transcripts (or of a modified
+configuration or code) are recomputed, and only downstream of the first artifact that actually changed.
+It also implements the stages of the streaming execution: transcripts flow from one stage to the next thru bounded
+queues, every stage having its own workers.
+"""
+
+import hashlib
+import inspect
+import json
+import queue
+import sys
+import threading
+from collections import Counter
+
+from utils.cache_util import hash_file, make_cache_key
+
+# Item put in a queue once every item has been put (end of the stream)
+END_OF_STREAM = None
+
+def hash_sources(*modules):
+    """
+    Returns the code version of a stage: the sha256 hash (hexadecimal) of the source files of its modules.
+    Any modification of those files invalidates the artifacts of the stage.
+    """
+    sources_hash = hashlib.sha256()
+    for module in modules:
+        with open(inspect.getsourcefile(module), "rb") as source_file:
+            sources_hash.update(source_file.read())
+    return sources_hash.hexdigest()
+
+def get_utils_modules(*modules):
+    """
+    Returns the given modules and every module of the utils package they use, directly or thru other utils modules
+    (modules and functions or classes imported from them), in name order after the given modules.
+    """
+    utils_modules = {}
+    pending_modules = list(modules)
+    while pending_modules:
+        module = pending_modules.pop()
+        for value in vars(module).values():
+            module_name = value.__name__ if inspect.ismodule(value) else getattr(value, "__module__", None)
+            if (isinstance(module_name, str) and module_name.startswith("utils.") and module_name not in utils_modules
+                    and module_name in sys.modules):
+                utils_modules[module_name] = sys.modules[module_name]
+                pending_modules.append(sys.modules[module_name])
+    return list(modules) + [utils_modules[module_name] for module_name in sorted(utils_modules)
+                            if utils_modules[module_name] not in modules]
+
+def hash_config_files(*file_paths):
+    """Returns the hashes of configuration files (None for a missing optional file)."""
+    return [hash_file(file_path) if file_path else None for file_path in file_paths]
+
+def hash_text(text):
+    """Returns the sha256 hash (hexadecimal) of a text (e.g. an artifact's content)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ArtifactStore:
+    """
+    An artifact store keeps the artifacts (JSON serializable values) of the pipeline stages in a blob cache
+    (see :class:`utils.cache_util.BlobCache`). An artifact records the hashes of its inputs, the configuration and the
+    code version of its stage, and the hash of its content (the input hash of the downstream artifacts).
+    Without a cache, every artifact is computed (the values are the same in both cases: they always go thru JSON).
+
+    Example:
+        value, value_hash = store.get_or_compute("tag", [dialog_hash], {"language": "en"}, code_version,
+                                                 lambda: tag(dialog))
+    """
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.nb_computed = Counter()
+        self.nb_reused = Counter()
+
+    def get_or_compute(self, stage, input_hashes, config, code_version, compute):
+        """
+        Returns the artifact (value, content hash) of the given inputs, computed (and stored) if it isn't stored yet.
+
+        Parameters
+        ----------
+        stage: name of the stage
+        input_hashes: hashes of the inputs of the artifact (e.g. transcript's hash, upstream artifacts' hashes)
+        config: JSON serializable configuration of the stage
+        code_version: code version of the stage (see hash_sources)
+        compute: function computing the value of the artifact
+        """
+        return self.get_or_compute_many(stage, [input_hashes], config, code_version,
+                                        lambda missing: [compute() for _ in missing])[0]
+
+    def get_or_compute_many(self, stage, inputs_hashes, config, code_version, compute_many):
+        """
+        Returns the artifacts (value, content hash) of many inputs. The missing ones are computed in one call
+        (e.g. one spaCy batch for every transcript to tag).
+
+        Parameters
+        ----------
+        inputs_hashes: list of the input hashes of every artifact
+        compute_many: function computing the values of the missing artifacts, given their indexes (in order)
+        """
+        keys = [make_cache_key(stage, input_hashes, config, code_version) for input_hashes in inputs_hashes]
+
+        artifacts = [self._get(key) for key in keys]
+        missing = [index for index, artifact in enumerate(artifacts) if artifact is None]
+        self.nb_reused[stage] += len(artifacts) - len(missing)
+        self.nb_computed[stage] += len(missing)
+
+        for index, value in zip(missing, compute_many(missing) if missing else []):
+            content = json.dumps(value)
+            artifact = {"stage": stage, "inputs": inputs_hashes[index], "config": config, "code_version": code_version,
+                        "hash": hash_text(content), "value": json.loads(content)}
+            if self.cache is not None:
+                self.cache.put(keys[index], json.dumps(artifact).encode("utf-8"))
+            artifacts[index] = artifact
+
+        return [(artifact["value"], artifact["hash"]) for artifact in artifacts]
+
+    def _get(self, key):
+        if self.cache is None:
+            return None
+        artifact = self.cache.get(key)
+        return json.loads(artifact) if artifact is not None else None
+
+    def merge(self, other):
+        """Adds the counts of artifacts computed and reused by another store (e.g. of another worker)."""
+        self.nb_computed.update(other.nb_computed)
+        self.nb_reused.update(other.nb_reused)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+    def print_summary(self):
+        print("")
+        print("INCREMENTAL REBUILD (artifacts computed / reused)")
+        print("------------------------")
+        for stage in self.nb_computed:
+            print(stage, self.nb_computed[stage], "/", self.nb_reused[stage])
+
+class StreamingStage:
+    """
+    A streaming stage runs workers (threads) that take items from an input queue, process them and put the results in
+    an output queue. Queues are bounded: a worker blocks when the next stage's queue is full (backpressure), so the
+    number of items in memory doesn't depend on the corpus size. Once every worker is done (END_OF_STREAM received),
+    END_OF_STREAM is put in the output queue. Errors are kept (the item is dropped) and raised by join().
+
+    Example:
+        stage = StreamingStage(normalize, files_queue, normalized_queue, nb_workers=2).start()
+        ...
+        stage.join()
+    """
+    def __init__(self, process, input_queue, output_queue, nb_workers=1, batch_size=None, setup=None, teardown=None):
+        """
+        process: function processing an item (or a list of items if batch_size is given, returning a list of results)
+                 with the state of the worker as first argument
+        batch_size: maximum number of items processed together (items already in the queue), None for one at a time
+        setup: function creating the state of a worker (e.g. a cache connection), in the worker's thread
+        teardown: function releasing the state of a worker, in the worker's thread (the states are kept in self.states)
+        """
+        self.process = process
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.batch_size = batch_size
+        self.setup = setup
+        self.teardown = teardown
+        self.states = []
+        self.errors = []
+        self.nb_running = max(nb_workers, 1)
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.nb_running)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def join(self):
+        """Waits for every worker and raises the first error of the stage."""
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def _run(self):
+        state, is_failed = None, False
+        try:
+            state = self.setup() if self.setup is not None else None
+        except Exception as e:
+            # The worker still takes its items (dropped) so the stream ends
+            is_failed = True
+            with self.lock:
+                self.errors.append(e)
+        with self.lock:
+            self.states.append(state)
+
+        is_end = False
+        while not is_end:
+            items, is_end = self._take_items()
+            if not items or is_failed:
+                continue
+            try:
+                if self.batch_size is None:
+                    results = [self.process(state, items[0])]
+                else:
+                    results = self.process(state, items)
+            except Exception as e:
+                with self.lock:
+                    self.errors.append(e)
+                continue
+            for result in results:
+                self.output_queue.put(result)
+
+        if self.teardown is not None and not is_failed:
+            self.teardown(state)
+
+        with self.lock:
+            self.nb_running -= 1
+            is_last = self.nb_running == 0
+        if is_last:
+            self.output_queue.put(END_OF_STREAM)
+
+    def _take_items(self):
+        """Takes the next item (waits for it) or, with a batch size, the next items already in the queue."""
+        items = []
+        max_items = self.batch_size or 1
+        while len(items) < max_items:
+            try:
+                item = self.input_queue.get() if not items else self.input_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is END_OF_STREAM:
+                # For the other workers of the stage
+                self.input_queue.put(END_OF_STREAM)
+                return items, True
+            items.append(item)
+        return items, False
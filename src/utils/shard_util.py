@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.shard_util` implements a work queue of shards on a shared directory (e.g. an NFS mount shared by
+several nodes), without any broker: every shard is a JSON file which is moved (renamed) from one folder to the next.
+
+    todo/shard-00000.json --> claimed/shard-00000.json.<worker id> --> done/shard-00000.json
+          ^                                                        +-> failed/shard-00000.json
+          +------------------------------- retry_failed ------------------------+
+
+A rename is atomic, so when several workers try to claim the same shard, only one of them succeeds. The results of a
+shard are written in results/ (temporary file renamed) before the shard is moved to done/.
+A worker keeps the modification time of its claimed shards up to date (heartbeat): the shards of a dead worker are put
+back in todo/ once their claim is older than the claim timeout, so another worker processes them.
+"""
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# CONSTANTS
+# Claims not refreshed for this long (in seconds) are considered dead and the shards are put back in todo/
+DEFAULT_CLAIM_TIMEOUT = 600
+SHARD_FOLDERS = ["todo", "claimed", "done", "failed", "results"]
+
+class ShardQueue:
+    """
+    A shard queue distributes the shards of a plan to workers thru a shared directory (see module documentation).
+
+    Example:
+        shard_queue = ShardQueue("out/Shards")
+        shard_queue.create(plan, shards)
+        ...
+        shard = shard_queue.claim()
+        with shard_queue.heartbeat(shard):
+            results = process(shard)
+        shard_queue.complete(shard, results)
+    """
+    def __init__(self, work_dir, claim_timeout=DEFAULT_CLAIM_TIMEOUT, worker_id=None):
+        """
+        work_dir: shared directory of the queue
+        claim_timeout: seconds after which the claim of a shard that isn't refreshed is considered dead
+        worker_id: name of the worker in the claims (default: host name and process id)
+        """
+        self.work_dir = work_dir
+        self.claim_timeout = claim_timeout
+        self.worker_id = worker_id if worker_id else socket.gethostname() + "-" + str(os.getpid())
+
+    def create(self, plan, shards):
+        """
+        Creates the queue: the plan (JSON serializable dictionary shared by every worker) and one shard per dictionary
+        of shards (with a "shard_id"). A previous queue in the same directory is removed.
+        """
+        for folder in SHARD_FOLDERS:
+            shutil.rmtree(self._path(folder), ignore_errors=True)
+            os.makedirs(self._path(folder))
+
+        write_json_atomically(self._path("plan.json"), plan)
+        for shard in shards:
+            write_json_atomically(self._path("todo", shard["shard_id"] + ".json"), shard)
+
+    def read_plan(self):
+        with open(self._path("plan.json"), "r") as plan_file:
+            return json.load(plan_file)
+
+    def claim(self):
+        """
+        Claims the next shard to process (None if there's none left). Dead claims are put back in todo/ first.
+        """
+        self.requeue_dead_claims()
+
+        for file_name in sorted(os.listdir(self._path("todo"))):
+            if not file_name.endswith(".json"):
+                continue
+            claim_path = self._path("claimed", file_name + "." + self.worker_id)
+            try:
+                # The claim's modification time is the heartbeat (a rename keeps the modification time of the file,
+                # so it is refreshed before, otherwise the claim could look dead to the other workers)
+                os.utime(self._path("todo", file_name))
+                os.rename(self._path("todo", file_name), claim_path)
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+            with open(claim_path, "r") as shard_file:
+                shard = json.load(shard_file)
+            shard["claim_path"] = claim_path
+            return shard
+
+        return None
+
+    @contextmanager
+    def heartbeat(self, shard):
+        """Refreshes the claim of a shard while it is processed (in a thread), so it isn't considered dead."""
+        is_done = threading.Event()
+
+        def refresh_claim():
+            while not is_done.wait(self.claim_timeout / 4):
+                try:
+                    os.utime(shard["claim_path"])
+                except FileNotFoundError:
+                    # The claim was considered dead and put back in todo/
+                    return
+
+        thread = threading.Thread(target=refresh_claim, daemon=True)
+        thread.start()
+        try:
+            yield shard
+        finally:
+            is_done.set()
+            thread.join()
+
+    def complete(self, shard, results):
+        """Writes the results of a shard (JSON serializable) and moves the shard to done/."""
+        write_json_atomically(self._path("results", shard["shard_id"] + ".json"), results)
+        self._move_claim(shard, "done")
+
+    def fail(self, shard, error):
+        """
+        Moves a shard that couldn't be processed to failed/ (with the error), it isn't claimed again until it is put
+        back in todo/ (see retry_failed).
+        """
+        write_json_atomically(self._path("failed", shard["shard_id"] + ".error.json"),
+                              {"worker_id": self.worker_id, "error": error})
+        self._move_claim(shard, "failed")
+
+    def retry_failed(self):
+        """
+        Puts back in todo/ the failed shards (e.g. after a transient error), their errors are removed.
+        Returns the ids of the shards put back.
+        """
+        shard_ids = []
+        for file_name in sorted(os.listdir(self._path("failed"))):
+            if not file_name.endswith(".json") or file_name.endswith(".error.json"):
+                continue
+            shard_id = file_name[:-len(".json")]
+            try:
+                os.rename(self._path("failed", file_name), self._path("todo", file_name))
+            except FileNotFoundError:
+                # Put back by another process in the meantime
+                continue
+            try:
+                os.remove(self._path("failed", shard_id + ".error.json"))
+            except FileNotFoundError:
+                pass
+            shard_ids.append(shard_id)
+        return shard_ids
+
+    def requeue_dead_claims(self):
+        """Puts back in todo/ the shards whose claim is older than the claim timeout (dead workers)."""
+        for file_name in os.listdir(self._path("claimed")):
+            claim_path = self._path("claimed", file_name)
+            try:
+                if time.time() - os.path.getmtime(claim_path) > self.claim_timeout:
+                    shard_id = file_name.split(".json", 1)[0]
+                    os.rename(claim_path, self._path("todo", shard_id + ".json"))
+                    print("Claim of", shard_id, "is dead (" + file_name + "), shard put back in the queue")
+            except FileNotFoundError:
+                # Completed or put back by another worker in the meantime
+                continue
+
+    def status(self):
+        """Returns the shard ids of every state (todo, claimed, done and failed)."""
+        return {folder: sorted(file_name.split(".json", 1)[0] for file_name in os.listdir(self._path(folder))
+                               if not file_name.endswith(".error.json"))
+                for folder in ["todo", "claimed", "done", "failed"]}
+
+    def read_results(self, shard_id):
+        with open(self._path("results", shard_id + ".json"), "r") as results_file:
+            return json.load(results_file)
+
+    def _move_claim(self, shard, folder):
+        try:
+            os.rename(shard["claim_path"], self._path(folder, shard["shard_id"] + ".json"))
+        except FileNotFoundError:
+            # The claim was considered dead and the shard processed again by another worker: the results are the same
+            pass
+
+    def _path(self, *names):
+        return os.path.join(self.work_dir, *names)
+
+def write_json_atomically(file_path, value):
+    """Writes a JSON file thru a temporary file renamed once written, so it's never read half written."""
+    temporary_path = file_path + "." + socket.gethostname() + "-" + str(os.getpid()) + ".tmp"
+    with open(temporary_path, "w") as json_file:
+        json.dump(value, json_file)
+    os.replace(temporary_path, file_path)
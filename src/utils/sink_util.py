@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.sink_util` implements the feature sinks: the measures of every transcription (or audio file) are written
+to the output file as soon as they are calculated, with a fixed schema (typed columns), instead of being accumulated in
+a DataFrame exported at the end. Memory doesn't grow with the corpus and the rows already written can be read while a
+long run is in progress. The averages printed at the end of every tool are running means.
+
+The format follows the extension of the output file:
+    .csv: same file as pandas' to_csv (index column first), every row is flushed as soon as it is written
+    .parquet, .feather: typed columnar files (no index column), rows are written by batches (row groups / record
+                        batches), the file is readable once closed. pyarrow is needed (only imported for those formats)
+"""
+
+import csv
+import importlib
+import math
+import os
+
+import pandas as pd
+
+# CONSTANTS
+# Types of the participant's info columns, the same in every feature file. The participant's id is kept as spelled in
+# the file name (e.g. 001 for AD_001-1.cha), as in the participant store
+KEY_TYPES = {"idParticipant": str, "interviewNumber": str, "status": str}
+SINK_FORMATS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather"}
+# Rows per Parquet row group / Feather record batch
+DEFAULT_BATCH_SIZE = 1024
+
+class FeatureSink:
+    """
+    A feature sink writes typed rows to a .csv, .parquet or .feather file (see module documentation) and keeps the
+    running means of the measures.
+
+    Example:
+        with FeatureSink("out/ExtractedFeatures/linguistic_features.csv", make_schema(columns)) as sink:
+            for row in rows:
+                sink.write_row(row)
+        print(sink.means())
+    """
+    def __init__(self, output_path, schema, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        output_path: path to the output file, its extension gives the format (.csv if unknown)
+        schema: (column, type) of every column, the type being int, float or str (see make_schema)
+        batch_size: rows per batch of the columnar formats
+        """
+        self.output_path = output_path
+        self.schema = schema
+        self.columns = [column for column, _ in schema]
+        self.format = SINK_FORMATS.get(os.path.splitext(output_path)[1].lower(), "csv")
+        self.batch_size = batch_size
+        self.nb_rows = 0
+        self.batch = []
+
+        # Running sums of the measures (numeric columns but the participant's info)
+        self.measure_positions = [position for position, (column, column_type) in enumerate(schema)
+                                  if column not in KEY_TYPES and column_type is not str]
+        self.sums = [0.0] * len(self.measure_positions)
+        self.counts = [0] * len(self.measure_positions)
+
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        if self.format == "csv":
+            self.output_file = open(output_path, "w", newline="")
+            self.csv_writer = csv.writer(self.output_file, lineterminator=os.linesep)
+            self.csv_writer.writerow([""] + self.columns)
+            self.output_file.flush()
+        else:
+            pyarrow = import_pyarrow()
+            arrow_types = {int: pyarrow.int64(), float: pyarrow.float64(), str: pyarrow.string()}
+            self.arrow_schema = pyarrow.schema([(column, arrow_types[column_type]) for column, column_type in schema])
+            if self.format == "parquet":
+                self.arrow_writer = importlib.import_module("pyarrow.parquet").ParquetWriter(output_path,
+                                                                                            self.arrow_schema)
+            else:
+                # Feather (version 2) is the Arrow IPC file format
+                self.arrow_writer = importlib.import_module("pyarrow.ipc").new_file(output_path, self.arrow_schema)
+
+    def write_row(self, row):
+        """Writes a row: a dictionary by column or a sequence of values in the schema's order (None for a missing value)."""
+        if isinstance(row, dict):
+            values = [row.get(column) for column in self.columns]
+        else:
+            values = list(row)
+            if len(values) != len(self.columns):
+                raise ValueError("row of " + str(len(values)) + " values, " + str(len(self.columns)) + " columns expected")
+        values = [to_type(value, column_type) for value, (_, column_type) in zip(values, self.schema)]
+
+        for i, position in enumerate(self.measure_positions):
+            if values[position] is not None:
+                self.sums[i] += values[position]
+                self.counts[i] += 1
+
+        if self.format == "csv":
+            self.csv_writer.writerow([self.nb_rows] + ["" if value is None else value for value in values])
+            # Flushed at once, so the rows already written can be read while the run is in progress
+            self.output_file.flush()
+        else:
+            self.batch.append(values)
+            if len(self.batch) >= self.batch_size:
+                self._write_batch()
+        self.nb_rows += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def write_dataframe(self, df):
+        """Writes the rows of a dataframe (its columns are those of the schema)."""
+        self.write_rows(df[self.columns].itertuples(index=False, name=None))
+
+    def means(self):
+        """Returns the running means of the measures (as DataFrame.mean(), missing values are skipped)."""
+        return pd.Series([total / count if count else math.nan for total, count in zip(self.sums, self.counts)],
+                         index=[self.columns[position] for position in self.measure_positions], dtype=float)
+
+    def close(self):
+        if self.format == "csv":
+            self.output_file.close()
+        else:
+            self._write_batch()
+            self.arrow_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_batch(self):
+        if not self.batch:
+            return
+        pyarrow = import_pyarrow()
+        arrays = [pyarrow.array([values[position] for values in self.batch], type=self.arrow_schema.field(position).type)
+                  for position in range(len(self.columns))]
+        self.arrow_writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.arrow_schema))
+        self.batch = []
+
+def make_schema(columns, int_columns=()):
+    """
+    Returns the schema of feature columns: the participant's info columns are typed by KEY_TYPES, the given count
+    columns are integers and every other measure is a float.
+    """
+    return [(column, KEY_TYPES.get(column, int if column in int_columns else float)) for column in columns]
+
+def export_features(df, output_path):
+    """
+    Writes a dataframe of features to a feature file (the format follows the extension, see FeatureSink), its columns
+    typed by their dtypes (the participant's info columns by KEY_TYPES). Returns the closed sink (e.g. for its means).
+    """
+    schema = [(column, KEY_TYPES.get(column, int if pd.api.types.is_integer_dtype(dtype)
+                                             else float if pd.api.types.is_numeric_dtype(dtype) else str))
+              for column, dtype in df.dtypes.items()]
+    with FeatureSink(output_path, schema) as sink:
+        sink.write_dataframe(df)
+    return sink
+
+def to_type(value, column_type):
+    """Converts a value to the type of its column (None for a missing value, NaN included)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return column_type(value)
+
+def import_pyarrow():
+    """Imports pyarrow, only needed for the columnar formats and the feature store (optional dependency)."""
+    try:
+        return importlib.import_module("pyarrow")
+    except ImportError as e:
+        raise ImportError("pyarrow is needed for .parquet and .feather files (pip install pyarrow): " + str(e))
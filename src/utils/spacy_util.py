@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.spacy_util` loads spaCy models. Models are cached so that every module of a same process
+(e.g. the POS tagger and the syntactic measures) shares one loaded model per language.
+"""
+
+import importlib.metadata
+from functools import lru_cache
+
+import spacy
+
+# Spacy Models (Supports Chinese, Danish, Dutch, English, French, German, Greek, Italian, 
+# Japanese, Lithuanian, Norwegian Bokmål, Polish, Portuguese, Romanian & Spanish)
+# https://spacy.io/usage/models for mor info
+SPACY_MODELS = {
+    "zh": "zh_core_web_sm",
+    "da": "da_core_news_sm",
+    "nl": "nl_core_news_sm",
+    "en": "en_core_web_sm",
+    "fr": "fr_core_news_sm",
+    "de": "de_core_news_sm",
+    "el": "el_core_news_sm",
+    "it": "it_core_news_sm",
+    "ja": "ja_core_news_sm",
+    "lt": "lt_core_news_sm",
+    "nb": "nb_core_news_sm",
+    "pl": "pl_core_news_sm",
+    "pt": "pt_core_news_sm",
+    "ro": "ro_core_news_sm",
+    "es": "es_core_news_sm"
+}
+DEFAULT_SPACY_MODEL = "en_core_web_sm"
+# Number of texts processed together by spaCy's nlp.pipe
+SPACY_BATCH_SIZE = 64
+
+def get_parser_version(language_code):
+    """
+    Returns the version of the parses made for a language: [language code, spaCy model, model version (None if it
+    isn't an installed package), spaCy version]. Parses made with another version are stale.
+    """
+    model_name = SPACY_MODELS.get(language_code, DEFAULT_SPACY_MODEL)
+    try:
+        model_version = importlib.metadata.version(model_name)
+    except importlib.metadata.PackageNotFoundError:
+        model_version = None
+    return [language_code, model_name, model_version, spacy.__version__]
+
+@lru_cache(maxsize=None)
+def get_spacy_model(language_code):
+    """
+    This function will fetch the good spaCy model depending on the given language code.
+    Models are loaded once per process and then served from the cache.
+
+    Parameters
+    ----------
+    language_code: language code (e.g. fr, en, es)
+    """
+    model = spacy.load(SPACY_MODELS[language_code])
+
+    if not model:
+        return spacy.load(DEFAULT_SPACY_MODEL)
+    return model
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.stats_util` defines accumulators of descriptive statistics that are updated block by block,
+so statistics of very long feature matrices (e.g. MFCC frames of an hour-long recording) never require the whole matrix in memory.
+"""
+
+import numpy as np
+
+class MomentAccumulator:
+    """
+    A moment accumulator computes, column by column, the mean, variance, skewness and kurtosis of rows
+    added block by block. The statistics are the same as numpy.mean, numpy.var, scipy.stats.skew and
+    scipy.stats.kurtosis (default, biased estimators) over all the rows.
+
+    It keeps the count, the mean and the sums of 2nd, 3rd and 4th powers of deviations from the mean (M2, M3, M4).
+    Each block is summarized (vectorized over rows and columns) and then merged with the pairwise update formulas
+    of Pébay (2008), which are numerically stable. Accumulators of partial results (e.g. chunks processed in parallel
+    or on other machines) are combined with `merge()` into exactly the statistics of all the rows.
+    """
+    def __init__(self, dimension):
+        """Initializes the data."""
+        self.dimension = dimension
+        self.count = 0
+        self.mean_ = np.zeros(dimension)
+        self.m2 = np.zeros(dimension)
+        self.m3 = np.zeros(dimension)
+        self.m4 = np.zeros(dimension)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Creates an accumulator out of a block of rows (array of shape (nb_rows, dimension))."""
+        rows = np.asarray(rows, dtype=np.float64)
+        accumulator = cls(rows.shape[1])
+        if len(rows) > 0:
+            accumulator.count = len(rows)
+            accumulator.mean_ = rows.mean(axis=0)
+            deviations = rows - accumulator.mean_
+            squared_deviations = deviations * deviations
+            accumulator.m2 = squared_deviations.sum(axis=0)
+            accumulator.m3 = (squared_deviations * deviations).sum(axis=0)
+            accumulator.m4 = (squared_deviations * squared_deviations).sum(axis=0)
+        return accumulator
+
+    def update(self, rows):
+        """Adds a block of rows (array of shape (nb_rows, dimension))."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.dimension)
+        if len(rows) > 0:
+            self.merge(MomentAccumulator.from_rows(rows))
+
+    def merge(self, other):
+        """Merges the rows of another accumulator into this one."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean_, self.m2, self.m3, self.m4 = other.count, other.mean_, other.m2, other.m3, other.m4
+            return self
+
+        n_a, n_b = self.count, other.count
+        n = n_a + n_b
+        delta = other.mean_ - self.mean_
+        delta_n = delta / n
+
+        m2 = self.m2 + other.m2 + delta * delta_n * n_a * n_b
+        m3 = (self.m3 + other.m3
+              + delta * delta_n ** 2 * n_a * n_b * (n_a - n_b)
+              + 3 * delta_n * (n_a * other.m2 - n_b * self.m2))
+        m4 = (self.m4 + other.m4
+              + delta * delta_n ** 3 * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b)
+              + 6 * delta_n ** 2 * (n_a * n_a * other.m2 + n_b * n_b * self.m2)
+              + 4 * delta_n * (n_a * other.m3 - n_b * self.m3))
+
+        self.count = n
+        self.mean_ = self.mean_ + delta_n * n_b
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        return self
+
+    def mean(self):
+        if self.count == 0:
+            return np.full(self.dimension, np.nan)
+        return self.mean_
+
+    def variance(self):
+        if self.count == 0:
+            return np.full(self.dimension, np.nan)
+        return self.m2 / self.count
+
+    def skewness(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.m2 > 0, np.sqrt(self.count) * self.m3 / self.m2 ** 1.5, np.nan)
+
+    def kurtosis(self):
+        """Fisher's kurtosis (normal ==> 0.0)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.m2 > 0, self.count * self.m4 / self.m2 ** 2 - 3, np.nan)
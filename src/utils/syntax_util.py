@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+The :mod:`src.syntax_util` builds Parse objects (see :mod:`src.nlp_util`) out of spaCy's dependency parses and
+computes syntactic complexity measures on them (tree depth, dependency distance, clauses).
+Every traversal is iterative, so very long (or badly segmented) sentences can't hit the recursion limit.
+"""
+
+import os
+
+import numpy as np
+
+from utils.nlp_util import Parse, UniversalPOS
+from utils.pickle_util import read_pickle, write_pickle
+
+# Dependencies introducing a clause (labels are compared without their subtype, e.g. acl:relcl -> acl)
+CLAUSE_DEPENDENCIES = {"root", "ccomp", "xcomp", "advcl", "acl", "relcl", "csubj", "csubjpass", "parataxis"}
+VERB_TAGS = {UniversalPOS.VERB_TAG, UniversalPOS.AUX_TAG}
+# Dependency parses saved by the POS tagger (one pickle of Parse objects per transcription)
+PARSED_DIALOG_PATH = "out/ParsedDialogs"
+
+def get_parse_file_path(file_name, parse_path=PARSED_DIALOG_PATH):
+    """
+    Returns the file path of the saved dependency parses of a transcription.
+    """
+    return os.path.join(parse_path, file_name + ".pkl")
+
+def save_parses(parses, file_name, parser_version, parse_path=PARSED_DIALOG_PATH):
+    """
+    Saves the dependency parses of a transcription with the version of the parser which made them
+    (see utils.spacy_util.get_parser_version).
+    """
+    write_pickle({"parser_version": parser_version, "parses": parses}, get_parse_file_path(file_name, parse_path))
+
+def load_parses(file_name, parser_version, modification_time, parse_path=PARSED_DIALOG_PATH):
+    """
+    Returns the saved dependency parses of a transcription, None if there's none or if they are stale: made by
+    another parser version (language, spaCy model or spaCy version) or older than the transcription's modification time.
+    """
+    parse_file_path = get_parse_file_path(file_name, parse_path)
+    if not os.path.exists(parse_file_path) or os.path.getmtime(parse_file_path) < modification_time:
+        return None
+
+    saved_parses = read_pickle(parse_file_path)
+    if not isinstance(saved_parses, dict) or saved_parses.get("parser_version") != parser_version:
+        return None
+    return saved_parses["parses"]
+
+def build_parse(sentence):
+    """
+    Builds a Parse object out of a spaCy sentence (Span). The parsing is a list of (word, POS tag, dependency, head index)
+    tuples, the head index being relative to the sentence (the root is its own head).
+    """
+    parsing = [(token.text, token.pos_, token.dep_, token.head.i - sentence.start) for token in sentence]
+    return Parse(parsing, compute_max_depth([head for (_, _, _, head) in parsing]))
+
+def compute_tree_depths(heads):
+    """
+    Computes the depth of every token of a dependency tree (the root has a depth of 1) without recursion.
+    Each token is visited once: the walk up to the root stops as soon as it reaches a token of known depth.
+
+    Parameters
+    ----------
+    heads: head index of every token (the root is its own head)
+
+    Returns
+    ----------
+    depths: array of token depths
+    """
+    nb_tokens = len(heads)
+    depths = np.zeros(nb_tokens, dtype=np.int64)
+
+    for token in range(nb_tokens):
+        path = []
+        current = token
+        while depths[current] == 0 and heads[current] != current:
+            path.append(current)
+            current = heads[current]
+            if len(path) > nb_tokens:
+                raise ValueError("Dependency parse contains a cycle")
+
+        if depths[current] == 0:
+            depths[current] = 1
+        depth = depths[current]
+        for ancestor in reversed(path):
+            depth += 1
+            depths[ancestor] = depth
+
+    return depths
+
+def compute_max_depth(heads):
+    """
+    Computes the maximum depth of a dependency tree (0 for an empty sentence).
+    """
+    return int(compute_tree_depths(heads).max()) if len(heads) > 0 else 0
+
+def compute_dependency_distances(parse):
+    """
+    Computes the distance (in words) between every word and its head. Roots and punctuation are ignored.
+    """
+    heads = np.array([head for (_, _, _, head) in parse.parsing], dtype=np.int64)
+    is_dependency = np.array([head != i and pos_tag != UniversalPOS.PUNCT_TAG
+                              for i, (_, pos_tag, _, head) in enumerate(parse.parsing)], dtype=bool)
+    return np.abs(heads - np.arange(len(heads)))[is_dependency]
+
+def count_clauses(parse):
+    """
+    Counts the clauses of a sentence: its root, clausal dependencies and coordinated verbs.
+    """
+    nb_clauses = 0
+    for (_, pos_tag, dependency, _) in parse.parsing:
+        dependency = dependency.lower().split(":")[0]
+        if dependency in CLAUSE_DEPENDENCIES or (dependency == "conj" and pos_tag in VERB_TAGS):
+            nb_clauses += 1
+    return nb_clauses